@@ -0,0 +1,200 @@
+import atexit
+import queue
+import threading
+import time
+
+import requests
+
+
+class LoginAlertDispatcher:
+    """Sends login-failure alerts from background threads.
+
+    submit() only touches an in-memory dict and a bounded queue, so a burst
+    of failed logins never waits on the remote API. Failures for the same
+    (username, ip) inside `cooldown` seconds are coalesced: the first one is
+    sent and the rest are counted. When the window closes, a worker sends
+    one trailing alert with that count, so a burst that then stops is
+    still reported in full.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict,
+        cooldown: float = 30,
+        workers: int = 1,
+        queue_size: int = 100,
+        timeout: float = 5,
+    ):
+        self.url = url
+        self.headers = dict(headers)
+        self.cooldown = cooldown
+        self.timeout = timeout
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        # (username, ip) -> [last_sent_monotonic, suppressed_since_then, user_agent]
+        self._last_sent = {}
+        self._sweep_interval = min(max(cooldown, 0.05), 1.0)
+        self._last_sweep = time.monotonic()
+
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+        self._threads = [
+            threading.Thread(target=self._run, name=f"login-alert-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, username: str, ip: str, user_agent: str) -> bool:
+        """Queue an alert; returns False if it was coalesced or dropped."""
+        key = (username, ip)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._last_sent.get(key)
+            if entry is not None and now - entry[0] < self.cooldown:
+                entry[1] += 1
+                entry[2] = user_agent
+                self.coalesced += 1
+                return False
+            # An expired window not yet swept still has its count reported.
+            suppressed = entry[1] if entry is not None else 0
+            self._last_sent[key] = [now, 0, user_agent]
+
+        payload = self._payload(
+            username, ip, user_agent, suppressed + 1,
+            "Invalid username/password attempt (demo monitoring alert)",
+        )
+
+        try:
+            self._queue.put_nowait(payload)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            print(f"[WARN] Login alert queue full, dropped alert for {username!r}")
+            return False
+        return True
+
+    @staticmethod
+    def _payload(username, ip, user_agent, attempts, note):
+        return {
+            "event_type": "login_failed",
+            "client_payload": {
+                "username": username,
+                "ip": ip,
+                "user_agent": user_agent,
+                "attempts": attempts,
+                "note": note,
+            },
+        }
+
+    def _close_windows(self, session):
+        """Drop keys whose cooldown has passed, sending a trailing alert for
+        any that coalesced failures since their last alert."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep < self._sweep_interval:
+                return
+            self._last_sweep = now
+            closed = [(k, e) for k, e in self._last_sent.items() if now - e[0] >= self.cooldown]
+            for k, _ in closed:
+                del self._last_sent[k]
+        for (username, ip), (_, suppressed, user_agent) in closed:
+            if suppressed:
+                self._send(session, self._payload(
+                    username, ip, user_agent, suppressed,
+                    f"{suppressed} further failed attempts within {self.cooldown:g}s (demo monitoring alert)",
+                ))
+
+    def _run(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        while True:
+            try:
+                payload = self._queue.get(timeout=self._sweep_interval)
+            except queue.Empty:
+                self._close_windows(session)
+                continue
+            try:
+                if payload is None:
+                    return
+                self._send(session, payload)
+            finally:
+                self._queue.task_done()
+            self._close_windows(session)
+
+    def _send(self, session, payload):
+        try:
+            response = session.post(self.url, json=payload, timeout=self.timeout)
+        except requests.RequestException as e:
+            with self._lock:
+                self.failed += 1
+            print(f"[ALERT] Login alert failed: {type(e).__name__}: {e}")
+            return
+
+        with self._lock:
+            if response.status_code == 204:
+                self.sent += 1
+            else:
+                self.failed += 1
+        if response.status_code != 204:
+            print(f"[ALERT] Login alert failed with status {response.status_code}")
+
+    def flush(self, timeout: float = 5) -> bool:
+        """Wait until every queued alert has been attempted."""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def stop(self, timeout: float = 5):
+        for _ in self._threads:
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for t in self._threads:
+            t.join(timeout=timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sent": self.sent,
+                "failed": self.failed,
+                "coalesced": self.coalesced,
+                "dropped": self.dropped,
+                "queued": self._queue.qsize(),
+            }
+
+
+_dispatchers = {}
+_dispatchers_lock = threading.Lock()
+
+
+def get_dispatcher(url: str, headers: dict, **kwargs) -> LoginAlertDispatcher:
+    """One dispatcher per target URL and credentials, created on first use."""
+    key = (url, tuple(sorted(headers.items())))
+    with _dispatchers_lock:
+        d = _dispatchers.get(key)
+        if d is None:
+            d = LoginAlertDispatcher(url, headers, **kwargs)
+            _dispatchers[key] = d
+        return d
+
+
+def stop_all(timeout: float = 2):
+    with _dispatchers_lock:
+        dispatchers = list(_dispatchers.values())
+        _dispatchers.clear()
+    for d in dispatchers:
+        d.stop(timeout=timeout)
+
+
+atexit.register(stop_all)
@@ -1,9 +1,13 @@
 #Garence Wong Kar Kang
 import os
 import sys
-import uuid
+import click
 import time
-import requests
+import uuid
+import mimetypes
+from functools import wraps
+from urllib.parse import quote
+from datetime import datetime, timezone
 from markupsafe import escape
 from flask import (
     Flask,
@@ -13,29 +17,79 @@ from flask import (
     url_for,
     session,
     flash,
-    send_from_directory,
     abort,
     get_flashed_messages,
+    get_template_attribute,
+    jsonify,
 )
-from werkzeug.security import check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import secure_filename, send_from_directory
 from dotenv import load_dotenv
 
-from db.db import init_db
+from db.db import DB_PATH, init_db, set_query_observer, start_checkpointer
 from auth import login_required, admin_required
+from alerts import get_dispatcher as get_alert_dispatcher
+from passwords import verify_password
+from throttle import LoginThrottle, build_store as build_throttle_store
+from fragments import FragmentCache, fmt_bytes, fmt_dt
+from maintenance import (
+    gc_progress,
+    expire_upload_sessions,
+    reconcile_uploads,
+    reshard_uploads,
+    start_reconciler,
+)
+from export import stream_zip
+from codec import get_codec, is_compressible, iter_decompressed
+from metrics import AppMetrics
+from session_epoch import SessionEpoch
+from storage import (
+    get_layout,
+    absolute_path,
+    receive_multipart_files,
+    RECEIVED_FILES_KEY,
+    prepare_upload,
+    compress_upload,
+    place_upload,
+    remove_stored_file,
+    IncomingFile,
+    staging_path,
+    create_staging_file,
+    write_chunk,
+    remove_staging_file,
+)
 from user_repo import (
     get_user_by_username,
     list_all_users,
     create_user,
     delete_user,
     ensure_seed_admin,
+    update_password_hash,
+    user_cache_stats,
+    get_used_bytes,
 )
 from file_repo import (
-    list_files_for_user,
+    QuotaExceeded,
+    on_files_changed,
+    list_files_page_for_user,
     get_file_for_user,
+    iter_files_for_user,
+    get_blob,
     insert_file,
+    insert_files,
     delete_file_record_for_user,
 )
+from upload_repo import (
+    TooManyUploadSessions,
+    create_upload_session,
+    get_upload_session,
+    list_received_chunks,
+    record_chunk,
+    claim_upload_session,
+    complete_upload_session,
+    delete_upload_session,
+)
 
 load_dotenv()
 
@@ -48,7 +102,19 @@ app.config.update(
     SESSION_PERMANENT=False,
 )
 
-RUN_ID = os.urandom(16).hex()
+# Reverse proxies in front of the app whose X-Forwarded-For / -Proto may be
+# believed. 0 (the default) trusts no header, so a client cannot pick the
+# address the login throttle sees; set it to 1 behind a single nginx.
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))
+if TRUSTED_PROXIES > 0:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=TRUSTED_PROXIES)
+
+# Each login records the shared session epoch; bumping it ends every
+# session on every worker. gunicorn.conf.py bumps it when the server starts
+# and admins can bump it from the dashboard. Workers re-read it at most
+# every SESSION_EPOCH_TTL seconds.
+SESSION_EPOCH_TTL = float(os.getenv("SESSION_EPOCH_TTL", "2"))
+session_epoch = SessionEpoch(SESSION_EPOCH_TTL)
 
 UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./submit")
 if not os.path.isabs(UPLOAD_DIR):
@@ -57,58 +123,128 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH", "10485760"))
 
-_ALERT_LAST_SENT = {} 
+FILES_PAGE_SIZE = int(os.getenv("FILES_PAGE_SIZE", "50"))
+FILES_PAGE_SIZE_MAX = int(os.getenv("FILES_PAGE_SIZE_MAX", "500"))
+
+# Compress text-like uploads at rest: none, gzip or deflate (zstd on Python
+# 3.14+). A compressed copy is kept only if it saves STORAGE_CODEC_MIN_SAVING.
+STORAGE_CODEC = get_codec(os.getenv("STORAGE_CODEC", "none"))
+STORAGE_CODEC_MIN_SAVING = float(os.getenv("STORAGE_CODEC_MIN_SAVING", "0.1"))
+
+# Bytes each user may store; 0 means no limit.
+USER_QUOTA_BYTES = int(os.getenv("USER_QUOTA_BYTES", "0"))
+
+# How file downloads leave the process:
+#   sendfile    werkzeug hands the open file to the server's wsgi.file_wrapper;
+#               gunicorn then uses os.sendfile, so no bytes pass through Python.
+#   none        read and write the file in Python (for servers without a
+#               working file_wrapper, and as a benchmark baseline).
+#   x-accel     authorize here and let nginx send the file, e.g.
+#                   location /_protected_uploads/ { internal; alias /app/uploads/; }
+#   x-sendfile  authorize here and let Apache mod_xsendfile / lighttpd send it.
+# The proxy modes free the gunicorn thread as soon as headers are written.
+# Compressed blobs always go through the app, since the proxy would drop
+# their Content-Encoding.
+DOWNLOAD_OFFLOAD_MODES = ("sendfile", "none", "x-accel", "x-sendfile")
+DOWNLOAD_OFFLOAD = os.getenv("DOWNLOAD_OFFLOAD", "sendfile").lower()
+if DOWNLOAD_OFFLOAD not in DOWNLOAD_OFFLOAD_MODES:
+    raise ValueError(f"DOWNLOAD_OFFLOAD must be one of {DOWNLOAD_OFFLOAD_MODES}, got {DOWNLOAD_OFFLOAD!r}")
+DOWNLOAD_OFFLOAD_PREFIX = os.getenv("DOWNLOAD_OFFLOAD_PREFIX", "/_protected_uploads/")
+
+# Resumable uploads: chunk size offered to clients (capped by
+# MAX_CONTENT_LENGTH, since each chunk is one request), largest file
+# accepted, and how long an idle session is kept.
+UPLOAD_SESSION_CHUNK_SIZE = min(
+    int(os.getenv("UPLOAD_SESSION_CHUNK_SIZE", "8388608")), app.config["MAX_CONTENT_LENGTH"]
+)
+UPLOAD_SESSION_MIN_CHUNK_SIZE = 65536
+UPLOAD_SESSION_MAX_SIZE = int(os.getenv("UPLOAD_SESSION_MAX_SIZE", "5368709120"))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", "86400"))
+# Unfinished sessions per user; each one holds a staging file of its full size.
+UPLOAD_SESSION_MAX_OPEN = int(os.getenv("UPLOAD_SESSION_MAX_OPEN", "10"))
+
+# Background reconciliation of UPLOAD_DIR against the database; 0 disables.
+UPLOAD_GC_INTERVAL = int(os.getenv("UPLOAD_GC_INTERVAL", "0"))
+UPLOAD_GC_RATE = float(os.getenv("UPLOAD_GC_RATE", "100"))
+UPLOAD_GC_GRACE = int(os.getenv("UPLOAD_GC_GRACE", "3600"))
+# Rows whose file is missing are kept (and reported) when more than this
+# share of them is missing, e.g. because the upload volume is not mounted.
+UPLOAD_GC_MAX_DANGLING_RATIO = float(os.getenv("UPLOAD_GC_MAX_DANGLING_RATIO", "0.1"))
+
+login_throttle = LoginThrottle(
+    build_throttle_store(
+        os.getenv("LOGIN_THROTTLE_STORE", "memory"),
+        os.getenv("LOGIN_THROTTLE_SQLITE_PATH", os.path.join(os.path.dirname(DB_PATH), "throttle.db")),
+    ),
+    window=float(os.getenv("LOGIN_THROTTLE_WINDOW", "300")),
+    max_per_ip=int(os.getenv("LOGIN_THROTTLE_MAX_PER_IP", "50")),
+    max_per_user=int(os.getenv("LOGIN_THROTTLE_MAX_PER_USER", "10")),
+)
+
+
+# Request, query and transfer metrics, served on /metrics.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+app_metrics = AppMetrics(
+    upload_endpoints=("dashboard_upload", "dashboard_upload_batch", "upload_session_chunk"),
+    download_endpoints=("dashboard_download", "dashboard_download_zip"),
+)
+if METRICS_ENABLED:
+    app_metrics.install(app)
+    set_query_observer(app_metrics.observe_query)
+
+
+def client_ip() -> str:
+    # Already the real client behind TRUSTED_PROXIES; never read the header here.
+    return request.remote_addr or ""
+
+
+LOGIN_ALERT_COOLDOWN = float(os.getenv("LOGIN_ALERT_COOLDOWN", "30"))
+LOGIN_ALERT_WORKERS = int(os.getenv("LOGIN_ALERT_WORKERS", "1"))
+LOGIN_ALERT_QUEUE_SIZE = int(os.getenv("LOGIN_ALERT_QUEUE_SIZE", "100"))
 
 
 def trigger_github_login_alert(username: str):
-    print(f"\n[DEBUG] Alert triggered for username: {username}")
-    
     if os.getenv("ENABLE_GH_LOGIN_ALERTS", "0") != "1":
-        print("[DEBUG] Alerts are disabled (ENABLE_GH_LOGIN_ALERTS != 1)")
         return
 
     owner = (os.getenv("GITHUB_OWNER") or "").strip()
     repo = (os.getenv("GITHUB_REPO") or "").strip()
     pat = (os.getenv("GITHUB_PAT") or "").strip()
-    
-    print(f"[DEBUG] Owner: {owner}")
-    print(f"[DEBUG] Repo: {repo}")
-    print(f"[DEBUG] PAT present: {bool(pat)}")
-    
+
     if not owner or not repo or not pat:
-        print("[DEBUG] Missing GitHub config (owner/repo/pat)")
+        print("[DEBUG] Login alert skipped: missing GitHub config (owner/repo/pat)")
         return
 
-    ip = (request.headers.get("X-Forwarded-For") or request.remote_addr or "").split(",")[0].strip()
+    ip = client_ip()
     ua = (request.headers.get("User-Agent") or "")[:120]
 
-    url = f"https://api.github.com/repos/{owner}/{repo}/dispatches"
+    api_url = (os.getenv("GITHUB_API_URL") or "https://api.github.com").rstrip("/")
+    url = f"{api_url}/repos/{owner}/{repo}/dispatches"
     headers = {
         "Accept": "application/vnd.github+json",
         "Authorization": f"token {pat}",
         "User-Agent": "devops-file-portal",
     }
-    payload = {
-        "event_type": "login_failed",
-        "client_payload": {
-            "username": username,
-            "ip": ip,
-            "user_agent": ua,
-            "note": "Invalid username/password attempt (demo monitoring alert)",
-        },
-    }
 
-    print(f"[DEBUG] Sending POST to: {url}")
+    # Delivery happens on the dispatcher's worker threads; the login request
+    # only pays for a dict lookup and a queue put.
+    dispatcher = get_alert_dispatcher(
+        url,
+        headers,
+        cooldown=LOGIN_ALERT_COOLDOWN,
+        workers=LOGIN_ALERT_WORKERS,
+        queue_size=LOGIN_ALERT_QUEUE_SIZE,
+    )
+    dispatcher.submit(username, ip, ua)
+
+
+def remove_stored(storage_path: str):
+    # Called from inside the repo's delete transaction; a failure to remove
+    # the file must not roll back the delete.
     try:
-        response = requests.post(url, headers=headers, json=payload, timeout=5)
-        print(f"[DEBUG] Response status: {response.status_code}")
-        print(f"[DEBUG] Response body: {response.text}")
-        if response.status_code == 204:
-            print("[DEBUG] ✓ Alert sent successfully!")
-        else:
-            print(f"[DEBUG] ✗ Failed with status {response.status_code}")
-    except Exception as e:
-        print(f"[DEBUG] Exception occurred: {type(e).__name__}: {e}")
+        remove_stored_file(UPLOAD_DIR, storage_path)
+    except OSError as e:
+        print(f"[WARN] Could not remove {storage_path}: {e}")
 
 
 def build_message_html() -> str:
@@ -123,92 +259,94 @@ def build_message_html() -> str:
     return "".join(out)
 
 
-def build_users_rows_html(users, current_user_id) -> str:
-    rows = []
+app.add_template_filter(fmt_dt, "fmt_dt")
+app.add_template_filter(fmt_bytes, "fmt_bytes")
+
+# Rendered dashboard rows per user. Entries are keyed by the ids on the page,
+# and dropped whenever file_repo reports that the user's files changed.
+files_fragment_cache = FragmentCache(
+    max_users=int(os.getenv("FRAGMENT_CACHE_USERS", "1000")),
+)
+on_files_changed(files_fragment_cache.invalidate_user)
+
+
+def build_users_rows_html(users, current_user_id):
     cur_uid = int(current_user_id) if current_user_id is not None else -1
+    user_rows = get_template_attribute("_rows.html", "user_rows")
+    return user_rows(users, cur_uid, USER_QUOTA_BYTES)
 
-    for u in users:
-        real_id = int(u["id"])
-        display_id = int(u["display_id"])
-        username = escape(u["username"])
-        role = escape(u["role"])
-        created_at = escape(u["created_at"])
 
-        if real_id == cur_uid:
-            delete_cell = '<span class="muted">—</span>'
-        else:
-            delete_cell = (
-                f'<form method="POST" action="/admin/delete_user/{real_id}" '
-                f'onsubmit="return confirm(\'Delete this user?\')">'
-                f'<button class="btn btn-danger" type="submit" style="width:auto;">Delete</button>'
-                f"</form>"
-            )
+def build_files_rows_html(files, user_id=None):
+    file_rows = get_template_attribute("_rows.html", "file_rows")
+    if user_id is None:
+        return file_rows(files)
 
-        rows.append(
-            "<tr>"
-            f"<td>{display_id}</td>"
-            f"<td>{username}</td>"
-            f"<td>{role}</td>"
-            f"<td>{created_at}</td>"
-            f"<td>{delete_cell}</td>"
-            "</tr>"
-        )
+    key = tuple(int(f["id"]) for f in files)
+    html = files_fragment_cache.get(user_id, key)
+    if html is None:
+        html = file_rows(files)
+        files_fragment_cache.put(user_id, key, html)
+    return html
+
+
+def read_page_args():
+    cursor = request.args.get("cursor", type=int)
+    if cursor is not None and cursor <= 0:
+        cursor = None
+    limit = request.args.get("limit", default=FILES_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, FILES_PAGE_SIZE_MAX))
+    return cursor, limit
+
+
+def parse_db_timestamp(s):
+    # SQLite datetime('now') is UTC "YYYY-MM-DD HH:MM:SS".
+    try:
+        return datetime.strptime(str(s), "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+
+def quota_allows(user_id: int, incoming: int) -> bool:
+    """Cheap pre-check against the user's stored-bytes counter.
+
+    Content-Length covers the whole multipart body, so it bounds the file
+    size from above; the insert re-checks the exact size under the write
+    lock.
+    """
+    if not USER_QUOTA_BYTES:
+        return True
+    return get_used_bytes(user_id) + incoming <= USER_QUOTA_BYTES
 
-    if not rows:
-        return '<tr><td colspan="5" class="muted">No users found.</td></tr>'
-
-    return "".join(rows)
-
-
-def build_files_rows_html(files) -> str:
-    def fmt_dt(s: str) -> str:
-        try:
-            date_part, time_part = s.split(" ")
-            y, m, d = date_part.split("-")
-            hh, mm, _ss = time_part.split(":")
-            return f"{d}/{m}/{y} {hh}:{mm}"
-        except Exception:
-            return escape(s)
-
-    rows = []
-    for f in files:
-        fid = int(f["id"])
-        fname = escape(f["original_filename"])
-        size = f["file_size"] if f["file_size"] else "-"
-        uploaded_at_raw = f["uploaded_at"] or ""
-        uploaded_at = fmt_dt(str(uploaded_at_raw))
-
-        rows.append(
-            "<tr>"
-            f"<td>{fid}</td>"
-            f"<td>{fname}</td>"
-            f"<td>{size}</td>"
-            f"<td>{uploaded_at}</td>"
-            "<td>"
-            '<div class="actions-row">'
-            f'<a class="action-link" href="/dashboard/download/{fid}">Download</a>'
-            f'<form method="POST" action="/dashboard/delete/{fid}" '
-            f'onsubmit="return confirm(\'Delete this file?\')">'
-            f'<button class="btn btn-danger delete-btn" type="submit">Delete</button>'
-            f"</form>"
-            "</div>"
-            "</td>"
-            "</tr>"
-        )
 
-    if not rows:
-        return '<tr><td colspan="5" class="muted">No files uploaded yet.</td></tr>'
+def upload_fits_quota(user_id: int) -> bool:
+    """quota_allows for the upload request being handled.
 
-    return "".join(rows)
+    A single upload must fit in full. A batch stores the files that fit and
+    rejects the rest one by one, so it is only refused unread once the
+    quota is already full.
+    """
+    if request.endpoint == "dashboard_upload_batch":
+        return quota_allows(user_id, 1)
+    return quota_allows(user_id, request.content_length or 0)
 
 
+def set_download_cache_headers(resp):
+    # Per-user content: browsers may keep it but must revalidate each time.
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.cache_control.max_age = None
 
-# Session invalidation on restart
+
+def session_is_current() -> bool:
+    return "user_id" in session and session_epoch.is_current(session.get("epoch"))
+
+
+# Session invalidation on restart or "log everyone out"
 @app.before_request
-def invalidate_sessions_on_restart():
+def invalidate_stale_sessions():
     if request.endpoint in ("login", "static") or request.endpoint is None:
         return
-    if "user_id" in session and session.get("run_id") != RUN_ID:
+    if "user_id" in session and not session_is_current():
         session.clear()
         return redirect(url_for("login"))
 
@@ -225,7 +363,7 @@ def home():
 
 @app.route("/login", methods=["GET", "POST"])
 def login():
-    if "user_id" in session and session.get("run_id") == RUN_ID:
+    if session_is_current():
         return redirect(url_for("home"))
 
     if request.method == "POST":
@@ -236,17 +374,33 @@ def login():
             flash("Please enter username and password.", "error")
             return render_template("login.html", message_html=build_message_html())
 
+        ip = client_ip()
+        retry_after = login_throttle.check(ip, username)
+        if retry_after:
+            flash("Too many failed login attempts. Please try again later.", "error")
+            resp = app.make_response(
+                (render_template("login.html", message_html=build_message_html()), 429)
+            )
+            resp.headers["Retry-After"] = str(retry_after)
+            return resp
+
         user = get_user_by_username(username)
-        if not user or not check_password_hash(user["password_hash"], password):
+        ok, upgraded_hash = verify_password(user["password_hash"], password) if user else (False, None)
+        if not ok:
+            login_throttle.record_failure(ip, username)
             trigger_github_login_alert(username)
             flash("Invalid username or password.", "error")
             return render_template("login.html", message_html=build_message_html())
 
+        login_throttle.record_success(ip, username)
+        if upgraded_hash:
+            update_password_hash(int(user["id"]), upgraded_hash)
+
         session.clear()
         session["user_id"] = int(user["id"])
         session["username"] = user["username"]
         session["role"] = user["role"]
-        session["run_id"] = RUN_ID
+        session["epoch"] = session_epoch.current()
         session.permanent = False
 
         if user["role"] == "admin":
@@ -276,6 +430,26 @@ def admin_dashboard():
     )
 
 
+@app.route("/admin/cache_stats")
+@admin_required
+def admin_cache_stats():
+    return jsonify(user_cache=user_cache_stats())
+
+
+@app.route("/admin/gc_status")
+@admin_required
+def admin_gc_status():
+    return jsonify(upload_gc=gc_progress.snapshot(), interval=UPLOAD_GC_INTERVAL)
+
+
+@app.route("/metrics")
+@admin_required
+def metrics():
+    if not METRICS_ENABLED:
+        abort(404)
+    return app.response_class(app_metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.route("/admin/create_user", methods=["POST"])
 @admin_required
 def admin_create_user():
@@ -295,6 +469,16 @@ def admin_create_user():
     return redirect(url_for("admin_dashboard"))
 
 
+@app.route("/admin/logout_all", methods=["POST"])
+@admin_required
+def admin_logout_all():
+    # This admin stays logged in under the new epoch.
+    session["epoch"] = session_epoch.bump()
+    print(f"[INFO] {session.get('username')} logged out all sessions")
+    flash("All other sessions have been logged out.", "success")
+    return redirect(url_for("admin_dashboard"))
+
+
 @app.route("/admin/delete_user/<int:user_id>", methods=["POST"])
 @admin_required
 def admin_delete_user(user_id):
@@ -302,7 +486,7 @@ def admin_delete_user(user_id):
         flash("You cannot delete your own account while logged in.", "error")
         return redirect(url_for("admin_dashboard"))
 
-    delete_user(user_id)
+    delete_user(user_id, remove_stored=remove_stored)
     flash("User deleted.", "success")
     return redirect(url_for("admin_dashboard"))
 
@@ -314,55 +498,493 @@ def dashboard():
         return redirect(url_for("admin_dashboard"))
 
     user_id = int(session["user_id"])
-    files = list_files_for_user(user_id)
+    cursor, limit = read_page_args()
+    files, next_cursor = list_files_page_for_user(user_id, cursor=cursor, limit=limit)
 
     return render_template(
         "dashboard.html",
         username=session.get("username", ""),
         message_html=build_message_html(),
-        files_rows_html=build_files_rows_html(files),
+        files_rows_html=build_files_rows_html(files, user_id),
+        cursor=cursor,
+        limit=limit,
+        next_cursor=next_cursor,
+    )
+
+
+@app.route("/dashboard/files", methods=["GET"])
+@login_required
+def dashboard_files_json():
+    if session.get("role") == "admin":
+        return redirect(url_for("admin_dashboard"))
+
+    user_id = int(session["user_id"])
+    cursor, limit = read_page_args()
+    files, next_cursor = list_files_page_for_user(user_id, cursor=cursor, limit=limit)
+
+    return jsonify(
+        files=[
+            {
+                "id": int(f["id"]),
+                "display_no": f["display_no"],
+                "original_filename": f["original_filename"],
+                "content_type": f["content_type"],
+                "file_size": f["file_size"],
+                "uploaded_at": f["uploaded_at"],
+            }
+            for f in files
+        ],
+        next_cursor=next_cursor,
+        limit=limit,
     )
 
 
+@app.route("/dashboard/upload", methods=["POST"])
 @app.route("/dashboard/submit", methods=["POST"])
 @login_required
 def dashboard_upload():
     if session.get("role") == "admin":
         return redirect(url_for("admin_dashboard"))
 
-    if "file" not in request.files:
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
         flash("No file part.", "error")
         return redirect(url_for("dashboard"))
 
-    f = request.files["file"]
-    if not f or not f.filename or f.filename.strip() == "":
+    user_id = int(session["user_id"])
+
+    # Refuse before reading a byte of the body.
+    if not upload_fits_quota(user_id):
+        flash("Upload failed: storage quota exceeded.", "error")
+        return redirect(url_for("dashboard"))
+
+    # Read the body straight from the socket instead of request.files, which
+    # would spool the whole upload to a temp file before we could copy it.
+    try:
+        received = received_upload_files(boundary)
+    except ValueError:
+        flash("Upload failed: malformed request.", "error")
+        return redirect(url_for("dashboard"))
+
+    f = next((r for r in received if r.field_name == "file"), None)
+    for other in received:
+        if other is not f:
+            other.discard()
+
+    if f is None:
         flash("No file selected.", "error")
         return redirect(url_for("dashboard"))
 
+    maybe_compress(f)
+    stored_filename, storage_path = prepare_upload(f)
+
+    try:
+        insert_file(
+            user_id=user_id,
+            original_filename=f.original_filename,
+            stored_filename=stored_filename,
+            content_type=f.content_type,
+            file_size=f.file_size,
+            storage_path=storage_path,
+            sha256=f.sha256,
+            quota=USER_QUOTA_BYTES,
+            codec=f.codec,
+        )
+    except QuotaExceeded:
+        f.discard()
+        flash("Upload failed: storage quota exceeded.", "error")
+        return redirect(url_for("dashboard"))
+    except Exception:
+        f.discard()
+        raise
+
+    # Only place the blob once its reference is committed; see
+    # file_repo.purge_unreferenced_blobs for the other half of this ordering.
+    # The blob row is authoritative for where existing content lives and
+    # how it is encoded.
+    blob = get_blob(f.sha256)
+    place_upload(f, UPLOAD_DIR, blob["storage_path"], blob["codec"])
+
+    flash("File uploaded successfully.", "success")
+    return redirect(url_for("dashboard"))
+
+
+def received_upload_files(boundary: str):
+    """The request's uploaded files, written to .incoming temp files.
+
+    Under asgi.py the body has already been received on the event loop and
+    the files are waiting in the environ; otherwise they are read from the
+    request stream here.
+    """
+    received = request.environ.get(RECEIVED_FILES_KEY)
+    if received is None:
+        return receive_multipart_files(request.stream, boundary, UPLOAD_DIR)
+    if isinstance(received, ValueError):
+        raise received
+    return received
+
+
+def may_receive_upload(environ) -> bool:
+    """Whether an upload view would read this request's body.
+
+    The same checks the views make before touching the body: a session
+    from the current epoch and room in the quota (see upload_fits_quota).
+    asgi.py uses this to decide whether to receive a large body itself.
+    """
+    with app.request_context(environ):
+        if not session_is_current():
+            return False
+        if session.get("role") == "admin":
+            return False
+        return upload_fits_quota(int(session["user_id"]))
+
+
+def maybe_compress(f):
+    """Apply STORAGE_CODEC to a finished upload worth compressing.
+
+    Content that is already stored is left alone: the existing blob keeps
+    its own encoding and this copy is about to be dropped anyway.
+    """
+    if STORAGE_CODEC is None or not f.file_size:
+        return
+    if not is_compressible(f.original_filename, f.content_type):
+        return
+    if get_blob(f.sha256) is not None:
+        return
+    compress_upload(f, STORAGE_CODEC, STORAGE_CODEC_MIN_SAVING)
+
+
+def wants_json() -> bool:
+    best = request.accept_mimetypes.best_match(["application/json", "text/html"])
+    return best == "application/json"
+
+
+@app.route("/dashboard/submit_batch", methods=["POST"])
+@login_required
+def dashboard_upload_batch():
+    """Upload every file part in one request and one DB transaction.
+
+    Files are checked against the quota in order: those that fit are
+    stored, and any that would take the user past it are reported as
+    rejected, so a batch over quota in total is accepted in part. It is
+    refused as a whole only when the quota is already full, or when another
+    upload for the same user fills it before this one commits.
+
+    Answers with per-file JSON results when the client asks for JSON, and
+    with a flash message and redirect for a plain browser form.
+    """
+    if session.get("role") == "admin":
+        return redirect(url_for("admin_dashboard"))
+
+    boundary = request.mimetype_params.get("boundary")
+    if request.mimetype != "multipart/form-data" or not boundary:
+        if wants_json():
+            return jsonify({"error": "Expected a multipart/form-data body."}), 400
+        flash("No file part.", "error")
+        return redirect(url_for("dashboard"))
+
     user_id = int(session["user_id"])
 
-    original_name = secure_filename(f.filename)
-    unique_name = f"{uuid.uuid4().hex}_{original_name}"
-    save_path = os.path.join(UPLOAD_DIR, unique_name)
+    if not upload_fits_quota(user_id):
+        if wants_json():
+            return jsonify({"error": "Storage quota exceeded."}), 413
+        flash("Upload failed: storage quota exceeded.", "error")
+        return redirect(url_for("dashboard"))
+
+    try:
+        received = received_upload_files(boundary)
+    except ValueError:
+        if wants_json():
+            return jsonify({"error": "Malformed request."}), 400
+        flash("Upload failed: malformed request.", "error")
+        return redirect(url_for("dashboard"))
 
-    f.save(save_path)
+    results = []
+    accepted = []
+    records = []
+    used = get_used_bytes(user_id) if USER_QUOTA_BYTES else 0
+    for f in received:
+        if not f.original_filename:
+            # secure_filename left nothing usable (e.g. "../../").
+            f.discard()
+            results.append({"filename": None, "status": "rejected", "error": "Invalid filename."})
+            continue
+        if USER_QUOTA_BYTES and used + f.file_size > USER_QUOTA_BYTES:
+            f.discard()
+            results.append({"filename": f.original_filename, "status": "rejected", "error": "Storage quota exceeded."})
+            continue
+        used += f.file_size
+        maybe_compress(f)
+        stored_filename, storage_path = prepare_upload(f)
+        accepted.append((f, len(results)))
+        results.append({"filename": f.original_filename, "status": "uploaded"})
+        records.append({
+            "original_filename": f.original_filename,
+            "stored_filename": stored_filename,
+            "content_type": f.content_type,
+            "file_size": f.file_size,
+            "storage_path": storage_path,
+            "sha256": f.sha256,
+            "codec": f.codec,
+        })
 
     try:
-        file_size = os.path.getsize(save_path)
+        inserted = insert_files(user_id, records, quota=USER_QUOTA_BYTES)
+    except QuotaExceeded:
+        # Another upload for this user committed in between.
+        for f, _ in accepted:
+            f.discard()
+        if wants_json():
+            return jsonify({"error": "Storage quota exceeded."}), 413
+        flash("Upload failed: storage quota exceeded.", "error")
+        return redirect(url_for("dashboard"))
     except Exception:
-        file_size = None
-
-    insert_file(
-        user_id=user_id,
-        original_filename=original_name,
-        stored_filename=unique_name,
-        content_type=f.mimetype,
-        file_size=file_size,
-        storage_path=save_path,
+        for f, _ in accepted:
+            f.discard()
+        raise
+
+    # Same ordering as the single upload: blobs are placed after COMMIT.
+    for (f, i), (file_id, storage_path, codec) in zip(accepted, inserted):
+        place_upload(f, UPLOAD_DIR, storage_path, codec)
+        results[i].update({"id": file_id, "file_size": f.file_size, "sha256": f.sha256})
+
+    over_quota = [r["filename"] for r in results if r.get("error") == "Storage quota exceeded."]
+    if wants_json():
+        if inserted:
+            status = 201
+        else:
+            status = 413 if over_quota else 400
+        return jsonify({"uploaded": len(inserted), "results": results}), status
+
+    if inserted:
+        flash(f"{len(inserted)} file(s) uploaded successfully.", "success")
+    if over_quota:
+        flash(f"Not uploaded, storage quota exceeded: {', '.join(over_quota)}", "error")
+    elif not inserted:
+        flash("No file selected.", "error")
+    return redirect(url_for("dashboard"))
+
+
+# Resumable uploads
+#
+#   POST   /dashboard/uploads                    {"filename", "size", ["content_type"], ["chunk_size"]}
+#   PUT    /dashboard/uploads/<id>/chunks/<n>    raw bytes of chunk n (0-based)
+#   GET    /dashboard/uploads/<id>               offset and received/missing chunks
+#   POST   /dashboard/uploads/<id>/finalize      -> the new file
+#   DELETE /dashboard/uploads/<id>
+#
+# Every chunk but the last is exactly chunk_size bytes and lands at
+# n * chunk_size in a preallocated staging file, so chunks can be retried
+# or sent in parallel. A chunk is recorded only after it is fsynced.
+
+def chunk_count(total_size: int, chunk_size: int) -> int:
+    return -(-total_size // chunk_size)
+
+
+def upload_session_json(row, chunks=None):
+    if chunks is None:
+        chunks = list_received_chunks(row["id"]) if row["state"] == "open" else []
+    received = {n for n, _ in chunks}
+    count = chunk_count(row["total_size"], row["chunk_size"])
+    # Like tus's Upload-Offset: the bytes received without a gap from the start.
+    offset = 0
+    for n, size in chunks:
+        if n * row["chunk_size"] != offset:
+            break
+        offset += size
+    data = {
+        "id": row["id"],
+        "filename": row["original_filename"],
+        "size": row["total_size"],
+        "chunk_size": row["chunk_size"],
+        "chunk_count": count,
+        "state": row["state"],
+        "offset": row["total_size"] if row["state"] != "open" else offset,
+        "received": sorted(received),
+        "missing": [n for n in range(count) if n not in received] if row["state"] == "open" else [],
+        "url": url_for("upload_session_status", session_id=row["id"]),
+    }
+    if row["file_id"] is not None:
+        data["file_id"] = row["file_id"]
+    return data
+
+
+def json_error(message: str, status: int):
+    return jsonify({"error": message}), status
+
+
+def upload_sessions_user_only(view_func):
+    # Every resumable upload route refuses admins, like the upload forms.
+    @wraps(view_func)
+    def wrapper(*args, **kwargs):
+        if session.get("role") == "admin":
+            return json_error("Admins cannot upload files.", 403)
+        return view_func(*args, **kwargs)
+    return wrapper
+
+
+@app.route("/dashboard/uploads", methods=["POST"])
+@login_required
+@upload_sessions_user_only
+def upload_session_create():
+    body = request.get_json(silent=True) or {}
+    filename = secure_filename(str(body.get("filename") or ""))
+    try:
+        total_size = int(body.get("size"))
+        chunk_size = int(body.get("chunk_size") or UPLOAD_SESSION_CHUNK_SIZE)
+    except (TypeError, ValueError):
+        return json_error("size and chunk_size must be integers.", 400)
+    if not filename:
+        return json_error("Invalid filename.", 400)
+    if total_size < 1 or total_size > UPLOAD_SESSION_MAX_SIZE:
+        return json_error(f"size must be between 1 and {UPLOAD_SESSION_MAX_SIZE} bytes.", 400)
+    chunk_size = max(UPLOAD_SESSION_MIN_CHUNK_SIZE, min(chunk_size, UPLOAD_SESSION_CHUNK_SIZE))
+
+    user_id = int(session["user_id"])
+    session_id = uuid.uuid4().hex
+    try:
+        create_upload_session(
+            session_id,
+            user_id,
+            filename,
+            body.get("content_type"),
+            total_size,
+            chunk_size,
+            quota=USER_QUOTA_BYTES,
+            max_open=UPLOAD_SESSION_MAX_OPEN,
+        )
+    except QuotaExceeded:
+        return json_error("Storage quota exceeded.", 413)
+    except TooManyUploadSessions:
+        return json_error(
+            f"Too many unfinished uploads (limit {UPLOAD_SESSION_MAX_OPEN}); finish or cancel one first.", 429
+        )
+    create_staging_file(staging_path(UPLOAD_DIR, session_id), total_size)
+
+    row = get_upload_session(user_id, session_id)
+    resp = jsonify(upload_session_json(row, chunks=[]))
+    resp.status_code = 201
+    resp.headers["Location"] = url_for("upload_session_status", session_id=session_id)
+    return resp
+
+
+@app.route("/dashboard/uploads/<session_id>", methods=["GET"])
+@login_required
+@upload_sessions_user_only
+def upload_session_status(session_id: str):
+    row = get_upload_session(int(session["user_id"]), session_id)
+    if not row:
+        return json_error("Upload session not found.", 404)
+    data = upload_session_json(row)
+    resp = jsonify(data)
+    resp.headers["Upload-Offset"] = str(data["offset"])
+    resp.headers["Upload-Length"] = str(row["total_size"])
+    resp.cache_control.no_store = True
+    return resp
+
+
+@app.route("/dashboard/uploads/<session_id>/chunks/<int:chunk_no>", methods=["PUT"])
+@login_required
+@upload_sessions_user_only
+def upload_session_chunk(session_id: str, chunk_no: int):
+    row = get_upload_session(int(session["user_id"]), session_id)
+    if not row:
+        return json_error("Upload session not found.", 404)
+    if row["state"] != "open":
+        return json_error("Upload session is already finalized.", 409)
+
+    count = chunk_count(row["total_size"], row["chunk_size"])
+    if chunk_no >= count:
+        return json_error(f"chunk must be below {count}.", 400)
+    offset = chunk_no * row["chunk_size"]
+    expected = min(row["chunk_size"], row["total_size"] - offset)
+    if request.content_length != expected:
+        return json_error(f"chunk {chunk_no} must be exactly {expected} bytes.", 400)
+
+    path = staging_path(UPLOAD_DIR, session_id)
+    try:
+        written = write_chunk(path, offset, request.stream, expected)
+    except FileNotFoundError:
+        return json_error("Upload session not found.", 404)
+    if written != expected:
+        return json_error("Chunk body ended early.", 400)
+
+    if not record_chunk(session_id, chunk_no, written):
+        return json_error("Upload session is already finalized.", 409)
+    return "", 204
+
+
+@app.route("/dashboard/uploads/<session_id>/finalize", methods=["POST"])
+@login_required
+@upload_sessions_user_only
+def upload_session_finalize(session_id: str):
+    user_id = int(session["user_id"])
+    row = get_upload_session(user_id, session_id)
+    if not row:
+        return json_error("Upload session not found.", 404)
+    if row["state"] == "complete":
+        # A retry after a lost response gets the same file back.
+        f = get_file_for_user(user_id, row["file_id"])
+        if not f:
+            return json_error("The uploaded file has since been deleted.", 410)
+        return jsonify({"id": f["id"], "file_size": f["file_size"], "sha256": f["sha256"]}), 200
+
+    chunks = list_received_chunks(session_id)
+    data = upload_session_json(row, chunks)
+    if data["missing"]:
+        return jsonify(dict(data, error="Upload is incomplete.")), 409
+    if not claim_upload_session(session_id):
+        return json_error("Upload session is being finalized.", 409)
+
+    f = IncomingFile.from_staged(
+        staging_path(UPLOAD_DIR, session_id), row["original_filename"], row["content_type"]
     )
+    try:
+        maybe_compress(f)
+        stored_filename, storage_path = prepare_upload(f)
+        file_id = insert_file(
+            user_id=user_id,
+            original_filename=f.original_filename,
+            stored_filename=stored_filename,
+            content_type=f.content_type,
+            file_size=f.file_size,
+            storage_path=storage_path,
+            sha256=f.sha256,
+            quota=USER_QUOTA_BYTES,
+            codec=f.codec,
+        )
+    except QuotaExceeded:
+        f.discard()
+        delete_upload_session(user_id, session_id)
+        return json_error("Storage quota exceeded.", 413)
+    except Exception:
+        # The staged bytes may already be compressed; they cannot be resumed.
+        f.discard()
+        delete_upload_session(user_id, session_id)
+        raise
 
-    flash("File uploaded successfully.", "success")
-    return redirect(url_for("dashboard"))
+    # Same ordering as a direct upload: the blob is placed after COMMIT.
+    blob = get_blob(f.sha256)
+    place_upload(f, UPLOAD_DIR, blob["storage_path"], blob["codec"])
+    complete_upload_session(session_id, file_id)
+
+    expire_upload_sessions(UPLOAD_DIR, UPLOAD_SESSION_TTL)
+
+    return jsonify({"id": file_id, "file_size": f.file_size, "sha256": f.sha256}), 201
+
+
+@app.route("/dashboard/uploads/<session_id>", methods=["DELETE"])
+@login_required
+@upload_sessions_user_only
+def upload_session_delete(session_id: str):
+    row = get_upload_session(int(session["user_id"]), session_id)
+    if not row:
+        return json_error("Upload session not found.", 404)
+    if row["state"] == "finalizing":
+        return json_error("Upload session is being finalized.", 409)
+    delete_upload_session(int(session["user_id"]), session_id)
+    remove_staging_file(staging_path(UPLOAD_DIR, session_id))
+    return "", 204
 
 
 @app.route("/dashboard/download/<int:file_id>", methods=["GET"])
@@ -376,12 +998,141 @@ def dashboard_download(file_id: int):
     if not row:
         abort(404)
 
-    return send_from_directory(
-        UPLOAD_DIR,
-        row["stored_filename"],
-        as_attachment=True,
-        download_name=row["original_filename"],
-    )
+    # A compressed blob is sent as stored, with Content-Encoding, to clients
+    # that accept its codec, and decompressed on the fly for the rest. Each
+    # representation gets its own ETag, and ranges apply to whichever bytes
+    # are sent.
+    codec = row["codec"]
+    encoded = codec is not None and request.accept_encodings[codec] > 0
+
+    # Uploads never change once stored, so the content hash is a strong
+    # validator and a revalidation can be answered without touching disk.
+    etag = row["sha256"]
+    if etag and encoded:
+        etag = f"{etag}-{codec}"
+    last_modified = parse_db_timestamp(row["uploaded_at"])
+    if etag and not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        resp = app.response_class(status=304)
+        resp.set_etag(etag)
+        resp.last_modified = last_modified
+        if codec is not None:
+            resp.vary.add("Accept-Encoding")
+        set_download_cache_headers(resp)
+        return resp
+
+    if codec is not None and not encoded:
+        resp = decompressed_download(row, etag, last_modified)
+    elif codec is None and DOWNLOAD_OFFLOAD in ("x-accel", "x-sendfile"):
+        resp = offloaded_download(row, etag, last_modified)
+    else:
+        environ = request.environ
+        if DOWNLOAD_OFFLOAD == "none" and "wsgi.file_wrapper" in environ:
+            environ = {k: v for k, v in environ.items() if k != "wsgi.file_wrapper"}
+        # conditional=True makes werkzeug answer Range/If-Range with 206 and
+        # falls back to a size+mtime ETag for rows stored before hashing.
+        resp = send_from_directory(
+            UPLOAD_DIR,
+            row["storage_path"],
+            environ,
+            as_attachment=True,
+            download_name=row["original_filename"],
+            conditional=True,
+            etag=etag or True,
+            last_modified=last_modified,
+            response_class=app.response_class,
+        )
+        if encoded:
+            resp.content_encoding = codec
+    if codec is not None:
+        resp.vary.add("Accept-Encoding")
+    # werkzeug only advertises ranges on 206; say so up front so clients
+    # know an interrupted download can be resumed.
+    resp.accept_ranges = "bytes"
+    set_download_cache_headers(resp)
+    return resp
+
+
+def decompressed_download(row, etag, last_modified):
+    """Stream a compressed blob's original bytes as an attachment."""
+    path = absolute_path(UPLOAD_DIR, row["storage_path"])
+    try:
+        fh = open(path, "rb") if path else None
+    except FileNotFoundError:
+        fh = None
+    if fh is None:
+        abort(404)
+
+    def body():
+        with fh:
+            yield from iter_decompressed(fh, row["codec"])
+
+    resp = attachment_response(row, body(), etag, last_modified)
+    resp.content_length = row["file_size"]
+    # The original length is known, so werkzeug can still serve a Range by
+    # skipping into the decompressed stream.
+    return resp.make_conditional(request.environ, accept_ranges=True, complete_length=row["file_size"])
+
+
+def offloaded_download(row, etag, last_modified):
+    """Headers-only response asking the front proxy to send the file.
+
+    The proxy reads the file itself and handles Range; 304s were already
+    answered above.
+    """
+    if DOWNLOAD_OFFLOAD == "x-accel":
+        target = DOWNLOAD_OFFLOAD_PREFIX.rstrip("/") + "/" + quote(row["storage_path"])
+        header = "X-Accel-Redirect"
+    else:
+        target = absolute_path(UPLOAD_DIR, row["storage_path"])
+        header = "X-Sendfile"
+    if target is None:
+        abort(404)
+    resp = attachment_response(row, None, etag, last_modified)
+    resp.headers[header] = target
+    return resp
+
+
+def attachment_response(row, body, etag, last_modified):
+    mimetype = mimetypes.guess_type(row["original_filename"])[0] or "application/octet-stream"
+    resp = app.response_class(body, mimetype=mimetype)
+    resp.headers.set("Content-Disposition", "attachment", filename=row["original_filename"])
+    if etag:
+        resp.set_etag(etag)
+    resp.last_modified = last_modified
+    return resp
+
+
+@app.route("/dashboard/download_zip", methods=["GET"])
+@login_required
+def dashboard_download_zip():
+    """Stream the user's files as one ZIP, built while it is being sent.
+
+    ?id=<file_id> (repeatable) limits the archive to those files; without
+    it every file is included.
+    """
+    if session.get("role") == "admin":
+        return redirect(url_for("admin_dashboard"))
+
+    user_id = int(session["user_id"])
+    try:
+        file_ids = [int(i) for i in request.args.getlist("id")] or None
+    except ValueError:
+        abort(400)
+
+    def entries():
+        for row in iter_files_for_user(user_id, file_ids):
+            yield (
+                row["original_filename"],
+                absolute_path(UPLOAD_DIR, row["storage_path"]),
+                row["file_size"],
+                row["uploaded_at"],
+                row["codec"],
+            )
+
+    resp = app.response_class(stream_zip(entries()), mimetype="application/zip")
+    resp.headers["Content-Disposition"] = "attachment; filename=files.zip"
+    set_download_cache_headers(resp)
+    return resp
 
 
 @app.route("/dashboard/delete/<int:file_id>", methods=["POST"])
@@ -396,15 +1147,8 @@ def dashboard_delete(file_id: int):
         flash("File not found.", "error")
         return redirect(url_for("dashboard"))
 
-    file_path = os.path.join(UPLOAD_DIR, row["stored_filename"])
-
-    deleted = delete_file_record_for_user(user_id, file_id)
+    deleted = delete_file_record_for_user(user_id, file_id, remove_stored=remove_stored)
     if deleted:
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-        except Exception:
-            pass
         flash("File deleted.", "success")
     else:
         flash("Failed to delete file.", "error")
@@ -413,8 +1157,67 @@ def dashboard_delete(file_id: int):
 
 
 
+@app.cli.command("reshard-uploads")
+@click.option("--layout", default=None, help="Target layout (default: UPLOAD_LAYOUT).")
+@click.option("--batch-size", default=500, show_default=True, help="Rows per transaction.")
+@click.option("--dry-run", is_flag=True, help="Report what would move without moving it.")
+def reshard_uploads_command(layout, batch_size, dry_run):
+    """Move stored uploads into the configured directory layout."""
+    stats = reshard_uploads(
+        UPLOAD_DIR,
+        layout=get_layout(layout),
+        batch_size=batch_size,
+        dry_run=dry_run,
+        log=click.echo,
+    )
+    prefix = "Would move" if dry_run else "Moved"
+    click.echo(f"{prefix} {stats['blobs_moved']} blobs and {stats['files_moved']} files; {stats['missing']} missing on disk.")
+
+
+@app.cli.command("reconcile-uploads")
+@click.option("--batch-size", default=500, show_default=True, help="Paths or rows per transaction.")
+@click.option("--rate", default=UPLOAD_GC_RATE, show_default=True, help="Maximum deletions per second (0 = unlimited).")
+@click.option("--grace", default=UPLOAD_GC_GRACE, show_default=True, help="Leave anything newer than this many seconds.")
+@click.option("--dry-run", is_flag=True, help="Report orphans and dangling rows without removing them.")
+@click.option(
+    "--max-dangling-ratio",
+    default=UPLOAD_GC_MAX_DANGLING_RATIO,
+    show_default=True,
+    help="Keep dangling rows if more than this share of rows is missing its file.",
+)
+@click.option("--force", is_flag=True, help="Remove dangling rows even if the safety check trips.")
+def reconcile_uploads_command(batch_size, rate, grace, dry_run, max_dangling_ratio, force):
+    """Remove stored files no row references and rows whose file is gone."""
+    reconcile_uploads(
+        UPLOAD_DIR,
+        batch_size=batch_size,
+        max_deletes_per_sec=rate,
+        grace_seconds=grace,
+        dry_run=dry_run,
+        max_dangling_ratio=max_dangling_ratio,
+        force=force,
+        progress=gc_progress,
+        log=click.echo,
+    )
+
+
+@app.cli.command("logout-all")
+def logout_all_command():
+    """End every session on every worker."""
+    session_epoch.bump()
+    click.echo("Session epoch bumped; all users must log in again.")
+
+
 init_db()
 ensure_seed_admin()
+start_checkpointer()
+start_reconciler(
+    UPLOAD_DIR,
+    UPLOAD_GC_INTERVAL,
+    max_deletes_per_sec=UPLOAD_GC_RATE,
+    grace_seconds=UPLOAD_GC_GRACE,
+    max_dangling_ratio=UPLOAD_GC_MAX_DANGLING_RATIO,
+)
 
 if os.getenv("SHOW_STARTUP_BANNER", "1") == "1":
     sys.stdout.write("\n===================================\n")
@@ -425,4 +1228,6 @@ if os.getenv("SHOW_STARTUP_BANNER", "1") == "1":
 
 
 if __name__ == "__main__":
+    # Under gunicorn this happens once in gunicorn.conf.py instead.
+    session_epoch.bump()
     app.run(host="0.0.0.0", port=5000)
@@ -0,0 +1,313 @@
+"""ASGI entry point: the same portal as app:app, for an async server.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+Every route still runs in the Flask app on a pooled thread, so sessions,
+the session epoch, flashes, metrics and error pages behave exactly as under gunicorn.
+What moves to the event loop is waiting on the network:
+
+  * request bodies are received before a thread is taken. Multipart
+    uploads to the upload views are parsed as they arrive, straight into
+    their .incoming temp files, and handed to the view already received;
+    other bodies are spooled.
+  * response bodies are produced one chunk per thread hop (a file read, a
+    decompressed block, a ZIP piece) and sent from the loop, so a slow
+    download holds no thread while the client reads.
+
+File I/O and SQLite calls therefore only ever occupy a thread for as long
+as they run, and one process can hold hundreds of slow transfers.
+"""
+import os
+import sys
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_options_header
+from werkzeug.wsgi import FileWrapper
+
+from storage import RECEIVED_FILES_KEY, MultipartReceiver
+
+# Threads for view code, DB calls and file I/O; each is held only briefly.
+ASGI_THREADS = int(os.getenv("ASGI_THREADS", "32"))
+# Bytes read from a file per thread hop when sending a download.
+ASGI_FILE_CHUNK_SIZE = int(os.getenv("ASGI_FILE_CHUNK_SIZE", "262144"))
+# Upload bytes gathered on the loop before a thread parses and writes them.
+ASGI_UPLOAD_FEED_SIZE = int(os.getenv("ASGI_UPLOAD_FEED_SIZE", "262144"))
+# Non-upload bodies up to this size stay in memory while spooled.
+ASGI_SPOOL_MEMORY = 1024 * 1024
+
+# Endpoints whose multipart body is received and parsed on the event loop.
+NATIVE_UPLOAD_ENDPOINTS = ("dashboard_upload", "dashboard_upload_batch")
+
+_END = object()
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class PortalASGI:
+    """ASGI application around the portal's Flask app.
+
+    `portal` is the app module; its attributes are read per request, so
+    configuration changes (and test monkeypatches) apply as they do to the
+    WSGI app.
+    """
+
+    def __init__(self, portal, threads: int = ASGI_THREADS):
+        self.portal = portal
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            await self._http(scope, receive, send)
+        else:
+            raise RuntimeError(f"Unsupported ASGI scope type {scope['type']!r}")
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # A server start logs everyone out, as gunicorn.conf.py does
+                # for gunicorn. Run one process: uvicorn repeats lifespan in
+                # each of its workers.
+                await self._run(self.portal.session_epoch.bump)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    # Requests
+
+    async def _http(self, scope, receive, send):
+        environ = self._environ(scope)
+        try:
+            plan = await self._upload_plan(environ)
+            if plan == "receive":
+                await self._receive_upload(environ, receive)
+            elif plan == "refuse":
+                # The view answers without reading, exactly as a WSGI server
+                # would leave the body unread.
+                environ["wsgi.input"] = _EmptyInput()
+            else:
+                await self._spool_body(environ, receive)
+        except ClientDisconnected:
+            return
+
+        disconnected = asyncio.Event()
+        watcher = asyncio.ensure_future(self._watch_disconnect(receive, disconnected))
+        try:
+            await self._respond(environ, send, disconnected)
+        finally:
+            watcher.cancel()
+
+    def _environ(self, scope) -> dict:
+        root = scope.get("root_path", "")
+        path = scope["path"]
+        if root and path.startswith(root):
+            path = path[len(root):]
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": root.encode("utf-8").decode("latin-1"),
+            "PATH_INFO": path.encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1] or 80),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+            "wsgi.file_wrapper": self._file_wrapper,
+        }
+        for raw_name, raw_value in scope.get("headers", ()):
+            name = raw_name.decode("latin-1").lower()
+            value = raw_value.decode("latin-1")
+            if name == "content-type":
+                key = "CONTENT_TYPE"
+            elif name == "content-length":
+                key = "CONTENT_LENGTH"
+            else:
+                key = "HTTP_" + name.upper().replace("-", "_")
+            if key in environ:
+                value = environ[key] + ("; " if key == "HTTP_COOKIE" else ",") + value
+            environ[key] = value
+        return environ
+
+    @staticmethod
+    def _file_wrapper(fh, buffer_size=8192):
+        # werkzeug asks for 8 KiB; larger reads mean fewer thread hops.
+        return FileWrapper(fh, max(buffer_size, ASGI_FILE_CHUNK_SIZE))
+
+    def _content_length(self, environ):
+        try:
+            return int(environ["CONTENT_LENGTH"])
+        except (KeyError, ValueError):
+            return None
+
+    async def _upload_plan(self, environ):
+        """"receive" for a multipart upload the view will read, "refuse" for
+        one it will turn away unread, None for every other request."""
+        if environ["REQUEST_METHOD"] != "POST":
+            return None
+        length = self._content_length(environ)
+        max_length = self.portal.app.config["MAX_CONTENT_LENGTH"]
+        if length is None or (max_length is not None and length > max_length):
+            return None
+        mimetype, options = parse_options_header(environ.get("CONTENT_TYPE"))
+        if mimetype != "multipart/form-data" or not options.get("boundary"):
+            return None
+        try:
+            endpoint, _ = self.portal.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return None
+        if endpoint not in NATIVE_UPLOAD_ENDPOINTS:
+            return None
+        allowed = await self._run(self.portal.may_receive_upload, environ)
+        return "receive" if allowed else "refuse"
+
+    async def _receive_upload(self, environ, receive):
+        _, options = parse_options_header(environ.get("CONTENT_TYPE"))
+        receiver = MultipartReceiver(options["boundary"], self.portal.UPLOAD_DIR)
+        buffered, size = [], 0
+        try:
+            more = True
+            while more and not receiver.done:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    raise ClientDisconnected()
+                body = message.get("body", b"")
+                more = message.get("more_body", False)
+                if body:
+                    buffered.append(body)
+                    size += len(body)
+                if size >= ASGI_UPLOAD_FEED_SIZE or (not more and buffered):
+                    await self._run(receiver.feed, b"".join(buffered))
+                    buffered, size = [], 0
+            if not receiver.done:
+                await self._run(receiver.feed, b"")
+        except ValueError as e:
+            await self._run(receiver.discard)
+            environ[RECEIVED_FILES_KEY] = e
+        except BaseException:
+            await self._run(receiver.discard)
+            raise
+        else:
+            environ[RECEIVED_FILES_KEY] = receiver.received
+        environ["wsgi.input"] = _EmptyInput()
+
+    async def _spool_body(self, environ, receive):
+        length = self._content_length(environ)
+        max_length = self.portal.app.config["MAX_CONTENT_LENGTH"]
+        if length is not None and max_length is not None and length > max_length:
+            # werkzeug answers 413 from Content-Length without reading.
+            environ["wsgi.input"] = _EmptyInput()
+            return
+
+        limit = max_length + 1 if max_length is not None else None
+        spool = tempfile.SpooledTemporaryFile(max_size=ASGI_SPOOL_MEMORY)
+        received = 0
+        more = True
+        while more and (limit is None or received < limit):
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                spool.close()
+                raise ClientDisconnected()
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if body:
+                # Past the memory limit the spool is a real file; write it
+                # from a thread.
+                if received + len(body) > ASGI_SPOOL_MEMORY:
+                    await self._run(spool.write, body)
+                else:
+                    spool.write(body)
+                received += len(body)
+        spool.seek(0)
+        environ["wsgi.input"] = spool
+        if length is None:
+            # Chunked request: werkzeug reads to EOF instead.
+            environ["wsgi.input_terminated"] = True
+
+    @staticmethod
+    async def _watch_disconnect(receive, disconnected):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                disconnected.set()
+                return
+
+    # Responses
+
+    async def _respond(self, environ, send, disconnected):
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info and started.get("sent"):
+                raise exc_info[1].with_traceback(exc_info[2])
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [
+                (name.lower().encode("latin-1"), str(value).encode("latin-1")) for name, value in headers
+            ]
+            return _unsupported_write
+
+        def first_chunk():
+            iterable = self.portal.app(environ, start_response)
+            iterator = iter(iterable)
+            return iterable, iterator, next(iterator, _END)
+
+        iterable, iterator, chunk = await self._run(first_chunk)
+        try:
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            started["sent"] = True
+            while chunk is not _END and not disconnected.is_set():
+                if chunk:
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                chunk = await self._run(next, iterator, _END)
+            if not disconnected.is_set():
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                await self._run(close)
+            wsgi_input = environ.get("wsgi.input")
+            if wsgi_input is not None:
+                wsgi_input.close()
+
+
+class _EmptyInput:
+    def read(self, size=-1):
+        return b""
+
+    def readline(self, size=-1):
+        return b""
+
+    def close(self):
+        pass
+
+
+def _unsupported_write(data):
+    raise NotImplementedError("The WSGI write() callable is not supported; return an iterable.")
+
+
+def create_asgi_app(portal=None):
+    if portal is None:
+        import app as portal
+    return PortalASGI(portal)
+
+
+app = create_asgi_app()
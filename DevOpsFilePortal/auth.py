@@ -1,5 +1,27 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash
+from flask import session, redirect, url_for, flash, g
+
+from user_repo import get_cached_user
+
+
+def current_user():
+    """The logged-in user's row, checked against the database (via the user
+    cache) once per request. None if the session's user no longer exists."""
+    if "current_user" not in g:
+        user_id = session.get("user_id")
+        g.current_user = get_cached_user(user_id) if user_id is not None else None
+    return g.current_user
+
+
+def _load_session_user():
+    user = current_user()
+    if user is None:
+        session.clear()
+        return None
+    # Keep the session's copy of the role in step with the database.
+    if session.get("role") != user["role"]:
+        session["role"] = user["role"]
+    return user
 
 
 def login_required(view_func):
@@ -7,6 +29,8 @@ def login_required(view_func):
     def wrapper(*args, **kwargs):
         if "user_id" not in session:
             return redirect(url_for("login"))
+        if _load_session_user() is None:
+            return redirect(url_for("login"))
         return view_func(*args, **kwargs)
     return wrapper
 
@@ -17,7 +41,11 @@ def admin_required(view_func):
         if "user_id" not in session:
             return redirect(url_for("login"))
 
-        if session.get("role") != "admin":
+        user = _load_session_user()
+        if user is None:
+            return redirect(url_for("login"))
+
+        if user["role"] != "admin":
             flash("Access denied: Admins only.", "error")
             return redirect(url_for("dashboard"))
 
@@ -0,0 +1,178 @@
+"""Download throughput under gunicorn for each DOWNLOAD_OFFLOAD mode.
+
+Seeds one user with a few large files, then for each mode starts gunicorn
+and measures:
+
+  * fast clients downloading as quickly as they can (MB/s, p95), and
+  * the latency of a light request (/dashboard/files) while slow clients
+    hold downloads open, which is where a 4-thread worker starves.
+
+There is no proxy here, so in the x-accel / x-sendfile modes the clients
+receive only the headers: those rows show what the app itself still
+spends per download once the proxy does the sending.
+
+    python benchmarks/bench_download_offload.py
+    python benchmarks/bench_download_offload.py --file-size 16777216 --slow-clients 6
+"""
+import os
+import sys
+import time
+import socket
+import shutil
+import subprocess
+import argparse
+import tempfile
+import threading
+import types
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from loadtest import bench_env, free_port, logged_in_session, percentile, seed, start_gunicorn  # noqa: E402
+
+MODES = ("none", "sendfile", "x-accel", "x-sendfile")
+
+
+def file_ids(base: str, session) -> list:
+    return [f["id"] for f in session.get(f"{base}/dashboard/files", params={"limit": 500}).json()["files"]]
+
+
+def fast_downloads(base: str, concurrency: int, duration: float):
+    latencies, sent = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(i):
+        s = logged_in_session(base, "load0")
+        ids = file_ids(base, s)
+        local, n, k = [], 0, i
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            r = s.get(f"{base}/dashboard/download/{ids[k % len(ids)]}")
+            local.append(time.perf_counter() - start)
+            n += len(r.content)
+            k += 1
+        with lock:
+            latencies.extend(local)
+            sent[0] += n
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    ms = sorted(v * 1000 for v in latencies)
+    return {
+        "requests": len(ms),
+        "rps": len(ms) / elapsed,
+        "mb_per_s": sent[0] / elapsed / 1e6,
+        "p95_ms": percentile(ms, 95),
+    }
+
+
+class SlowClientAdapter(HTTPAdapter):
+    """A small receive buffer, like a client on a real WAN link.
+
+    On loopback the kernel would otherwise buffer tens of megabytes per
+    connection and let the server thread finish long before the client
+    has read the body.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["socket_options"] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_RCVBUF, 65536),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+
+
+def probe_under_slow_clients(base: str, slow_clients: int, rate: int, file_size: int, duration: float):
+    """p95 of /dashboard/files while `slow_clients` read downloads at `rate` B/s.
+
+    Each slow download takes file_size / rate seconds even when the body is
+    empty (offload modes), as it would if the proxy were sending it.
+    """
+    stop = threading.Event()
+    # Logged in up front: once the slow clients hold every thread, even the
+    # login would queue.
+    probe = logged_in_session(base, "load0")
+
+    def slow_reader():
+        s = logged_in_session(base, "load0")
+        ids = file_ids(base, s)
+        s.mount("http://", SlowClientAdapter())
+        k = 0
+        while not stop.is_set():
+            done_at = time.monotonic() + file_size / rate
+            with s.get(f"{base}/dashboard/download/{ids[k % len(ids)]}", stream=True) as r:
+                for chunk in r.iter_content(65536):
+                    if stop.is_set():
+                        break
+                    time.sleep(len(chunk) / rate)
+            stop.wait(max(0.0, done_at - time.monotonic()))
+            k += 1
+
+    readers = [threading.Thread(target=slow_reader, daemon=True) for _ in range(slow_clients)]
+    for t in readers:
+        t.start()
+    time.sleep(1.0)
+
+    latencies, timeouts = [], 0
+    stop_at = time.perf_counter() + duration
+    while time.perf_counter() < stop_at:
+        start = time.perf_counter()
+        try:
+            probe.get(f"{base}/dashboard/files", timeout=10)
+            latencies.append(time.perf_counter() - start)
+        except requests.Timeout:
+            timeouts += 1
+        time.sleep(0.05)
+    stop.set()
+    ms = sorted(v * 1000 for v in latencies)
+    # nan: every probe timed out.
+    return {"probe_p95_ms": percentile(ms, 95) if ms else float("nan"), "probe_timeouts": timeouts}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2)
+    parser.add_argument("--file-size", type=int, default=64 * 1024 * 1024)
+    parser.add_argument("--concurrency", type=int, default=4, help="fast download clients")
+    parser.add_argument("--slow-clients", type=int, default=4)
+    parser.add_argument("--slow-rate", type=int, default=512 * 1024, help="bytes/s per slow client")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per measurement")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads")
+    parser.add_argument("--mode", action="append", choices=MODES, help="modes to run (default: all)")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="portal-offload-")
+    env = bench_env(workdir, types.SimpleNamespace(upload_size=0))
+    try:
+        seed(env, 1, args.files, args.file_size)
+        print(f"{'mode':<12}{'reqs':>8}{'rps':>9}{'MB/s':>10}{'p95 ms':>10}{'probe p95':>12}{'timeouts':>10}")
+        for mode in args.mode or MODES:
+            proc, base = start_gunicorn(dict(env, DOWNLOAD_OFFLOAD=mode), free_port(), 1, args.threads)
+            try:
+                fast = fast_downloads(base, args.concurrency, args.duration)
+                slow = probe_under_slow_clients(base, args.slow_clients, args.slow_rate, args.file_size, args.duration)
+            finally:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+            print(
+                f"{mode:<12}{fast['requests']:>8}{fast['rps']:>9.1f}{fast['mb_per_s']:>10.1f}"
+                f"{fast['p95_ms']:>10.1f}{slow['probe_p95_ms']:>12.1f}{slow['probe_timeouts']:>10}"
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Per-request and per-query cost of the metrics hooks.
+
+Runs the before/after/teardown hooks inside a bare request context, so the
+number is the instrumentation alone, not Flask routing. The query figure
+compares a timed cursor against a plain one on an in-memory database.
+
+    python benchmarks/bench_metrics_overhead.py
+    python benchmarks/bench_metrics_overhead.py --iterations 500000
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from db import db  # noqa: E402
+from metrics import AppMetrics  # noqa: E402
+
+
+def bench_request_hooks(iterations: int) -> float:
+    app = Flask(__name__)
+
+    @app.route("/dashboard")
+    def dashboard():
+        return ""
+
+    m = AppMetrics(download_endpoints=("dashboard_download",))
+    response = app.response_class("ok")
+
+    with app.test_request_context("/dashboard"):
+        # test_request_context does not run URL matching hooks; match here so
+        # request.endpoint is set as it would be in a real request.
+        from flask import request
+        request.url_rule, request.view_args = app.url_map.bind("localhost").match("/dashboard", return_rule=True)
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            m._before()
+            m._after(response)
+            m._teardown(None)
+        elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+def bench_empty_request(iterations: int, instrumented: bool) -> float:
+    """A whole request through the test client, for scale."""
+    app = Flask(__name__)
+
+    @app.route("/ping")
+    def ping():
+        return "ok"
+
+    if instrumented:
+        AppMetrics().install(app)
+
+    client = app.test_client()
+    client.get("/ping")
+    start = time.perf_counter()
+    for _ in range(iterations):
+        client.get("/ping")
+    elapsed = time.perf_counter() - start
+    return elapsed / iterations * 1e6
+
+
+def bench_query(iterations: int, timed: bool) -> float:
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.execute("INSERT INTO t (v) VALUES ('x')")
+    m = AppMetrics()
+    db.set_query_observer(m.observe_query if timed else None)
+    cur = conn.cursor(db._TimedCursor) if timed else conn.cursor()
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        cur.execute("SELECT v FROM t WHERE id = ?", (1,)).fetchone()
+    elapsed = time.perf_counter() - start
+
+    db.set_query_observer(None)
+    conn.close()
+    return elapsed / iterations * 1e6
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args(argv)
+
+    hooks = bench_request_hooks(args.iterations)
+    bare = bench_empty_request(args.iterations // 20, instrumented=False)
+    full = bench_empty_request(args.iterations // 20, instrumented=True)
+    plain = bench_query(args.iterations, timed=False)
+    timed = bench_query(args.iterations, timed=True)
+
+    print(f"{'request hooks':<28}{hooks:>10.2f} us/request")
+    print(f"{'empty request (bare)':<28}{bare:>10.2f} us/request")
+    print(f"{'empty request (metrics)':<28}{full:>10.2f} us/request")
+    print(f"{'query (plain cursor)':<28}{plain:>10.2f} us/query")
+    print(f"{'query (timed cursor)':<28}{timed:>10.2f} us/query")
+    print(f"{'query overhead':<28}{timed - plain:>10.2f} us/query")
+
+
+if __name__ == "__main__":
+    main()
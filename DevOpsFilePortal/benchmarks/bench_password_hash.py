@@ -0,0 +1,57 @@
+"""Password hashing throughput per policy setting.
+
+Each login verifies one hash on one core, so hashes/sec here is roughly the
+number of logins per second a single gunicorn thread can absorb.
+
+    python benchmarks/bench_password_hash.py
+    python benchmarks/bench_password_hash.py --setting pbkdf2:sha256=300000 --setting scrypt=16384
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import HashPolicy  # noqa: E402
+
+DEFAULT_SETTINGS = [
+    "pbkdf2:sha256=100000",
+    "pbkdf2:sha256=300000",
+    "pbkdf2:sha256=600000",
+    "scrypt=16384",
+    "scrypt=32768",
+]
+
+
+def parse_setting(s: str) -> HashPolicy:
+    method, _, cost = s.partition("=")
+    return HashPolicy(method, cost or None)
+
+
+def measure(policy: HashPolicy, seconds: float):
+    count = 0
+    start = time.perf_counter()
+    while True:
+        policy.hash("benchmark-password")
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return count / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--setting", action="append", help="METHOD=COST, repeatable")
+    parser.add_argument("--seconds", type=float, default=2.0, help="time spent per setting")
+    args = parser.parse_args(argv)
+
+    print(f"{'method':<28}{'hashes/s/core':>14}{'ms/hash':>10}")
+    for spec in args.setting or DEFAULT_SETTINGS:
+        policy = parse_setting(spec)
+        rate = measure(policy, args.seconds)
+        print(f"{policy.method_string:<28}{rate:>14.1f}{1000 / rate:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
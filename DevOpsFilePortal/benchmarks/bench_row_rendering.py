@@ -0,0 +1,122 @@
+"""Dashboard row rendering: old f-string builder vs Jinja macro vs cache hit.
+
+    python benchmarks/bench_row_rendering.py
+    python benchmarks/bench_row_rendering.py --rows 1000 --rows 10000 --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import escape
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fragments import FragmentCache, fmt_bytes, fmt_dt  # noqa: E402
+
+
+def legacy_build_files_rows_html(files) -> str:
+    # The builder app.py used before the _rows.html macros, kept for comparison.
+    def fmt_dt(s: str) -> str:
+        try:
+            date_part, time_part = s.split(" ")
+            y, m, d = date_part.split("-")
+            hh, mm, _ss = time_part.split(":")
+            return f"{d}/{m}/{y} {hh}:{mm}"
+        except Exception:
+            return escape(s)
+
+    rows = []
+    for f in files:
+        fid = int(f["id"])
+        fname = escape(f["original_filename"])
+        size = f["file_size"] if f["file_size"] else "-"
+        uploaded_at_raw = f["uploaded_at"] or ""
+        uploaded_at = fmt_dt(str(uploaded_at_raw))
+
+        rows.append(
+            "<tr>"
+            f"<td>{fid}</td>"
+            f"<td>{fname}</td>"
+            f"<td>{size}</td>"
+            f"<td>{uploaded_at}</td>"
+            "<td>"
+            '<div class="actions-row">'
+            f'<a class="action-link" href="/dashboard/download/{fid}">Download</a>'
+            f'<form method="POST" action="/dashboard/delete/{fid}" '
+            f'onsubmit="return confirm(\'Delete this file?\')">'
+            f'<button class="btn btn-danger delete-btn" type="submit">Delete</button>'
+            f"</form>"
+            "</div>"
+            "</td>"
+            "</tr>"
+        )
+
+    if not rows:
+        return '<tr><td colspan="5" class="muted">No files uploaded yet.</td></tr>'
+
+    return "".join(rows)
+
+
+def make_rows(n):
+    return [
+        {
+            "id": n - i,
+            "display_no": n - i,
+            "original_filename": f"report_{i}_<draft>.csv",
+            "file_size": 1024 + i,
+            "uploaded_at": "2025-11-03 14:%02d:%02d" % (i // 60 % 60, i % 60),
+        }
+        for i in range(n)
+    ]
+
+
+def load_row_macros():
+    """The _rows.html macros, with the filters app.py registers for them."""
+    env = Environment(loader=FileSystemLoader(os.path.join(ROOT, "templates")), autoescape=True)
+    env.filters["fmt_dt"] = fmt_dt
+    env.filters["fmt_bytes"] = fmt_bytes
+    return env.get_template("_rows.html").module
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, action="append", help="row count, repeatable")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    file_rows = load_row_macros().file_rows
+
+    print(f"{'rows':>8}{'f-string ms':>14}{'macro ms':>12}{'cached ms':>12}")
+    for n in args.rows or [1_000, 10_000, 100_000]:
+        rows = make_rows(n)
+        cache = FragmentCache()
+
+        def cached():
+            # Same work as app.build_files_rows_html on a hit: build the key
+            # from the page's ids, then look it up.
+            key = tuple(int(r["id"]) for r in rows)
+            html = cache.get(1, key)
+            if html is None:
+                cache.put(1, key, file_rows(rows))
+
+        cached()  # warm
+        legacy = best_of(lambda: legacy_build_files_rows_html(rows), args.repeat)
+        macro = best_of(lambda: file_rows(rows), args.repeat)
+        hit = best_of(cached, args.repeat)
+        print(f"{n:>8}{legacy * 1000:>14.2f}{macro * 1000:>12.2f}{hit * 1000:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,351 @@
+"""Load test of the portal's hot paths under gunicorn.
+
+Seeds a throwaway database and upload directory, starts the real app under
+gunicorn on localhost, and drives each route with concurrent clients for a
+fixed time. Prints p50/p95/p99 latency and requests/sec per route and
+writes them as JSON. Given a baseline JSON, exits 1 if any route regressed
+by more than --tolerance.
+
+    python benchmarks/loadtest.py
+    python benchmarks/loadtest.py --users 50 --files-per-user 2000 --concurrency 16 --output run.json
+    python benchmarks/loadtest.py --baseline baseline.json --tolerance 0.25
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import socket
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = ("login", "dashboard", "files_json", "upload", "download")
+PASSWORD = "loadtest-pw"
+
+
+def bench_env(workdir: str, args) -> dict:
+    """Environment shared by the seeding step and the gunicorn workers."""
+    env = dict(os.environ)
+    env.update(
+        SQLITE_PATH=os.path.join(workdir, "db", "app.db"),
+        UPLOAD_DIR=os.path.join(workdir, "uploads"),
+        SHOW_STARTUP_BANNER="0",
+        ENABLE_GH_LOGIN_ALERTS="0",
+        UPLOAD_GC_INTERVAL="0",
+        USER_QUOTA_BYTES="0",
+        # Every client logs in from 127.0.0.1; the throttle would block them.
+        LOGIN_THROTTLE_MAX_PER_IP="0",
+        LOGIN_THROTTLE_MAX_PER_USER="0",
+        MAX_CONTENT_LENGTH=str(max(args.upload_size * 2, 10485760)),
+    )
+    return env
+
+
+def seed(env: dict, users: int, files_per_user: int, file_size: int):
+    """Create users and files directly through the repo modules.
+
+    Runs in a child process so the modules read the benchmark's SQLITE_PATH
+    and UPLOAD_DIR at import time.
+    """
+    code = f"""
+import os, hashlib, uuid
+from db.db import init_db, close_pool
+from user_repo import create_user
+from file_repo import insert_files
+from storage import blob_path, absolute_path
+
+init_db()
+upload_dir = os.environ["UPLOAD_DIR"]
+os.makedirs(upload_dir, exist_ok=True)
+for u in range({users}):
+    uid = create_user(f"load{{u}}", {PASSWORD!r})
+    records = []
+    for i in range({files_per_user}):
+        content = hashlib.sha256(f"{{u}}/{{i}}".encode()).digest() * ({file_size} // 32 + 1)
+        content = content[:{file_size}]
+        sha = hashlib.sha256(content).hexdigest()
+        rel = blob_path(sha)
+        path = absolute_path(upload_dir, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(content)
+        records.append(dict(
+            original_filename=f"file{{i}}.bin",
+            stored_filename=f"{{uuid.uuid4().hex}}_file{{i}}.bin",
+            content_type="application/octet-stream",
+            file_size=len(content),
+            storage_path=rel,
+            sha256=sha,
+        ))
+        if len(records) == 500:
+            insert_files(uid, records)
+            records = []
+    insert_files(uid, records)
+close_pool()
+"""
+    subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, check=True)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(env: dict, port: int, workers: int, threads: int):
+    cmd = [
+        sys.executable, "-m", "gunicorn", "app:app",
+        "-b", f"127.0.0.1:{port}",
+        "--workers", str(workers),
+        "--threads", str(threads),
+        "--log-level", "warning",
+        "--access-logfile", "/dev/null",
+    ]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("gunicorn exited during startup")
+        try:
+            requests.get(f"{base}/login", timeout=1)
+            return proc, base
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("gunicorn did not start within 30s")
+
+
+def logged_in_session(base: str, username: str):
+    s = requests.Session()
+    r = s.post(f"{base}/login", data={"username": username, "password": PASSWORD}, allow_redirects=False)
+    if r.status_code != 302:
+        raise RuntimeError(f"login as {username} failed: {r.status_code}")
+    return s
+
+
+class Client:
+    """One simulated user with its own session and file ids.
+
+    Redirects are never followed: a lost session answers 302 to /login,
+    which must count as an error rather than as a served page.
+    """
+
+    def __init__(self, base: str, username: str, upload_size: int):
+        self.base = base
+        self.username = username
+        self.session = logged_in_session(base, username)
+        self.upload_body = os.urandom(upload_size)
+        sizes = {}
+        cursor = None
+        while True:
+            params = {"limit": 500}
+            if cursor:
+                params["cursor"] = cursor
+            r = self.session.get(f"{base}/dashboard/files", params=params, allow_redirects=False)
+            r.raise_for_status()
+            page = r.json()
+            sizes.update((f["id"], f["file_size"]) for f in page["files"])
+            cursor = page["next_cursor"]
+            if not cursor or len(sizes) >= 5000:
+                break
+        self.file_sizes = sizes
+        self.file_ids = list(sizes)
+
+    def login(self):
+        r = requests.post(
+            f"{self.base}/login",
+            data={"username": self.username, "password": PASSWORD},
+            allow_redirects=False,
+        )
+        return r.status_code == 302
+
+    def dashboard(self):
+        r = self.session.get(f"{self.base}/dashboard", allow_redirects=False)
+        return r.status_code == 200 and r.headers.get("Content-Type", "").startswith("text/html")
+
+    def files_json(self):
+        r = self.session.get(f"{self.base}/dashboard/files", allow_redirects=False)
+        return r.status_code == 200 and r.headers.get("Content-Type", "").startswith("application/json")
+
+    def upload(self):
+        r = self.session.post(
+            f"{self.base}/dashboard/submit",
+            files={"file": ("load.bin", self.upload_body)},
+            allow_redirects=False,
+        )
+        return r.status_code == 302
+
+    def download(self):
+        if not self.file_ids:
+            return False
+        file_id = random.choice(self.file_ids)
+        r = self.session.get(f"{self.base}/dashboard/download/{file_id}", allow_redirects=False)
+        return (
+            r.status_code == 200
+            and r.headers.get("Content-Disposition", "").startswith("attachment")
+            and len(r.content) == self.file_sizes[file_id]
+        )
+
+
+def percentile(sorted_values, p: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[k]
+
+
+def run_route(clients, route: str, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(client):
+        nonlocal errors
+        op = getattr(client, route)
+        local, failed = [], 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            try:
+                ok = op()
+            except requests.RequestException:
+                ok = False
+            local.append(time.perf_counter() - start)
+            failed += not ok
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(c,)) for c in clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = [v * 1000 for v in latencies]
+    return {
+        "requests": len(ms),
+        "errors": errors,
+        "rps": round(len(ms) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ms, 50), 3),
+        "p95_ms": round(percentile(ms, 95), 3),
+        "p99_ms": round(percentile(ms, 99), 3),
+        "mean_ms": round(sum(ms) / len(ms), 3) if ms else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Return regression messages: p95 up or rps down by more than tolerance."""
+    problems = []
+    for route, now in results["routes"].items():
+        before = baseline.get("routes", {}).get(route)
+        if not before:
+            continue
+        if before["p95_ms"] and now["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            problems.append(f"{route}: p95 {before['p95_ms']:.1f} -> {now['p95_ms']:.1f} ms")
+        if before["rps"] and now["rps"] < before["rps"] * (1 - tolerance):
+            problems.append(f"{route}: rps {before['rps']:.1f} -> {now['rps']:.1f}")
+        if now["errors"] and not before.get("errors"):
+            problems.append(f"{route}: {now['errors']} errors")
+    return problems
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=8, help="seeded users (one client each, reused round-robin)")
+    parser.add_argument("--files-per-user", type=int, default=200)
+    parser.add_argument("--file-size", type=int, default=16384, help="bytes per seeded file")
+    parser.add_argument("--upload-size", type=int, default=65536, help="bytes per upload request")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent clients per route")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per route")
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn workers")
+    parser.add_argument("--threads", type=int, default=4, help="gunicorn threads per worker")
+    parser.add_argument("--route", action="append", choices=ROUTES, help="routes to run (default: all)")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for file picks")
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--baseline", help="results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--keep", action="store_true", help="keep the seeded data directory")
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="portal-loadtest-")
+    env = bench_env(workdir, args)
+    proc = None
+    try:
+        t0 = time.perf_counter()
+        seed(env, args.users, args.files_per_user, args.file_size)
+        print(f"seeded {args.users} users x {args.files_per_user} files in {time.perf_counter() - t0:.1f}s")
+
+        proc, base = start_gunicorn(env, free_port(), args.workers, args.threads)
+        clients = [
+            Client(base, f"load{i % args.users}", args.upload_size)
+            for i in range(args.concurrency)
+        ]
+
+        results = {
+            "meta": {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "commit": git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "params": {k: v for k, v in vars(args).items() if k not in ("output", "baseline", "keep")},
+            },
+            "routes": {},
+        }
+
+        print(f"{'route':<12}{'reqs':>8}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for route in args.route or ROUTES:
+            r = run_route(clients, route, args.duration)
+            results["routes"][route] = r
+            print(f"{route:<12}{r['requests']:>8}{r['errors']:>6}{r['rps']:>10.1f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if args.keep:
+            print(f"data kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as fh:
+            json.dump(results, fh, indent=2)
+        print(f"wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as fh:
+            problems = compare(results, json.load(fh), args.tolerance)
+        if problems:
+            print("REGRESSIONS:")
+            for p in problems:
+                print(f"  {p}")
+            return 1
+        print(f"no regressions beyond {args.tolerance:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+import os
+import zlib
+
+try:
+    from compression import zstd  # Python 3.14+
+except ImportError:
+    zstd = None
+
+CHUNK_SIZE = 65536
+
+# Worth compressing: text formats by MIME type or, since browsers often
+# send application/octet-stream for them, by extension.
+COMPRESSIBLE_TYPES = {
+    "application/json", "application/xml", "application/javascript", "application/x-ndjson",
+    "application/csv", "application/sql", "application/x-yaml", "application/yaml", "image/svg+xml",
+}
+COMPRESSIBLE_EXTENSIONS = {
+    ".txt", ".csv", ".tsv", ".log", ".json", ".ndjson", ".xml", ".md", ".rst", ".html", ".htm",
+    ".css", ".js", ".ts", ".py", ".java", ".c", ".h", ".cpp", ".go", ".rs", ".sql", ".yaml",
+    ".yml", ".ini", ".cfg", ".conf", ".toml", ".svg",
+}
+
+
+class GzipCodec:
+    """gzip framing, so the stored bytes can be sent as Content-Encoding: gzip."""
+
+    name = "gzip"
+
+    def __init__(self, level: int = 6):
+        self.level = level
+
+    def compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def decompressor(self):
+        return zlib.decompressobj(31)
+
+
+class DeflateCodec(GzipCodec):
+    """zlib framing, which is what HTTP calls Content-Encoding: deflate."""
+
+    name = "deflate"
+
+    def compressor(self):
+        return zlib.compressobj(self.level, zlib.DEFLATED, 15)
+
+    def decompressor(self):
+        return zlib.decompressobj(15)
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int = 3):
+        self.level = level
+
+    def compressor(self):
+        return zstd.ZstdCompressor(level=self.level)
+
+    def decompressor(self):
+        return zstd.ZstdDecompressor()
+
+
+# Storage codecs by name; the name is also the HTTP content-coding.
+CODECS = {
+    "gzip": GzipCodec,
+    "deflate": DeflateCodec,
+}
+if zstd is not None:
+    CODECS["zstd"] = ZstdCodec
+
+
+def get_codec(name):
+    """Codec instance for `name`; None for "none", "" or None."""
+    if not name or name == "none":
+        return None
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown storage codec {name!r}; expected none or one of {sorted(CODECS)}") from None
+
+
+def is_compressible(filename: str, content_type) -> bool:
+    mime = (content_type or "").split(";", 1)[0].strip().lower()
+    if mime.startswith("text/") or mime in COMPRESSIBLE_TYPES:
+        return True
+    return os.path.splitext(filename or "")[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def compress_file(src_path: str, dst_path: str, codec, chunk_size: int = CHUNK_SIZE) -> int:
+    """Compress src into dst chunk by chunk; returns the compressed size."""
+    comp = codec.compressor()
+    written = 0
+    with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            out = comp.compress(chunk)
+            dst.write(out)
+            written += len(out)
+        out = comp.flush()
+        dst.write(out)
+        written += len(out)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return written
+
+
+def iter_decompressed(fh, codec_name, chunk_size: int = CHUNK_SIZE):
+    """Yield the original bytes of an open stored file, decompressing as it
+    reads. A codec_name of None passes the bytes through unchanged."""
+    codec = get_codec(codec_name)
+    dec = codec.decompressor() if codec is not None else None
+    while True:
+        chunk = fh.read(chunk_size)
+        if not chunk:
+            break
+        if dec is not None:
+            chunk = dec.decompress(chunk)
+        if chunk:
+            yield chunk
+    # zlib keeps a little output back until flush(); zstd has no flush.
+    tail = dec.flush() if hasattr(dec, "flush") else b""
+    if tail:
+        yield tail
@@ -1,7 +1,11 @@
 #Garence Wong Kar Kang
 
 import os
+import atexit
+import queue
+import time
 import sqlite3
+import threading
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,19 +16,528 @@ DB_PATH = os.getenv("SQLITE_PATH", "./db/data/app.db")
 if not os.path.isabs(DB_PATH):
     DB_PATH = os.path.join(BASE_DIR, DB_PATH)
 
+# Idle connections kept open between requests. gunicorn runs 4 threads per
+# worker, so the default keeps one warm connection per thread.
+POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "4"))
+
+# Storage profile. WAL lets dashboard reads run while an upload is being
+# written; the remaining pragmas are applied to every pooled connection.
+JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL").upper()
+SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-8000"))  # negative = KiB
+MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", "134217728"))
+TEMP_STORE = os.getenv("SQLITE_TEMP_STORE", "MEMORY").upper()
+CHECKPOINT_INTERVAL = int(os.getenv("SQLITE_CHECKPOINT_INTERVAL", "300"))
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+_TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+_CHECKPOINT_MODES = {"PASSIVE", "FULL", "RESTART", "TRUNCATE"}
+
+
+def _choice(name: str, value: str, allowed) -> str:
+    # PRAGMA values cannot be bound as parameters, so only known words pass.
+    if value not in allowed:
+        raise ValueError(f"{name} must be one of {sorted(allowed)}, got {value!r}")
+    return value
 
-def get_conn():
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def _apply_pragmas(conn):
     conn.execute("PRAGMA foreign_keys = ON;")
-    return conn
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS};")
+    conn.execute(f"PRAGMA synchronous = {_choice('SQLITE_SYNCHRONOUS', SYNCHRONOUS, _SYNCHRONOUS_MODES)};")
+    conn.execute(f"PRAGMA cache_size = {CACHE_SIZE};")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE};")
+    conn.execute(f"PRAGMA temp_store = {_choice('SQLITE_TEMP_STORE', TEMP_STORE, _TEMP_STORES)};")
+
+
+# Called as observer(sql, seconds) after every statement run through a
+# get_conn() cursor; None keeps cursors unwrapped. See set_query_observer.
+_query_observer = None
+
+
+def set_query_observer(observer):
+    global _query_observer
+    _query_observer = observer
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """Reports how long each execute() took. For SELECTs this is the time to
+    the first row; fetching the rest is not included."""
+
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observer = _query_observer
+            if observer is not None:
+                observer(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            observer = _query_observer
+            if observer is not None:
+                observer(sql, time.perf_counter() - start)
+
+
+class PooledConnection:
+    """Wraps a sqlite3 connection so close() hands it back to the pool.
+
+    Repository functions keep their `conn = get_conn() ... conn.close()`
+    pattern; everything except close() is forwarded to the real connection.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def _checked_raw(self):
+        raw = self.__dict__.get("_raw")
+        if raw is None:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return raw
+
+    def __getattr__(self, name):
+        return getattr(self._checked_raw(), name)
+
+    def cursor(self, factory=None):
+        raw = self._checked_raw()
+        if factory is None and _query_observer is not None:
+            factory = _TimedCursor
+        return raw.cursor(factory) if factory is not None else raw.cursor()
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def __enter__(self):
+        return self._raw.__enter__()
+
+    def __exit__(self, *exc):
+        return self._raw.__exit__(*exc)
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool.release(raw)
+
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int = POOL_SIZE):
+        self.path = path
+        self.size = max(0, size)
+        self._idle = queue.LifoQueue(maxsize=self.size) if self.size else None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._dir_ready = False
+
+    def _connect(self):
+        if not self._dir_ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._dir_ready = True
+
+        # Connections move between gunicorn threads through the pool, but only
+        # one thread uses a connection at a time.
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+        )
+        conn.row_factory = sqlite3.Row
+        _apply_pragmas(conn)
+        return conn
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        while self._idle is not None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if self._is_healthy(conn):
+                return conn
+            _close_quietly(conn)
+        return self._connect()
+
+    def release(self, conn):
+        # Never hand out a connection with a half-finished transaction.
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            _close_quietly(conn)
+            return
+
+        with self._lock:
+            closed = self._closed
+        if closed or self._idle is None:
+            _close_quietly(conn)
+            return
+
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            _close_quietly(conn)
+
+    def close_all(self):
+        with self._lock:
+            self._closed = True
+        while self._idle is not None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            _close_quietly(conn)
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+_pool = ConnectionPool(DB_PATH)
+
+
+def get_conn():
+    return PooledConnection(_pool, _pool.acquire())
+
+
+def checkpoint(mode: str = "PASSIVE"):
+    """Fold the WAL back into the main database file.
+
+    PASSIVE never waits on readers or writers, so it is safe to run while
+    requests are in flight. Returns (busy, wal_pages, checkpointed_pages).
+    """
+    mode = _choice("checkpoint mode", mode.upper(), _CHECKPOINT_MODES)
+    conn = get_conn()
+    try:
+        row = conn.execute(f"PRAGMA wal_checkpoint({mode});").fetchone()
+        return tuple(row) if row else None
+    finally:
+        conn.close()
+
+
+_checkpointer = None
+_checkpointer_stop = threading.Event()
+
+
+def start_checkpointer(interval: int = CHECKPOINT_INTERVAL):
+    """Run a PASSIVE checkpoint every `interval` seconds in a daemon thread."""
+    global _checkpointer
+    if interval <= 0 or JOURNAL_MODE != "WAL":
+        return None
+    if _checkpointer is not None and _checkpointer.is_alive():
+        return _checkpointer
+
+    _checkpointer_stop.clear()
+
+    def run():
+        while not _checkpointer_stop.wait(interval):
+            try:
+                checkpoint("PASSIVE")
+            except sqlite3.Error as e:
+                print(f"[WARN] WAL checkpoint failed: {e}")
+
+    _checkpointer = threading.Thread(target=run, name="sqlite-checkpoint", daemon=True)
+    _checkpointer.start()
+    return _checkpointer
+
+
+def stop_checkpointer():
+    global _checkpointer
+    _checkpointer_stop.set()
+    if _checkpointer is not None:
+        _checkpointer.join(timeout=5)
+    _checkpointer = None
+
+
+def close_pool():
+    """Close every idle connection; later get_conn() calls open a fresh pool."""
+    global _pool
+    old = _pool
+    _pool = ConnectionPool(DB_PATH)
+
+    if JOURNAL_MODE == "WAL" and os.path.exists(old.path):
+        conn = old.acquire()
+        try:
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        except sqlite3.Error:
+            pass
+        finally:
+            old.release(conn)
+
+    old.close_all()
+
+
+def _shutdown():
+    stop_checkpointer()
+    close_pool()
+
+
+atexit.register(_shutdown)
+
+
+# Schema migrations, applied in order on top of the base tables created by
+# init_db(). The database records the last applied version in
+# PRAGMA user_version. Never edit a released entry: append a new one.
+MIGRATIONS = [
+    (
+        1,
+        "index files by owner for the dashboard listing",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_files_user_id_id ON files (user_id, id)",
+        ],
+    ),
+    (
+        2,
+        "stored filenames are unique on disk",
+        [
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_files_stored_filename ON files (stored_filename)",
+        ],
+    ),
+    (
+        3,
+        "record the SHA-256 of each upload",
+        [
+            "ALTER TABLE files ADD COLUMN sha256 TEXT",
+        ],
+    ),
+    (
+        4,
+        "content-addressed blob store with reference counts",
+        [
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                storage_path TEXT NOT NULL,
+                ref_count INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs (sha256) WHERE ref_count <= 0",
+            # storage_path is relative to UPLOAD_DIR from here on. Older rows
+            # stored the absolute path of UPLOAD_DIR/stored_filename.
+            "UPDATE files SET storage_path = stored_filename",
+            # Reference counts follow the files table through triggers, so they
+            # also stay right when delete_user() cascades to a user's files.
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_files_blob_ref_insert
+            AFTER INSERT ON files
+            WHEN NEW.sha256 IS NOT NULL
+            BEGIN
+                UPDATE blobs SET ref_count = ref_count + 1
+                WHERE sha256 = NEW.sha256 AND storage_path = NEW.storage_path;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_files_blob_ref_delete
+            AFTER DELETE ON files
+            WHEN OLD.sha256 IS NOT NULL
+            BEGIN
+                UPDATE blobs SET ref_count = ref_count - 1
+                WHERE sha256 = OLD.sha256 AND storage_path = OLD.storage_path;
+            END
+            """,
+        ],
+    ),
+    (
+        5,
+        "look up file rows by content hash",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_files_sha256 ON files (sha256, storage_path)",
+        ],
+    ),
+    (
+        6,
+        "per-user display numbers for files",
+        [
+            # files.id keeps growing; what users see is display_no, counted
+            # per owner from users.file_seq.
+            "ALTER TABLE users ADD COLUMN file_seq INTEGER NOT NULL DEFAULT 0",
+            "ALTER TABLE files ADD COLUMN display_no INTEGER",
+            """
+            UPDATE files SET display_no = numbered.n
+            FROM (SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id) AS n FROM files) AS numbered
+            WHERE files.id = numbered.id
+            """,
+            """
+            UPDATE users SET file_seq = (
+                SELECT COALESCE(MAX(display_no), 0) FROM files WHERE files.user_id = users.id
+            )
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_files_display_no
+            AFTER INSERT ON files
+            BEGIN
+                UPDATE users SET file_seq = file_seq + 1 WHERE id = NEW.user_id;
+                UPDATE files SET display_no = (SELECT file_seq FROM users WHERE id = NEW.user_id)
+                WHERE id = NEW.id;
+            END
+            """,
+            # Numbering restarts at 1 once a user has no files left. The
+            # NOT EXISTS is a seek on idx_files_user_id_id, not a count.
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_files_display_no_reset
+            AFTER DELETE ON files
+            WHEN NOT EXISTS (SELECT 1 FROM files WHERE user_id = OLD.user_id)
+            BEGIN
+                UPDATE users SET file_seq = 0 WHERE id = OLD.user_id;
+            END
+            """,
+        ],
+    ),
+    (
+        7,
+        "look up rows by stored path for the upload reconciler",
+        [
+            "CREATE INDEX IF NOT EXISTS idx_files_storage_path ON files (storage_path)",
+            "CREATE INDEX IF NOT EXISTS idx_blobs_storage_path ON blobs (storage_path)",
+        ],
+    ),
+    (
+        8,
+        "track each user's stored bytes for quotas",
+        [
+            "ALTER TABLE users ADD COLUMN used_bytes INTEGER NOT NULL DEFAULT 0",
+            """
+            UPDATE users SET used_bytes = (
+                SELECT COALESCE(SUM(file_size), 0) FROM files WHERE files.user_id = users.id
+            )
+            """,
+            # Counted per row, so a deduplicated upload still uses quota.
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_files_used_bytes_insert
+            AFTER INSERT ON files
+            BEGIN
+                UPDATE users SET used_bytes = used_bytes + COALESCE(NEW.file_size, 0)
+                WHERE id = NEW.user_id;
+            END
+            """,
+            """
+            CREATE TRIGGER IF NOT EXISTS trg_files_used_bytes_delete
+            AFTER DELETE ON files
+            BEGIN
+                UPDATE users SET used_bytes = used_bytes - COALESCE(OLD.file_size, 0)
+                WHERE id = OLD.user_id;
+            END
+            """,
+        ],
+    ),
+    (
+        9,
+        "record the storage codec of compressed blobs",
+        [
+            # NULL means the stored bytes are the original content. A blob's
+            # codec is fixed when it is first stored; rows copy it so a
+            # download needs no join.
+            "ALTER TABLE blobs ADD COLUMN codec TEXT",
+            "ALTER TABLE files ADD COLUMN codec TEXT",
+        ],
+    ),
+    (
+        10,
+        "resumable upload sessions and their received chunks",
+        [
+            # state: open -> finalizing -> complete. A complete session keeps
+            # its file_id so a retried finalize gets the same answer.
+            """
+            CREATE TABLE IF NOT EXISTS upload_sessions (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+                original_filename TEXT NOT NULL,
+                content_type TEXT,
+                total_size INTEGER NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'open',
+                file_id INTEGER,
+                created_at TEXT NOT NULL DEFAULT (datetime('now')),
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_upload_sessions_user ON upload_sessions (user_id, state)",
+            "CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated ON upload_sessions (updated_at)",
+            """
+            CREATE TABLE IF NOT EXISTS upload_chunks (
+                session_id TEXT NOT NULL REFERENCES upload_sessions(id) ON DELETE CASCADE,
+                chunk_no INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (session_id, chunk_no)
+            ) WITHOUT ROWID
+            """,
+        ],
+    ),
+    (
+        11,
+        "shared application state, starting with the session epoch",
+        [
+            # Small values every worker must agree on. session_epoch is
+            # stamped into each login; changing it ends all sessions.
+            """
+            CREATE TABLE IF NOT EXISTS app_state (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+            ) WITHOUT ROWID
+            """,
+            "INSERT OR IGNORE INTO app_state (key, value) VALUES ('session_epoch', lower(hex(randomblob(16))))",
+        ],
+    ),
+]
+
+
+def get_schema_version(conn) -> int:
+    return conn.execute("PRAGMA user_version;").fetchone()[0]
+
+
+def migrate(conn):
+    """Apply every migration newer than the database's user_version.
+
+    Each migration runs in its own transaction together with the version
+    bump, so a failure leaves the database at the previous version.
+    """
+    current = get_schema_version(conn)
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for stmt in statements:
+                conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version = {int(version)};")
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        print(f"Applied migration {version}: {description}")
+        current = version
+    return current
 
 
 def init_db():
     conn = get_conn()
     try:
+        # journal_mode is stored in the database file, so setting it once
+        # here covers every connection opened afterwards.
+        mode = _choice("SQLITE_JOURNAL_MODE", JOURNAL_MODE, _JOURNAL_MODES)
+        conn.execute(f"PRAGMA journal_mode = {mode};")
+
         cur = conn.cursor()
 
         # Users
@@ -53,5 +566,7 @@ def init_db():
         """)
 
         conn.commit()
+
+        migrate(conn)
     finally:
         conn.close()
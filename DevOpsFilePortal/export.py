@@ -0,0 +1,101 @@
+import os
+import zipfile
+from datetime import datetime
+
+from codec import iter_decompressed
+
+# Formats that are already compressed; deflating them again costs CPU and
+# saves nothing, so they go into the archive in stored mode.
+STORED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".mp4", ".m4a", ".mov", ".mkv", ".webm", ".ogg",
+    ".pdf", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".jar", ".apk",
+}
+
+
+def compression_for(filename: str) -> int:
+    ext = os.path.splitext(filename)[1].lower()
+    return zipfile.ZIP_STORED if ext in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+class _ChunkSink:
+    """Write-only file object that zipfile writes into.
+
+    It has no tell() or seek(), so zipfile streams: each member gets a data
+    descriptor instead of a header rewritten after the fact. Whatever has
+    been written since the last drain() is handed to the response.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def _unique_name(name: str, seen: set) -> str:
+    if name not in seen:
+        seen.add(name)
+        return name
+    stem, ext = os.path.splitext(name)
+    n = 2
+    while f"{stem} ({n}){ext}" in seen:
+        n += 1
+    name = f"{stem} ({n}){ext}"
+    seen.add(name)
+    return name
+
+
+def _zip_date_time(uploaded_at):
+    try:
+        dt = datetime.strptime(str(uploaded_at), "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return (1980, 1, 1, 0, 0, 0)
+    return max(dt.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+def stream_zip(entries, chunk_size: int = 65536):
+    """Yield a ZIP archive of `entries` piece by piece.
+
+    entries yields (arcname, path, file_size, uploaded_at, codec); entries
+    whose path is None or missing on disk are skipped. Files stored with a
+    codec are decompressed on the way in, so file_size is the original size. At most one chunk of one
+    file is held in memory at a time, whatever the archive's total size.
+    """
+    sink = _ChunkSink()
+    seen = set()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as zf:
+        for arcname, path, file_size, uploaded_at, codec in entries:
+            if path is None:
+                continue
+            try:
+                src = open(path, "rb")
+            except FileNotFoundError:
+                print(f"[WARN] ZIP export skipped missing file {path}")
+                continue
+
+            with src:
+                info = zipfile.ZipInfo(_unique_name(arcname, seen), _zip_date_time(uploaded_at))
+                info.compress_type = compression_for(arcname)
+                # Lets zipfile decide up front whether the member needs ZIP64.
+                info.file_size = file_size or 0
+                with zf.open(info, mode="w") as dst:
+                    for chunk in iter_decompressed(src, codec, chunk_size):
+                        dst.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
@@ -2,11 +2,49 @@
 from db.db import get_conn
 
 
-def _reset_files_sequence_if_empty(cur):
-    cur.execute("SELECT COUNT(*) AS c FROM files")
+_change_listeners = []
+
+
+def on_files_changed(callback):
+    """Register callback(user_id), called after a user's files change."""
+    if callback not in _change_listeners:
+        _change_listeners.append(callback)
+
+
+def notify_files_changed(user_id: int):
+    for callback in list(_change_listeners):
+        callback(user_id)
+
+
+class QuotaExceeded(Exception):
+    """The insert would take the user past their storage quota."""
+
+
+def check_quota(cur, user_id: int, incoming: int, quota):
+    # users.used_bytes is kept by the files triggers; read it under the
+    # caller's write lock so two concurrent uploads cannot both fit.
+    if not quota:
+        return
+    cur.execute("SELECT used_bytes FROM users WHERE id = ?", (user_id,))
     row = cur.fetchone()
-    if row and row["c"] == 0:
-        cur.execute("DELETE FROM sqlite_sequence WHERE name='files'")
+    used = row["used_bytes"] if row else 0
+    if used + incoming > quota:
+        raise QuotaExceeded(f"user {user_id} would use {used + incoming} of {quota} bytes")
+
+
+def purge_unreferenced_blobs(cur, remove_stored=None):
+    """Drop blob rows nobody references any more and remove their files.
+
+    Runs inside the caller's write transaction, so an upload of the same
+    content cannot re-reference the blob between the row delete and the
+    file removal.
+    """
+    cur.execute("DELETE FROM blobs WHERE ref_count <= 0 RETURNING storage_path")
+    paths = [r["storage_path"] for r in cur.fetchall()]
+    if remove_stored is not None:
+        for path in paths:
+            remove_stored(path)
+    return paths
 
 
 def list_files_for_user(user_id: int):
@@ -15,7 +53,7 @@ def list_files_for_user(user_id: int):
         cur = conn.cursor()
         cur.execute(
             """
-            SELECT id, original_filename, stored_filename, content_type, file_size, uploaded_at
+            SELECT id, display_no, original_filename, stored_filename, content_type, file_size, uploaded_at
             FROM files
             WHERE user_id = ?
             ORDER BY id DESC
@@ -27,13 +65,105 @@ def list_files_for_user(user_id: int):
         conn.close()
 
 
+def list_files_page_for_user(user_id: int, cursor=None, limit: int = 50):
+    """Return one page of a user's files, newest first, plus the next cursor.
+
+    Keyset pagination: `cursor` is the id of the last row on the previous
+    page, so each page is an index seek on (user_id, id) no matter how deep
+    the user pages. next_cursor is None on the last page.
+    """
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        if cursor is None:
+            cur.execute(
+                """
+                SELECT id, display_no, original_filename, stored_filename, content_type, file_size, uploaded_at
+                FROM files
+                WHERE user_id = ?
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (user_id, limit + 1),
+            )
+        else:
+            cur.execute(
+                """
+                SELECT id, display_no, original_filename, stored_filename, content_type, file_size, uploaded_at
+                FROM files
+                WHERE user_id = ? AND id < ?
+                ORDER BY id DESC
+                LIMIT ?
+                """,
+                (user_id, cursor, limit + 1),
+            )
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, int(rows[-1]["id"])
+    return rows, None
+
+
+def iter_files_for_user(user_id: int, file_ids=None, batch_size: int = 200):
+    """Yield a user's files (with storage_path), newest first.
+
+    Rows are fetched a keyset page at a time and no connection is held
+    between pages, so a slow consumer such as a streaming download neither
+    pins a pooled connection nor holds the whole listing in memory.
+    file_ids restricts the result to those ids.
+    """
+    wanted = sorted({int(i) for i in file_ids}, reverse=True) if file_ids is not None else None
+    after = None
+    while True:
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            if wanted is not None:
+                ids = [i for i in wanted if after is None or i < after][:batch_size]
+                if not ids:
+                    return
+                cur.execute(
+                    f"""
+                    SELECT id, display_no, original_filename, content_type, file_size, storage_path, codec, uploaded_at
+                    FROM files
+                    WHERE user_id = ? AND id IN ({','.join('?' * len(ids))})
+                    ORDER BY id DESC
+                    """,
+                    (user_id, *ids),
+                )
+                rows = cur.fetchall()
+                after = ids[-1]
+            else:
+                cur.execute(
+                    """
+                    SELECT id, display_no, original_filename, content_type, file_size, storage_path, codec, uploaded_at
+                    FROM files
+                    WHERE user_id = ? AND id < ?
+                    ORDER BY id DESC
+                    LIMIT ?
+                    """,
+                    (user_id, after if after is not None else 2 ** 63 - 1, batch_size),
+                )
+                rows = cur.fetchall()
+                if not rows:
+                    return
+                after = int(rows[-1]["id"])
+        finally:
+            conn.close()
+
+        yield from rows
+
+
 def get_file_for_user(user_id: int, file_id: int):
     conn = get_conn()
     try:
         cur = conn.cursor()
         cur.execute(
             """
-            SELECT id, user_id, original_filename, stored_filename, content_type, file_size, storage_path, uploaded_at
+            SELECT id, user_id, display_no, original_filename, stored_filename, content_type, file_size, storage_path, sha256, codec, uploaded_at
             FROM files
             WHERE id = ? AND user_id = ?
             """,
@@ -51,38 +181,176 @@ def insert_file(
     content_type,
     file_size,
     storage_path: str,
+    sha256=None,
+    quota=None,
+    codec=None,
 ):
+    """Insert a file row. Passing sha256 makes the row reference the blob at
+    storage_path, registering the blob on first use; the row takes the
+    blob's codec, which is `codec` only for a new blob. Raises QuotaExceeded
+    if the row would take the user past `quota` bytes."""
     conn = get_conn()
     try:
         cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+
+        check_quota(cur, user_id, file_size or 0, quota)
 
-        _reset_files_sequence_if_empty(cur)
+        if sha256 is not None:
+            # ref_count is bumped by the files insert trigger. A blob stored
+            # under an older layout keeps its path; the row must match it.
+            cur.execute(
+                """
+                INSERT INTO blobs (sha256, size, storage_path, codec)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (sha256) DO UPDATE SET sha256 = excluded.sha256
+                RETURNING storage_path, codec
+                """,
+                (sha256, file_size or 0, storage_path, codec),
+            )
+            blob = cur.fetchone()
+            storage_path, codec = blob["storage_path"], blob["codec"]
 
         cur.execute(
             """
-            INSERT INTO files (user_id, original_filename, stored_filename, content_type, file_size, storage_path)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO files (user_id, original_filename, stored_filename, content_type, file_size, storage_path, sha256, codec)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             """,
-            (user_id, original_filename, stored_filename, content_type, file_size, storage_path),
+            (user_id, original_filename, stored_filename, content_type, file_size, storage_path, sha256, codec),
         )
         conn.commit()
+        notify_files_changed(user_id)
         return cur.lastrowid
     finally:
         conn.close()
 
 
-def delete_file_record_for_user(user_id: int, file_id: int):
+def insert_files(user_id: int, records, quota=None):
+    """Insert many blob-backed file rows in one transaction.
+
+    records are dicts with the insert_file keyword arguments (sha256 is
+    required). Blobs and rows each go in with a single executemany, so a
+    batch costs one commit however many files it holds. Returns
+    [(file_id, storage_path, codec)] in the order of records, where
+    storage_path and codec are the blob's canonical ones. Raises QuotaExceeded, inserting nothing, if
+    the batch would take the user past `quota` bytes.
+    """
+    records = list(records)
+    if not records:
+        return []
+
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+
+        check_quota(cur, user_id, sum(r["file_size"] or 0 for r in records), quota)
+
+        cur.executemany(
+            """
+            INSERT INTO blobs (sha256, size, storage_path, codec)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (sha256) DO NOTHING
+            """,
+            [(r["sha256"], r["file_size"] or 0, r["storage_path"], r.get("codec")) for r in records],
+        )
+
+        # Content already stored keeps its path (from an older layout) and
+        # its codec.
+        canonical = {}
+        shas = sorted({r["sha256"] for r in records})
+        for i in range(0, len(shas), 500):
+            part = shas[i:i + 500]
+            cur.execute(
+                f"SELECT sha256, storage_path, codec FROM blobs WHERE sha256 IN ({','.join('?' * len(part))})",
+                part,
+            )
+            canonical.update((row["sha256"], (row["storage_path"], row["codec"])) for row in cur.fetchall())
+
+        cur.executemany(
+            """
+            INSERT INTO files (user_id, original_filename, stored_filename, content_type, file_size, storage_path, sha256, codec)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    user_id,
+                    r["original_filename"],
+                    r["stored_filename"],
+                    r["content_type"],
+                    r["file_size"],
+                    canonical[r["sha256"]][0],
+                    r["sha256"],
+                    canonical[r["sha256"]][1],
+                )
+                for r in records
+            ],
+        )
+
+        ids = {}
+        names = [r["stored_filename"] for r in records]
+        for i in range(0, len(names), 500):
+            part = names[i:i + 500]
+            cur.execute(
+                f"SELECT id, stored_filename FROM files WHERE stored_filename IN ({','.join('?' * len(part))})",
+                part,
+            )
+            ids.update((row["stored_filename"], row["id"]) for row in cur.fetchall())
+
+        conn.commit()
+    finally:
+        conn.close()
+
+    notify_files_changed(user_id)
+    return [(ids[r["stored_filename"]], *canonical[r["sha256"]]) for r in records]
+
+
+def get_blob(sha256: str):
     conn = get_conn()
     try:
         cur = conn.cursor()
+        cur.execute(
+            "SELECT sha256, size, storage_path, codec, ref_count FROM blobs WHERE sha256 = ?",
+            (sha256,),
+        )
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def delete_file_record_for_user(user_id: int, file_id: int, remove_stored=None):
+    """Delete a user's file row.
+
+    `remove_stored(storage_path)` is called for every stored file that is no
+    longer referenced: the row's own file, or its blob once the last
+    reference to it is gone.
+    """
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            "SELECT sha256, storage_path FROM files WHERE id = ? AND user_id = ?",
+            (file_id, user_id),
+        )
+        row = cur.fetchone()
+
         cur.execute("DELETE FROM files WHERE id = ? AND user_id = ?", (file_id, user_id))
         deleted = cur.rowcount
-        conn.commit()
 
         if deleted:
-            _reset_files_sequence_if_empty(cur)
-            conn.commit()
+            cur.execute(
+                "SELECT 1 FROM blobs WHERE sha256 = ? AND storage_path = ?",
+                (row["sha256"], row["storage_path"]),
+            )
+            if cur.fetchone():
+                purge_unreferenced_blobs(cur, remove_stored)
+            elif remove_stored is not None:
+                remove_stored(row["storage_path"])
 
+        conn.commit()
+        if deleted:
+            notify_files_changed(user_id)
         return deleted
     finally:
         conn.close()
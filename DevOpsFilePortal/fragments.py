@@ -0,0 +1,76 @@
+import threading
+from collections import OrderedDict
+
+
+def fmt_dt(s) -> str:
+    """"YYYY-MM-DD HH:MM:SS" -> "DD/MM/YYYY HH:MM" by slicing, no parsing."""
+    s = "" if s is None else str(s)
+    if len(s) >= 16 and s[4] == "-" and s[7] == "-" and s[10] == " " and s[13] == ":":
+        return f"{s[8:10]}/{s[5:7]}/{s[0:4]} {s[11:13]}:{s[14:16]}"
+    return s
+
+
+def fmt_bytes(n) -> str:
+    """1536 -> "1.5 KB"; binary multiples with the usual short names."""
+    n = int(n or 0)
+    if n < 1024:
+        return f"{n} B"
+    size = float(n)
+    for unit in ("KB", "MB", "GB", "TB"):
+        size /= 1024
+        if size < 1024 or unit == "TB":
+            return f"{size:.1f} {unit}"
+
+
+class FragmentCache:
+    """Rendered HTML fragments, grouped per user.
+
+    Callers key each fragment by what it was rendered from (for file listings:
+    the page's row ids, which never change once inserted), so a hit is
+    always correct even if another worker changed the data. invalidate_user()
+    drops a user's fragments when their files change so stale pages do not
+    linger in memory. Users are evicted least-recently-used first.
+    """
+
+    def __init__(self, max_users: int = 1000, max_per_user: int = 16):
+        self.max_users = max_users
+        self.max_per_user = max_per_user
+        self._users = OrderedDict()  # user_id -> OrderedDict(key -> fragment)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, key):
+        with self._lock:
+            frags = self._users.get(user_id)
+            if frags is not None and key in frags:
+                self._users.move_to_end(user_id)
+                frags.move_to_end(key)
+                self.hits += 1
+                return frags[key]
+            self.misses += 1
+            return None
+
+    def put(self, user_id, key, fragment):
+        with self._lock:
+            frags = self._users.get(user_id)
+            if frags is None:
+                frags = self._users[user_id] = OrderedDict()
+                if len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            frags[key] = fragment
+            if len(frags) > self.max_per_user:
+                frags.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._users.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "users": len(self._users)}
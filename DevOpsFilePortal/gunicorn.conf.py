@@ -0,0 +1,16 @@
+# gunicorn reads this file from the working directory on startup.
+
+
+def on_starting(server):
+    """Bump the shared session epoch once per server start.
+
+    This runs in the master before any worker is forked, so every worker
+    starts with the same epoch and a restart still logs everyone out.
+    """
+    from db.db import init_db, close_pool
+    from session_epoch import bump_epoch
+
+    init_db()
+    bump_epoch()
+    # Forked workers must not inherit the master's SQLite connections.
+    close_pool()
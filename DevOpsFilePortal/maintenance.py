@@ -0,0 +1,526 @@
+import os
+import time
+import shutil
+import threading
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from db.db import get_conn
+from file_repo import notify_files_changed, purge_unreferenced_blobs
+from storage import (
+    INCOMING_DIRNAME,
+    STAGING_DIRNAME,
+    absolute_path,
+    blob_path,
+    get_layout,
+    remove_staging_file,
+    remove_stored_file,
+    staging_path,
+)
+from upload_repo import delete_stale_upload_sessions, list_upload_session_ids
+
+
+def _link_or_copy(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        pass
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _remove_old(upload_dir: str, path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        return
+    # Drop shard directories the move left empty, but never UPLOAD_DIR itself.
+    parent = os.path.dirname(path)
+    root = os.path.abspath(upload_dir)
+    while os.path.abspath(parent) != root and parent.startswith(root):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            break
+        parent = os.path.dirname(parent)
+
+
+def reshard_uploads(upload_dir: str, layout=None, batch_size: int = 500, dry_run: bool = False, log=print):
+    """Move every stored file to the path `layout` gives it.
+
+    Blobs are keyed by sha256; files stored before the blob store are keyed
+    by stored_filename. Each batch runs in one write transaction: the new
+    paths are hard-linked while the lock is held, the rows are rewritten,
+    and the old paths are unlinked only after COMMIT. An interrupted run
+    therefore leaves every row pointing at a file that exists, and running
+    it again picks up where it stopped.
+    """
+    layout = layout or get_layout()
+    stats = {"blobs_moved": 0, "files_moved": 0, "missing": 0}
+
+    def move_batch(select_sql, start, next_key, plan_row, apply_row, counter):
+        after = start
+        while True:
+            conn = get_conn()
+            try:
+                cur = conn.cursor()
+                cur.execute("BEGIN IMMEDIATE")
+                cur.execute(select_sql, (after, batch_size))
+                rows = cur.fetchall()
+                if not rows:
+                    conn.rollback()
+                    return
+                after = next_key(rows[-1])
+
+                to_unlink = []
+                for row in rows:
+                    old_rel, new_rel = plan_row(row)
+                    if old_rel == new_rel:
+                        continue
+                    old_abs = absolute_path(upload_dir, old_rel)
+                    new_abs = absolute_path(upload_dir, new_rel)
+                    if old_abs is None or new_abs is None or not os.path.exists(old_abs):
+                        stats["missing"] += 1
+                        continue
+                    stats[counter] += 1
+                    if dry_run:
+                        continue
+                    _link_or_copy(old_abs, new_abs)
+                    apply_row(cur, row, new_rel)
+                    to_unlink.append(old_abs)
+
+                if dry_run:
+                    conn.rollback()
+                else:
+                    conn.commit()
+            finally:
+                conn.close()
+
+            for path in to_unlink:
+                _remove_old(upload_dir, path)
+            log(f"reshard: {stats['blobs_moved']} blobs, {stats['files_moved']} files moved so far")
+
+    def apply_blob(cur, row, new_rel):
+        cur.execute("UPDATE blobs SET storage_path = ? WHERE sha256 = ?", (new_rel, row["sha256"]))
+        cur.execute(
+            "UPDATE files SET storage_path = ? WHERE sha256 = ? AND storage_path = ?",
+            (new_rel, row["sha256"], row["storage_path"]),
+        )
+
+    def apply_file(cur, row, new_rel):
+        cur.execute("UPDATE files SET storage_path = ? WHERE id = ?", (new_rel, row["id"]))
+
+    move_batch(
+        """
+        SELECT sha256, storage_path FROM blobs
+        WHERE sha256 > ?
+        ORDER BY sha256
+        LIMIT ?
+        """,
+        "",
+        lambda row: row["sha256"],
+        lambda row: (row["storage_path"], blob_path(row["sha256"], layout)),
+        apply_blob,
+        "blobs_moved",
+    )
+
+    # Rows that are not backed by a blob own their file outright.
+    move_batch(
+        """
+        SELECT f.id, f.stored_filename, f.storage_path FROM files f
+        LEFT JOIN blobs b ON b.sha256 = f.sha256 AND b.storage_path = f.storage_path
+        WHERE f.id > ? AND b.sha256 IS NULL
+        ORDER BY f.id
+        LIMIT ?
+        """,
+        0,
+        lambda row: row["id"],
+        lambda row: (row["storage_path"], layout.path_for(row["stored_filename"])),
+        apply_file,
+        "files_moved",
+    )
+
+    return stats
+
+
+class ReconcileProgress:
+    """Counters for the current (or last) reconcile pass, safe to read from
+    any thread while the pass runs."""
+
+    FIELDS = (
+        "files_scanned", "orphans_found", "orphans_removed", "bytes_freed",
+        "rows_checked", "dangling_rows", "dangling_removed", "stale_parts_removed",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._state = dict.fromkeys(self.FIELDS, 0)
+            self._state.update(
+                phase="idle", running=False, started_at=None, finished_at=None,
+                dangling_blocked=None, passes=self._state.get("passes", 0),
+            )
+
+    def add(self, **counts):
+        with self._lock:
+            for k, v in counts.items():
+                self._state[k] += v
+
+    def set(self, **values):
+        with self._lock:
+            self._state.update(values)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self._state)
+
+
+gc_progress = ReconcileProgress()
+
+
+def _scan_files(upload_dir: str):
+    """Yield a DirEntry for every stored file, streaming directory by directory.
+
+    Dot-entries at the top level (.incoming, .resumable, lock files) belong
+    to the app, not to the files table, and are skipped.
+    """
+    root = os.path.abspath(upload_dir)
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            it = os.scandir(path)
+        except FileNotFoundError:
+            continue
+        with it:
+            for entry in it:
+                if path == root and entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def _referenced_paths(cur, paths):
+    marks = ",".join("?" * len(paths))
+    cur.execute(
+        f"""
+        SELECT storage_path FROM files WHERE storage_path IN ({marks})
+        UNION
+        SELECT storage_path FROM blobs WHERE storage_path IN ({marks})
+        """,
+        (*paths, *paths),
+    )
+    return {r["storage_path"] for r in cur.fetchall()}
+
+
+# Missing files up to this many rows are always cleaned up; beyond it the
+# max_dangling_ratio guard applies.
+DANGLING_ALLOWANCE = 10
+
+
+class _RateLimiter:
+    def __init__(self, per_second: float):
+        self.per_second = per_second
+        self._start = time.monotonic()
+        self._count = 0
+
+    def wait(self, n: int, stop_event=None):
+        if self.per_second <= 0 or n <= 0:
+            return
+        self._count += n
+        delay = self._start + self._count / self.per_second - time.monotonic()
+        if delay > 0:
+            if stop_event is not None:
+                stop_event.wait(delay)
+            else:
+                time.sleep(delay)
+
+
+def reconcile_uploads(
+    upload_dir: str,
+    batch_size: int = 500,
+    max_deletes_per_sec: float = 100,
+    grace_seconds: int = 3600,
+    dry_run: bool = False,
+    max_dangling_ratio: float = 0.1,
+    force: bool = False,
+    progress=None,
+    stop_event=None,
+    log=print,
+):
+    """Bring UPLOAD_DIR and the files/blobs tables back in line.
+
+    Orphans (files on disk no row points at) are found by streaming
+    os.scandir and checking each batch of paths with one indexed IN query.
+    Dangling rows (rows whose file is gone) are found by walking files by
+    id. Both kinds are re-checked and removed inside a write transaction, so
+    an upload or reshard running at the same time is never undone, and
+    anything touched within `grace_seconds` is left alone: an upload's row
+    is committed before its blob is placed, and reshard links new paths
+    before it commits them. Removals are limited to max_deletes_per_sec.
+
+    Deleting a dangling row cannot be undone, and an unmounted or empty
+    UPLOAD_DIR makes every row look dangling. So no row is deleted when the
+    scan found no files at all, or when more than DANGLING_ALLOWANCE rows
+    and more than `max_dangling_ratio` of the rows checked are missing their
+    file; the pass logs what it would have removed instead. `force` skips
+    this check.
+    """
+    progress = progress or ReconcileProgress()
+    progress.reset()
+    progress.set(running=True, started_at=time.time(), phase="orphans")
+    limiter = _RateLimiter(max_deletes_per_sec)
+    root = os.path.abspath(upload_dir)
+
+    def stopped():
+        return stop_event is not None and stop_event.is_set()
+
+    def unreferenced(cur, batch):
+        referenced = _referenced_paths(cur, [rel for rel, _, _ in batch])
+        return [item for item in batch if item[0] not in referenced]
+
+    def old_enough(path, cutoff):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return max(st.st_mtime, st.st_ctime) <= cutoff
+
+    def remove_orphans(batch):
+        cutoff = time.time() - grace_seconds
+        # A plain read first: on a healthy tree every path is referenced and
+        # the write lock is never taken.
+        conn = get_conn()
+        try:
+            candidates = unreferenced(conn.cursor(), batch)
+        finally:
+            conn.close()
+        candidates = [item for item in candidates if old_enough(item[1], cutoff)]
+        if not candidates:
+            return
+
+        # Re-check only the candidates under the write lock, so an upload
+        # committing one of these paths meanwhile keeps its file.
+        removed = 0
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            for rel, path, size in unreferenced(cur, candidates):
+                if not old_enough(path, cutoff):
+                    continue
+                progress.add(orphans_found=1)
+                if not dry_run:
+                    _remove_old(upload_dir, path)
+                    removed += 1
+                    progress.add(orphans_removed=1, bytes_freed=size)
+            conn.commit()
+        finally:
+            conn.close()
+        limiter.wait(removed, stop_event)
+
+    # 1. Orphaned files.
+    batch = []
+    for entry in _scan_files(upload_dir):
+        if stopped():
+            break
+        progress.add(files_scanned=1)
+        rel = os.path.relpath(entry.path, root).replace(os.sep, "/")
+        try:
+            size = entry.stat(follow_symlinks=False).st_size
+        except FileNotFoundError:
+            continue
+        batch.append((rel, entry.path, size))
+        if len(batch) >= batch_size:
+            remove_orphans(batch)
+            batch = []
+    if batch and not stopped():
+        remove_orphans(batch)
+
+    # 2. Partial uploads abandoned by a crashed worker.
+    cutoff = time.time() - grace_seconds
+    incoming = os.path.join(root, INCOMING_DIRNAME)
+    if os.path.isdir(incoming) and not dry_run:
+        with os.scandir(incoming) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff:
+                    try:
+                        os.remove(entry.path)
+                        progress.add(stale_parts_removed=1)
+                    except FileNotFoundError:
+                        pass
+
+    # 3. Rows whose stored file is missing.
+    def missing(row):
+        path = absolute_path(upload_dir, row["storage_path"])
+        return path is None or not os.path.exists(path)
+
+    progress.set(phase="dangling_rows")
+    dangling, after = [], 0
+    while not stopped():
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT id, storage_path FROM files
+                WHERE id > ? AND uploaded_at < datetime('now', ?)
+                ORDER BY id
+                LIMIT ?
+                """,
+                (after, f"-{int(grace_seconds)} seconds", batch_size),
+            )
+            rows = cur.fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            break
+        after = rows[-1]["id"]
+        progress.add(rows_checked=len(rows))
+        found = [(r["id"], r["storage_path"]) for r in rows if missing(r)]
+        dangling.extend(found)
+        progress.add(dangling_rows=len(found))
+
+    counts = progress.snapshot()
+    blocked = None
+    if force or not dangling:
+        pass
+    elif counts["files_scanned"] == 0:
+        blocked = "no stored files were found on disk"
+    elif len(dangling) > DANGLING_ALLOWANCE and len(dangling) > max_dangling_ratio * counts["rows_checked"]:
+        blocked = (
+            f"{len(dangling)} of {counts['rows_checked']} rows are missing their file "
+            f"(limit {max_dangling_ratio:.0%})"
+        )
+    if blocked:
+        progress.set(dangling_blocked=blocked)
+        sample = ", ".join(f"{fid}:{path}" for fid, path in dangling[:20])
+        log(
+            f"[WARN] reconcile: keeping {len(dangling)} dangling rows because {blocked}. "
+            f"Check that {root} is the mounted upload volume; to remove them anyway run "
+            f"`flask reconcile-uploads --force`. Would remove: {sample}"
+            + (" ..." if len(dangling) > 20 else "")
+        )
+
+    removable = [] if blocked or dry_run else [fid for fid, _ in dangling]
+    for i in range(0, len(removable), batch_size):
+        if stopped():
+            break
+        ids = removable[i:i + batch_size]
+        conn = get_conn()
+        try:
+            cur = conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            marks = ",".join("?" * len(ids))
+            cur.execute(f"SELECT id, storage_path FROM files WHERE id IN ({marks})", ids)
+            # Re-check under the write lock; a reshard may have moved a file.
+            still = [r["id"] for r in cur.fetchall() if missing(r)]
+            users = set()
+            if still:
+                marks = ",".join("?" * len(still))
+                cur.execute(f"DELETE FROM files WHERE id IN ({marks}) RETURNING user_id", still)
+                users = {r["user_id"] for r in cur.fetchall()}
+                purge_unreferenced_blobs(cur, lambda p: remove_stored_file(upload_dir, p))
+            conn.commit()
+        finally:
+            conn.close()
+        progress.add(dangling_removed=len(still))
+        for user_id in users:
+            notify_files_changed(user_id)
+        limiter.wait(len(still), stop_event)
+
+    progress.set(running=False, finished_at=time.time(), phase="idle")
+    progress.add(passes=1)
+    stats = progress.snapshot()
+    log(
+        f"reconcile: {stats['orphans_found']} orphan files ({stats['orphans_removed']} removed, "
+        f"{stats['bytes_freed']} bytes), {stats['dangling_rows']} dangling rows "
+        f"({stats['dangling_removed']} removed), {stats['stale_parts_removed']} stale partial uploads"
+    )
+    return stats
+
+
+def expire_upload_sessions(upload_dir: str, max_age_seconds: int) -> int:
+    """Drop resumable upload sessions idle for `max_age_seconds` and their
+    staged data, plus staging files whose session is gone (e.g. its user was
+    deleted). Returns how many sessions and stray files were removed."""
+    removed = 0
+    for session_id in delete_stale_upload_sessions(max_age_seconds):
+        remove_staging_file(staging_path(upload_dir, session_id))
+        removed += 1
+
+    staging = os.path.join(upload_dir, STAGING_DIRNAME)
+    if not os.path.isdir(staging):
+        return removed
+    # Sessions are inserted before their staging file is created, so an old
+    # file without a row is never one that is still being set up.
+    live = list_upload_session_ids()
+    cutoff = time.time() - max_age_seconds
+    with os.scandir(staging) as it:
+        for entry in it:
+            session_id = entry.name.split(".", 1)[0]
+            if session_id in live or not entry.is_file(follow_symlinks=False):
+                continue
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
+
+
+_reconciler = None
+_reconciler_stop = threading.Event()
+
+
+def start_reconciler(upload_dir: str, interval: int, **kwargs):
+    """Run reconcile_uploads every `interval` seconds in a daemon thread.
+
+    With several workers only the one holding UPLOAD_DIR/.gc.lock runs a
+    pass; the others skip that round.
+    """
+    global _reconciler
+    if interval <= 0:
+        return None
+    if _reconciler is not None and _reconciler.is_alive():
+        return _reconciler
+
+    _reconciler_stop.clear()
+    lock_path = os.path.join(upload_dir, ".gc.lock")
+
+    def run():
+        while not _reconciler_stop.wait(interval):
+            with open(lock_path, "a") as lock:
+                if fcntl is not None:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        continue
+                try:
+                    reconcile_uploads(upload_dir, progress=gc_progress, stop_event=_reconciler_stop, **kwargs)
+                except Exception as e:
+                    gc_progress.set(running=False, phase="idle")
+                    print(f"[WARN] Upload reconcile failed: {type(e).__name__}: {e}")
+
+    _reconciler = threading.Thread(target=run, name="upload-gc", daemon=True)
+    _reconciler.start()
+    return _reconciler
+
+
+def stop_reconciler():
+    global _reconciler
+    _reconciler_stop.set()
+    if _reconciler is not None:
+        _reconciler.join(timeout=5)
+    _reconciler = None
@@ -0,0 +1,267 @@
+import time
+import bisect
+import threading
+
+from flask import g, request
+
+# Latency buckets in seconds, from sub-millisecond DB lookups to slow uploads.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _fmt_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    body = ",".join(
+        '{}="{}"'.format(k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in pairs
+    )
+    return "{" + body + "}"
+
+
+def _fmt_value(v) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return repr(v) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, labels=()):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, v in items:
+            lines.append(f"{self.name}{_fmt_labels(self.label_names, labels)} {_fmt_value(v)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels=()):
+        # Per-bucket (not cumulative) counts keep observe() to one increment;
+        # render() does the running sum.
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, labels=()):
+        entry = self._values.get(labels)
+        return entry[2] if entry else 0
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._values.items())
+        for labels, (counts, total, n) in items:
+            running = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                running += c
+                le = ("le", _fmt_value(float(bound)))
+                lines.append(f"{self.name}_bucket{_fmt_labels(self.label_names, labels, le)} {running}")
+            lbl = _fmt_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{lbl} {_fmt_value(total)}")
+            lines.append(f"{self.name}_count{lbl} {n}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs) -> Counter:
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs) -> Gauge:
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs) -> Histogram:
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+class AppMetrics:
+    """HTTP, database and transfer metrics for one Flask app.
+
+    install(app) adds before/after-request hooks; observe_query is meant for
+    db.set_query_observer. Each request costs a few dict updates under a
+    lock; see benchmarks/bench_metrics_overhead.py.
+    """
+
+    def __init__(self, registry=None, upload_endpoints=(), download_endpoints=()):
+        self.registry = registry or Registry()
+        r = self.registry
+        self.requests = r.counter("http_requests_total", "HTTP requests by endpoint, method and status.", ("endpoint", "method", "status"))
+        self.latency = r.histogram("http_request_duration_seconds", "Time to produce the response, by endpoint.", ("endpoint",))
+        self.in_flight = r.gauge("http_requests_in_flight", "Requests being handled, including streaming bodies.")
+        # The histogram's _count doubles as the query counter.
+        self.query_latency = r.histogram("db_query_duration_seconds", "Execute time of statements run through db.get_conn(), by verb.", ("verb",))
+        self._verbs = {}
+        self.upload_bytes = r.counter("upload_bytes_total", "Request body bytes received by upload endpoints.")
+        self.download_bytes = r.counter("download_bytes_total", "Response body bytes sent by download endpoints.")
+        self.uploads_in_flight = r.gauge("uploads_in_flight", "Upload requests in progress.")
+        self.downloads_in_flight = r.gauge("downloads_in_flight", "Download responses still streaming.")
+        self.downloads_offloaded = r.counter("downloads_offloaded_total", "Downloads handed to the front proxy (X-Accel-Redirect / X-Sendfile); their bytes are not in download_bytes_total.")
+
+        self.upload_endpoints = frozenset(upload_endpoints)
+        self.download_endpoints = frozenset(download_endpoints)
+
+    def install(self, app):
+        app.before_request(self._before)
+        app.after_request(self._after)
+        app.teardown_request(self._teardown)
+
+    def observe_query(self, sql: str, seconds: float):
+        # The repos use a fixed set of SQL strings, so the verb is parsed
+        # once per string.
+        labels = self._verbs.get(sql)
+        if labels is None:
+            words = sql.split(None, 1)
+            labels = (words[0].upper() if words else "OTHER",)
+            if len(self._verbs) < 1024:
+                self._verbs[sql] = labels
+        self.query_latency.observe(seconds, labels)
+
+    def render(self) -> str:
+        return self.registry.render()
+
+    # Flask hooks
+
+    def _gauges_for(self, endpoint):
+        if endpoint in self.upload_endpoints:
+            return (self.in_flight, self.uploads_in_flight)
+        if endpoint in self.download_endpoints:
+            return (self.in_flight, self.downloads_in_flight)
+        return (self.in_flight,)
+
+    def _before(self):
+        # Every request/g attribute access goes through a werkzeug proxy, so
+        # resolve each once and keep what _after needs in one state list:
+        # [start, gauges, endpoint, method, closing].
+        req = request._get_current_object()
+        endpoint = req.endpoint
+        gauges = self._gauges_for(endpoint)
+        for gauge in gauges:
+            gauge.inc()
+        g._metrics = [time.perf_counter(), gauges, endpoint or "none", req.method, False]
+
+    def _finish(self, state):
+        # Runs once, either when the response body is closed or, if no
+        # response was produced, at teardown.
+        gauges, state[1] = state[1], ()
+        for gauge in gauges:
+            gauge.dec()
+
+    def _after(self, response):
+        state = g.get("_metrics")
+        if state is None:
+            return response
+        start, _, endpoint, method, _ = state
+        self.latency.observe(time.perf_counter() - start, (endpoint,))
+        self.requests.inc(1, (endpoint, method, str(response.status_code)))
+
+        if endpoint in self.upload_endpoints:
+            self.upload_bytes.inc(request.content_length or 0)
+
+        if endpoint in self.download_endpoints:
+            headers = response.headers
+            if "X-Accel-Redirect" in headers or "X-Sendfile" in headers:
+                self.downloads_offloaded.inc()
+            elif response.content_length is not None:
+                # Also true for send_file bodies; leave those unwrapped so
+                # the server can still use wsgi.file_wrapper.
+                self.download_bytes.inc(response.content_length)
+            elif response.is_streamed:
+                response.response = self._count_sent(response.response)
+
+            # Download bodies keep streaming after the view returns; they
+            # stay in flight until the server closes them.
+            if response.is_streamed:
+                self._on_body_close(response, lambda: self._finish(state))
+                state[4] = True
+                return response
+
+        self._finish(state)
+        state[4] = True
+        return response
+
+    @staticmethod
+    def _on_body_close(response, callback):
+        body = response.response
+        if response.direct_passthrough and hasattr(body, "close"):
+            # werkzeug hands passthrough bodies (send_file) to the server
+            # as-is and skips call_on_close; hook the body's own close()
+            # instead of wrapping it, which would defeat wsgi.file_wrapper.
+            original = body.close
+
+            def close():
+                try:
+                    original()
+                finally:
+                    callback()
+
+            body.close = close
+        else:
+            response.call_on_close(callback)
+
+    def _count_sent(self, body):
+        for chunk in body:
+            self.download_bytes.inc(len(chunk))
+            yield chunk
+
+    def _teardown(self, exc):
+        state = g.get("_metrics")
+        if state is not None and not state[4]:
+            self._finish(state)
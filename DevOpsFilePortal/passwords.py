@@ -0,0 +1,70 @@
+import os
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HashPolicy:
+    """The password hashing method and cost that new hashes should use.
+
+    method is "scrypt" or "pbkdf2:sha256" (any hashlib name works after the
+    colon). cost is the scrypt N parameter or the PBKDF2 iteration count.
+    The defaults match werkzeug's own, so existing hashes stay current.
+    """
+
+    DEFAULT_COST = {"scrypt": 32768, "pbkdf2": 600000}
+
+    def __init__(self, method: str = "scrypt", cost=None):
+        base = method.split(":", 1)[0]
+        if base not in self.DEFAULT_COST:
+            raise ValueError(f"Unsupported password hash method: {method!r}")
+        if base == "pbkdf2" and ":" not in method:
+            method = "pbkdf2:sha256"
+        self.method = method
+        self.cost = int(cost) if cost else self.DEFAULT_COST[base]
+        # Checked here so a bad setting stops startup instead of failing
+        # every login and user creation later.
+        if base == "scrypt" and (self.cost < 2 or self.cost & (self.cost - 1)):
+            raise ValueError(f"scrypt cost must be a power of 2 greater than 1, got {self.cost}")
+        if self.cost < 1:
+            raise ValueError(f"Password hash cost must be positive, got {self.cost}")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.getenv("PASSWORD_HASH_METHOD", "scrypt"),
+            os.getenv("PASSWORD_HASH_ITERATIONS") or None,
+        )
+
+    @property
+    def method_string(self) -> str:
+        # The exact prefix werkzeug writes before the first "$".
+        if self.method == "scrypt":
+            return f"scrypt:{self.cost}:8:1"
+        return f"{self.method}:{self.cost}"
+
+    def hash(self, password: str) -> str:
+        return generate_password_hash(password, method=self.method_string)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        return pwhash.split("$", 1)[0] != self.method_string
+
+
+POLICY = HashPolicy.from_env()
+
+
+def hash_password(password: str) -> str:
+    return POLICY.hash(password)
+
+
+def verify_password(pwhash: str, password: str):
+    """Check a password against its stored hash.
+
+    Returns (ok, new_hash). new_hash is set when the password matched but
+    was hashed under an older policy, so the caller can store the upgrade
+    while the plaintext is at hand.
+    """
+    if not check_password_hash(pwhash, password):
+        return False, None
+    if POLICY.needs_rehash(pwhash):
+        return True, POLICY.hash(password)
+    return True, None
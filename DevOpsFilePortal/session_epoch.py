@@ -0,0 +1,77 @@
+import os
+import time
+import threading
+
+from db.db import get_conn
+
+EPOCH_KEY = "session_epoch"
+
+
+def read_epoch() -> str:
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT value FROM app_state WHERE key = ?", (EPOCH_KEY,)).fetchone()
+        return row["value"] if row else ""
+    finally:
+        conn.close()
+
+
+def bump_epoch() -> str:
+    """Store a new epoch, ending every session signed for an older one."""
+    epoch = os.urandom(16).hex()
+    conn = get_conn()
+    try:
+        conn.execute(
+            """
+            INSERT INTO app_state (key, value, updated_at) VALUES (?, ?, datetime('now'))
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """,
+            (EPOCH_KEY, epoch),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    return epoch
+
+
+class SessionEpoch:
+    """The shared session epoch, cached in-process for `ttl` seconds.
+
+    Every worker reads the same row, so a session is valid on whichever
+    worker serves it. A bump from another process (a restart, or an admin
+    logging everyone out) ends older sessions here within `ttl`; a session
+    carrying a newer epoch than the cached one triggers a re-read, so it is
+    accepted straight away.
+    """
+
+    def __init__(self, ttl: float = 2):
+        self.ttl = ttl
+        self._value = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def current(self) -> str:
+        with self._lock:
+            if self._value is not None and self._expires_at > time.monotonic():
+                return self._value
+        return self.refresh()
+
+    def refresh(self) -> str:
+        value = read_epoch()
+        with self._lock:
+            self._value, self._expires_at = value, time.monotonic() + self.ttl
+        return value
+
+    def is_current(self, epoch) -> bool:
+        if not epoch:
+            return False
+        if epoch == self.current():
+            return True
+        # Possibly issued just after a bump this worker has not seen yet.
+        return epoch == self.refresh()
+
+    def bump(self) -> str:
+        value = bump_epoch()
+        with self._lock:
+            self._value, self._expires_at = value, time.monotonic() + self.ttl
+        return value
@@ -0,0 +1,352 @@
+import os
+import uuid
+import hashlib
+import tempfile
+
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+
+from codec import compress_file
+
+CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "65536"))
+
+# Partially received uploads live here until they are complete, so a
+# half-written file never appears under its final name in UPLOAD_DIR.
+INCOMING_DIRNAME = ".incoming"
+
+# Resumable uploads are assembled here, one preallocated file per session.
+# A top-level dot directory, so the reconciler leaves it alone.
+STAGING_DIRNAME = ".resumable"
+
+# Uploads are stored once per distinct content under blobs/, at the path the
+# configured layout gives for their sha256.
+BLOBS_DIRNAME = "blobs"
+
+# Limit for the non-file form fields that the decoder keeps in memory.
+MAX_FORM_FIELD_SIZE = 500_000
+
+
+def incoming_dir(upload_dir: str) -> str:
+    path = os.path.join(upload_dir, INCOMING_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class IncomingFile:
+    """One uploaded file being written to a temp file in fixed-size chunks.
+
+    The SHA-256 and byte count are updated as each chunk is written, so the
+    file never has to be read back once the upload finishes.
+    """
+
+    def __init__(self, upload_dir: str, field_name: str, filename: str, content_type):
+        self.field_name = field_name
+        self.original_filename = secure_filename(filename)
+        self.content_type = content_type
+        self.file_size = 0
+        self.sha256 = None
+        # Set by compress_upload when the temp file holds compressed bytes;
+        # file_size and sha256 always describe the original content.
+        self.codec = None
+
+        fd, self.temp_path = tempfile.mkstemp(dir=incoming_dir(upload_dir), suffix=".part")
+        self._fh = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+
+    @classmethod
+    def from_staged(cls, path: str, filename: str, content_type, chunk_size=None):
+        """Adopt a fully written staging file, hashing it in one pass.
+
+        Resumable uploads arrive out of order, so unlike a streamed upload
+        the hash can only be taken once every chunk is in.
+        """
+        self = cls.__new__(cls)
+        self.field_name = "file"
+        self.original_filename = secure_filename(filename)
+        self.content_type = content_type
+        self.codec = None
+        self.temp_path = path
+
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as fh:
+            while True:
+                chunk = fh.read(chunk_size or CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                size += len(chunk)
+        self._fh = fh
+        self._hash = digest
+        self.file_size = size
+        self.sha256 = digest.hexdigest()
+        return self
+
+    def write(self, data: bytes):
+        self._fh.write(data)
+        self._hash.update(data)
+        self.file_size += len(data)
+
+    def finish(self):
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        self._fh.close()
+        self.sha256 = self._hash.hexdigest()
+
+    def commit(self, final_path: str):
+        os.replace(self.temp_path, final_path)
+        self.temp_path = None
+
+    def discard(self):
+        if not self._fh.closed:
+            self._fh.close()
+        if self.temp_path:
+            try:
+                os.remove(self.temp_path)
+            except FileNotFoundError:
+                pass
+            self.temp_path = None
+
+
+# Set by asgi.py when it has already received a multipart upload body: the
+# list of IncomingFile objects, or the ValueError if the body was malformed.
+RECEIVED_FILES_KEY = "portal.received_files"
+
+
+class MultipartReceiver:
+    """Incremental multipart/form-data parser writing file parts to temp files.
+
+    feed() the body as it arrives; feed(b"") marks its end. Parts with an
+    empty filename are skipped, and no part is ever held in memory whole.
+    `done` turns true at the closing boundary. Raises ValueError on a
+    malformed body.
+    """
+
+    def __init__(self, boundary: str, upload_dir: str):
+        self.upload_dir = upload_dir
+        self.received = []
+        self.done = False
+        self._decoder = MultipartDecoder(boundary.encode("latin-1"), max_form_memory_size=MAX_FORM_FIELD_SIZE)
+        self._current = None
+
+    def feed(self, chunk: bytes):
+        if self.done:
+            return
+        self._decoder.receive_data(chunk or None)
+
+        event = self._decoder.next_event()
+        while not isinstance(event, NeedData):
+            if isinstance(event, (Field, File, Epilogue)) and self._current is not None:
+                self._current.finish()
+                self._current = None
+
+            if isinstance(event, File) and event.filename:
+                self._current = IncomingFile(
+                    self.upload_dir,
+                    event.name,
+                    event.filename,
+                    event.headers.get("Content-Type"),
+                )
+                self.received.append(self._current)
+            elif isinstance(event, Data) and self._current is not None:
+                self._current.write(event.data)
+                if not event.more_data:
+                    self._current.finish()
+                    self._current = None
+            elif isinstance(event, Epilogue):
+                self.done = True
+                return
+            event = self._decoder.next_event()
+
+        if not chunk:
+            raise ValueError("Multipart body ended before the closing boundary.")
+
+    def discard(self):
+        for f in self.received:
+            f.discard()
+
+
+def receive_multipart_files(stream, boundary: str, upload_dir: str, chunk_size=None):
+    """Stream a multipart/form-data body to temp files, one per file part.
+
+    Reads `stream` (the raw request body) `chunk_size` bytes at a time and
+    never buffers a whole part in memory. Parts with an empty filename are
+    skipped. Returns the finished IncomingFile objects in request order; the
+    caller must commit() or discard() each one. Raises ValueError on a
+    malformed body.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    receiver = MultipartReceiver(boundary, upload_dir)
+    try:
+        while not receiver.done:
+            receiver.feed(stream.read(chunk_size))
+    except BaseException:
+        receiver.discard()
+        raise
+    return receiver.received
+
+
+def staging_path(upload_dir: str, session_id: str) -> str:
+    path = os.path.join(upload_dir, STAGING_DIRNAME)
+    os.makedirs(path, exist_ok=True)
+    return os.path.join(path, f"{session_id}.part")
+
+
+def create_staging_file(path: str, size: int):
+    """Create a session's staging file at its final size.
+
+    The file is sparse until chunks land, and every chunk has a fixed
+    offset, so chunks can be written in any order or in parallel.
+    """
+    with open(path, "wb") as fh:
+        fh.truncate(size)
+
+
+def write_chunk(path: str, offset: int, stream, length: int, chunk_size=None) -> int:
+    """Copy `length` bytes from `stream` into the staging file at `offset`.
+
+    Returns the number of bytes written, which is short if the stream ended
+    early. The data is fsynced before returning, so a chunk is only ever
+    recorded as received once it is on disk.
+    """
+    chunk_size = chunk_size or CHUNK_SIZE
+    written = 0
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        while written < length:
+            data = stream.read(min(chunk_size, length - written))
+            if not data:
+                break
+            os.pwrite(fd, data, offset + written)
+            written += len(data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return written
+
+
+def remove_staging_file(path: str):
+    _remove_quietly(path)
+
+
+class FlatLayout:
+    """Every file directly in its directory: <key>."""
+
+    name = "flat"
+
+    def path_for(self, key: str) -> str:
+        return key
+
+
+class ShardedLayout:
+    """Fan files out by key prefix: <ab>/<cd>/<key> for depth=2, width=2.
+
+    Keys are hex digests or uuid hex, so each level splits evenly and a
+    directory never holds more than a few thousand entries.
+    """
+
+    name = "sharded"
+
+    def __init__(self, depth: int = 2, width: int = 2):
+        self.depth = depth
+        self.width = width
+
+    def path_for(self, key: str) -> str:
+        w = self.width
+        parts = [key[i * w:(i + 1) * w] for i in range(self.depth)]
+        return "/".join(parts + [key])
+
+
+# Path strategies by name; add an entry here to plug in another layout.
+LAYOUTS = {
+    "flat": FlatLayout,
+    "sharded": ShardedLayout,
+}
+
+UPLOAD_LAYOUT = os.getenv("UPLOAD_LAYOUT", "sharded")
+
+
+def get_layout(name=None):
+    name = name or UPLOAD_LAYOUT
+    try:
+        return LAYOUTS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown upload layout {name!r}; expected one of {sorted(LAYOUTS)}") from None
+
+
+def blob_path(sha256: str, layout=None) -> str:
+    """Storage path of a blob, relative to UPLOAD_DIR."""
+    layout = layout or get_layout()
+    return f"{BLOBS_DIRNAME}/{layout.path_for(sha256)}"
+
+
+def prepare_upload(incoming: IncomingFile, layout=None):
+    """Pick the names for a finished upload before its row is inserted.
+
+    Returns (stored_filename, storage_path). stored_filename stays unique per
+    row; storage_path is the shared content-addressed blob.
+    """
+    stored_filename = f"{uuid.uuid4().hex}_{incoming.original_filename}"
+    return stored_filename, blob_path(incoming.sha256, layout)
+
+
+def compress_upload(incoming: IncomingFile, codec, min_saving: float = 0.1) -> bool:
+    """Swap a finished upload's temp file for its compressed form.
+
+    The compressed copy is kept only if it is at least `min_saving` smaller;
+    otherwise the original stays and nothing changes. Returns True if the
+    upload is now stored with `codec`.
+    """
+    compressed_path = f"{incoming.temp_path}.{codec.name}"
+    try:
+        size = compress_file(incoming.temp_path, compressed_path, codec)
+    except BaseException:
+        _remove_quietly(compressed_path)
+        raise
+
+    if size > incoming.file_size * (1 - min_saving):
+        _remove_quietly(compressed_path)
+        return False
+
+    os.replace(compressed_path, incoming.temp_path)
+    incoming.codec = codec.name
+    return True
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def place_upload(incoming: IncomingFile, upload_dir: str, storage_path: str, codec=None):
+    """Move an upload into its blob once the row referencing it is committed.
+
+    `codec` is the blob row's codec. If the blob is already on disk the
+    upload was a duplicate and the temp file is simply dropped; so is an
+    upload encoded differently from the blob, whose bytes belong to the
+    upload that registered it.
+    """
+    final_path = absolute_path(upload_dir, storage_path)
+    if os.path.exists(final_path) or incoming.codec != codec:
+        incoming.discard()
+        return
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    incoming.commit(final_path)
+
+
+def absolute_path(upload_dir: str, storage_path: str):
+    """Resolve a files/blobs storage_path, refusing anything outside UPLOAD_DIR."""
+    return safe_join(upload_dir, storage_path)
+
+
+def remove_stored_file(upload_dir: str, storage_path: str):
+    path = absolute_path(upload_dir, storage_path)
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -1,12 +1,30 @@
 # Garence Wong Kar Kang
+import io
 import sys
+import asyncio
 import importlib
 import pathlib
 import pytest
+from flask.testing import FlaskClient
+from werkzeug.http import HTTP_STATUS_CODES
+from werkzeug.test import run_wsgi_app
 
+# Let tests import the app modules (storage, throttle, ...) without first
+# going through the client fixture.
+PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "wsgi_only: test relies on WSGI server internals")
+
+
+@pytest.fixture(params=["wsgi", "asgi"])
+def client(request, tmp_path, monkeypatch):
+    if request.param == "asgi" and request.node.get_closest_marker("wsgi_only"):
+        pytest.skip("WSGI only")
 
-@pytest.fixture()
-def client(tmp_path, monkeypatch):
     PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
     if str(PROJECT_ROOT) not in sys.path:
         sys.path.insert(0, str(PROJECT_ROOT))
@@ -20,6 +38,20 @@ def client(tmp_path, monkeypatch):
     monkeypatch.setenv("UPLOAD_DIR", str(upload_dir))
     monkeypatch.setenv("FLASK_SECRET_KEY", "test-secret")
     monkeypatch.setenv("SHOW_STARTUP_BANNER", "0")
+    monkeypatch.setenv("UPLOAD_GC_INTERVAL", "0")
+    # Tests that read stored bytes expect them verbatim; the compression
+    # tests switch the codec on themselves.
+    monkeypatch.setenv("STORAGE_CODEC", "none")
+
+    # db.db reads SQLITE_PATH at import time; reload it so every test gets
+    # the fresh database above instead of the first test's one.
+    from db import db as db_module
+    db_module.stop_checkpointer()
+    db_module.close_pool()
+    importlib.reload(db_module)
+
+    import user_repo
+    user_repo.clear_user_cache()
 
     import app as app_module
     importlib.reload(app_module)
@@ -29,8 +61,26 @@ def client(tmp_path, monkeypatch):
 
     app_module.app.config.update(TESTING=True)
 
-    with app_module.app.test_client() as c:
-        yield c
+    if request.param == "wsgi":
+        with app_module.app.test_client() as c:
+            yield c
+    else:
+        import asgi
+
+        portal = asgi.create_asgi_app(app_module)
+        app_module.app.test_client_class = ASGIClient
+        try:
+            with app_module.app.test_client() as c:
+                c.asgi = portal
+                yield c
+        finally:
+            app_module.app.test_client_class = None
+            portal.executor.shutdown(wait=True)
+
+    import maintenance
+    maintenance.stop_reconciler()
+    db_module.stop_checkpointer()
+    db_module.close_pool()
 
 
 def login(client, username, password):
@@ -39,3 +89,86 @@ def login(client, username, password):
         data={"username": username, "password": password},
         follow_redirects=False,
     )
+
+
+def create_and_login(client, username, password="pw"):
+    """Create a regular user as the seeded admin, then log in as them."""
+    client.get("/logout", follow_redirects=False)
+    login(client, "admin", "admin123")
+    client.post("/admin/create_user", data={"username": username, "password": password}, follow_redirects=False)
+    client.get("/logout", follow_redirects=False)
+    login(client, username, password)
+
+
+def upload(client, name, content=b"x"):
+    return client.post(
+        "/dashboard/submit",
+        data={"file": (io.BytesIO(content), name)},
+        content_type="multipart/form-data",
+        follow_redirects=False,
+    )
+
+
+class ASGIClient(FlaskClient):
+    """Test client that sends every request through asgi.PortalASGI.
+
+    Requests are built by werkzeug as usual; the WSGI environ is turned into
+    an ASGI scope and body messages, which is what an ASGI server would do.
+    """
+
+    asgi = None
+
+    def run_wsgi_app(self, environ, buffered=False):
+        self._add_cookies_to_wsgi(environ)
+        rv = run_wsgi_app(self._call_asgi, environ, buffered=buffered)
+        host = environ.get("HTTP_HOST", "localhost").split(":")[0]
+        self._update_cookies_from_response(host, environ.get("PATH_INFO") or "/", rv[2].getlist("Set-Cookie"))
+        return rv
+
+    def _call_asgi(self, environ, start_response):
+        headers = []
+        for key, value in environ.items():
+            if key.startswith("HTTP_"):
+                headers.append((key[5:].replace("_", "-").lower(), value))
+        for key, name in (("CONTENT_TYPE", "content-type"), ("CONTENT_LENGTH", "content-length")):
+            if environ.get(key):
+                headers.append((name, environ[key]))
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": environ["REQUEST_METHOD"],
+            "scheme": environ["wsgi.url_scheme"],
+            "root_path": environ.get("SCRIPT_NAME", ""),
+            "path": environ["PATH_INFO"].encode("latin-1").decode("utf-8"),
+            "query_string": environ.get("QUERY_STRING", "").encode("latin-1"),
+            "headers": [(k.encode("latin-1"), str(v).encode("latin-1")) for k, v in headers],
+            "server": (environ["SERVER_NAME"], int(environ["SERVER_PORT"])),
+            "client": (environ.get("REMOTE_ADDR", "127.0.0.1"), 0),
+        }
+        body = environ["wsgi.input"].read()
+        messages = [
+            {"type": "http.request", "body": body[i:i + 65536], "more_body": i + 65536 < len(body)}
+            for i in range(0, len(body), 65536)
+        ] or [{"type": "http.request", "body": b"", "more_body": False}]
+        response = {"body": []}
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            # The client stays connected until the response is sent.
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = message["headers"]
+            else:
+                response["body"].append(message.get("body", b""))
+
+        asyncio.run(self.asgi(scope, receive, send))
+        status = response["status"]
+        start_response(
+            f"{status} {HTTP_STATUS_CODES.get(status, 'UNKNOWN')}",
+            [(k.decode("latin-1"), v.decode("latin-1")) for k, v in response["headers"]],
+        )
+        return [b"".join(response["body"])]
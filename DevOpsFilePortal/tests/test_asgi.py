@@ -0,0 +1,81 @@
+import io
+import asyncio
+import pytest
+from conftest import create_and_login
+
+
+@pytest.fixture()
+def asgi_client(client):
+    if getattr(client, "asgi", None) is None:
+        pytest.skip("ASGI only")
+    return client
+
+
+def test_uploads_are_received_before_the_view_runs(asgi_client, monkeypatch):
+    import app as app_module
+    from file_repo import list_files_for_user
+    from storage import RECEIVED_FILES_KEY
+    from user_repo import get_user_by_username
+
+    seen = []
+    original = app_module.received_upload_files
+
+    def spy(boundary):
+        seen.append(RECEIVED_FILES_KEY in app_module.request.environ)
+        return original(boundary)
+
+    monkeypatch.setattr(app_module, "received_upload_files", spy)
+    create_and_login(asgi_client, "asgi1")
+    res = asgi_client.post(
+        "/dashboard/submit",
+        data={"file": (io.BytesIO(b"x" * 300_000), "big.bin")},
+        content_type="multipart/form-data",
+    )
+    assert res.status_code == 302
+    assert seen == [True]
+    assert list_files_for_user(get_user_by_username("asgi1")["id"])[0]["file_size"] == 300_000
+
+
+def test_uploads_the_view_refuses_are_not_received(asgi_client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "USER_QUOTA_BYTES", 1000)
+    create_and_login(asgi_client, "asgi2")
+    received = []
+    original = asgi_client.asgi._receive_upload
+
+    async def spy(environ, receive):
+        received.append(environ["PATH_INFO"])
+        await original(environ, receive)
+
+    monkeypatch.setattr(asgi_client.asgi, "_receive_upload", spy)
+    res = asgi_client.post(
+        "/dashboard/submit",
+        data={"file": (io.BytesIO(b"x" * 5000), "big.bin")},
+        content_type="multipart/form-data",
+    )
+    assert res.status_code == 302
+    assert received == []
+
+
+def test_lifespan_bumps_the_epoch_and_shuts_the_executor_down(asgi_client):
+    import asgi
+    import app as app_module
+    from session_epoch import read_epoch
+
+    before = read_epoch()
+
+    portal = asgi.create_asgi_app(app_module)
+    messages = [{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message["type"])
+
+    asyncio.run(portal({"type": "lifespan"}, receive, send))
+    assert sent == ["lifespan.startup.complete", "lifespan.shutdown.complete"]
+    assert read_epoch() != before
+    assert portal.executor._shutdown
@@ -0,0 +1,134 @@
+import io
+import os
+from conftest import create_and_login
+
+
+def batch_upload(client, files, accept="application/json"):
+    return client.post(
+        "/dashboard/submit_batch",
+        data={"file": [(io.BytesIO(content), name) for name, content in files]},
+        content_type="multipart/form-data",
+        headers={"Accept": accept},
+        follow_redirects=False,
+    )
+
+
+def user_files(username):
+    from file_repo import list_files_for_user, get_file_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return [get_file_for_user(uid, r["id"]) for r in list_files_for_user(uid)]
+
+
+def test_batch_upload_reports_each_file(client):
+    create_and_login(client, "batch1")
+    files = [(f"part{i}.txt", f"content {i}".encode()) for i in range(20)]
+
+    res = batch_upload(client, files)
+    assert res.status_code == 201
+    body = res.get_json()
+    assert body["uploaded"] == 20
+    assert [r["filename"] for r in body["results"]] == [name for name, _ in files]
+    assert all(r["status"] == "uploaded" for r in body["results"])
+
+    rows = {r["id"]: r for r in user_files("batch1")}
+    assert len(rows) == 20
+    for (name, content), result in zip(files, body["results"]):
+        assert rows[result["id"]]["original_filename"] == name
+        dl = client.get(f"/dashboard/download/{result['id']}")
+        assert dl.status_code == 200
+        assert dl.data == content
+
+
+def test_batch_upload_uses_one_transaction(client, monkeypatch):
+    import file_repo
+
+    calls = []
+    real_get_conn = file_repo.get_conn
+
+    def counting_get_conn():
+        calls.append(1)
+        return real_get_conn()
+
+    monkeypatch.setattr(file_repo, "get_conn", counting_get_conn)
+
+    create_and_login(client, "batch2")
+    calls.clear()
+    res = batch_upload(client, [(f"f{i}.bin", os.urandom(64)) for i in range(50)])
+    assert res.status_code == 201
+    assert len(calls) == 1
+
+
+def test_batch_upload_dedups_within_and_across_batches(client):
+    from db.db import get_conn
+
+    create_and_login(client, "batch3")
+    same = b"identical bytes" * 100
+    res = batch_upload(client, [("a.txt", same), ("b.txt", same), ("c.txt", b"other")])
+    assert res.status_code == 201
+    res = batch_upload(client, [("d.txt", same)])
+    assert res.status_code == 201
+
+    rows = user_files("batch3")
+    assert len(rows) == 4
+    conn = get_conn()
+    try:
+        blob = conn.execute("SELECT ref_count FROM blobs WHERE sha256 = ?", (rows[0]["sha256"],)).fetchone()
+    finally:
+        conn.close()
+    assert blob["ref_count"] == 3
+
+
+def test_batch_upload_rejects_unusable_filenames(client):
+    create_and_login(client, "batch4")
+    res = batch_upload(client, [("../..", b"x"), ("ok.txt", b"fine")])
+    assert res.status_code == 201
+    results = res.get_json()["results"]
+    assert results[0]["status"] == "rejected"
+    assert results[1]["status"] == "uploaded"
+    assert len(user_files("batch4")) == 1
+
+
+def test_batch_upload_from_browser_form_redirects(client):
+    create_and_login(client, "batch5")
+    res = batch_upload(client, [("a.txt", b"a"), ("b.txt", b"b")], accept="text/html")
+    assert res.status_code in (302, 303)
+    page = client.get("/dashboard")
+    assert b"2 file(s) uploaded successfully." in page.data
+    assert b"a.txt" in page.data and b"b.txt" in page.data
+
+
+def test_batch_upload_leaves_no_temp_files(client):
+    from storage import INCOMING_DIRNAME
+
+    create_and_login(client, "batch6")
+    batch_upload(client, [(f"t{i}.txt", b"same") for i in range(5)])
+    incoming = os.path.join(os.environ["UPLOAD_DIR"], INCOMING_DIRNAME)
+    assert os.listdir(incoming) == []
+
+
+def test_batch_over_quota_from_browser_form_names_the_rejected_files(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "USER_QUOTA_BYTES", 1000)
+    create_and_login(client, "batch7")
+    res = batch_upload(client, [("a.bin", b"a" * 600), ("b.bin", b"b" * 600), ("c.bin", b"c" * 300)], accept="text/html")
+    assert res.status_code in (302, 303)
+    page = client.get("/dashboard")
+    assert b"2 file(s) uploaded successfully." in page.data
+    assert b"Not uploaded, storage quota exceeded: b.bin" in page.data
+    assert sorted(r["original_filename"] for r in user_files("batch7")) == ["a.bin", "c.bin"]
+
+
+def test_batch_refused_once_the_quota_is_full(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "USER_QUOTA_BYTES", 1000)
+    create_and_login(client, "batch8")
+    assert batch_upload(client, [("full.bin", b"f" * 1000)]).status_code == 201
+
+    res = batch_upload(client, [("more.bin", b"m")])
+    assert res.status_code == 413
+    assert res.get_json() == {"error": "Storage quota exceeded."}
+    assert len(user_files("batch8")) == 1
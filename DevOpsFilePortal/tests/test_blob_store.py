@@ -0,0 +1,83 @@
+import os
+from conftest import login, create_and_login, upload
+
+
+def blob_row(sha256):
+    from db.db import get_conn
+
+    conn = get_conn()
+    try:
+        return conn.execute("SELECT * FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+    finally:
+        conn.close()
+
+
+def file_rows(username):
+    from file_repo import list_files_for_user, get_file_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return [get_file_for_user(uid, r["id"]) for r in list_files_for_user(uid)]
+
+
+def test_duplicate_uploads_share_one_blob(client):
+    from storage import absolute_path
+
+    create_and_login(client, "dedup1")
+    content = b"same dataset bytes " * 500
+    upload(client, "a.csv", content)
+    upload(client, "b.csv", content)
+
+    rows = file_rows("dedup1")
+    assert len(rows) == 2
+    assert rows[0]["storage_path"] == rows[1]["storage_path"]
+    assert rows[0]["stored_filename"] != rows[1]["stored_filename"]
+
+    blob = blob_row(rows[0]["sha256"])
+    assert blob["ref_count"] == 2
+    assert blob["size"] == len(content)
+    blob_file = absolute_path(os.environ["UPLOAD_DIR"], blob["storage_path"])
+    with open(blob_file, "rb") as fh:
+        assert fh.read() == content
+
+    res = client.get(f"/dashboard/download/{rows[1]['id']}")
+    assert res.data == content
+
+
+def test_blob_removed_only_with_last_reference(client):
+    from storage import absolute_path
+
+    create_and_login(client, "dedup2")
+    content = b"shared between two rows"
+    upload(client, "one.txt", content)
+    upload(client, "two.txt", content)
+    rows = file_rows("dedup2")
+    sha = rows[0]["sha256"]
+    blob_file = absolute_path(os.environ["UPLOAD_DIR"], rows[0]["storage_path"])
+
+    client.post(f"/dashboard/delete/{rows[0]['id']}")
+    assert blob_row(sha)["ref_count"] == 1
+    assert os.path.exists(blob_file)
+
+    client.post(f"/dashboard/delete/{rows[1]['id']}")
+    assert blob_row(sha) is None
+    assert not os.path.exists(blob_file)
+
+
+def test_deleting_user_releases_their_blobs(client):
+    from storage import absolute_path
+    from user_repo import get_user_by_username
+
+    create_and_login(client, "dedup3")
+    upload(client, "only-mine.txt", b"nobody else has these bytes 8c1f")
+    row = file_rows("dedup3")[0]
+    blob_file = absolute_path(os.environ["UPLOAD_DIR"], row["storage_path"])
+    assert os.path.exists(blob_file)
+    client.get("/logout")
+
+    login(client, "admin", "admin123")
+    uid = get_user_by_username("dedup3")["id"]
+    client.post(f"/admin/delete_user/{uid}")
+
+    assert blob_row(row["sha256"]) is None
+    assert not os.path.exists(blob_file)
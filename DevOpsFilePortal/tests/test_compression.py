@@ -0,0 +1,157 @@
+import io
+import os
+import gzip
+import zipfile
+import pytest
+from conftest import create_and_login, upload
+
+
+def use_codec(monkeypatch, name):
+    import app as app_module
+    from codec import get_codec
+
+    monkeypatch.setattr(app_module, "STORAGE_CODEC", get_codec(name))
+
+
+def only_file(username):
+    from file_repo import get_file_for_user, list_files_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return get_file_for_user(uid, list_files_for_user(uid)[0]["id"])
+
+
+def stored_bytes(row):
+    from storage import absolute_path
+
+    with open(absolute_path(os.environ["UPLOAD_DIR"], row["storage_path"]), "rb") as fh:
+        return fh.read()
+
+
+CSV = b"".join(b"%d,host-%d,ok,200\n" % (i, i % 7) for i in range(2000))
+
+
+def test_text_upload_is_stored_compressed(client, monkeypatch):
+    from file_repo import get_blob
+    from user_repo import get_user_by_username, get_used_bytes
+
+    use_codec(monkeypatch, "gzip")
+    create_and_login(client, "zip1")
+    upload(client, "report.csv", CSV)
+
+    row = only_file("zip1")
+    assert row["codec"] == "gzip"
+    assert row["file_size"] == len(CSV)
+    assert get_blob(row["sha256"])["codec"] == "gzip"
+    on_disk = stored_bytes(row)
+    assert len(on_disk) < len(CSV) // 2
+    assert gzip.decompress(on_disk) == CSV
+    # Quota counts what the user uploaded, not what the disk holds.
+    assert get_used_bytes(get_user_by_username("zip1")["id"]) == len(CSV)
+
+
+def test_binary_and_incompressible_uploads_stay_raw(client, monkeypatch):
+    use_codec(monkeypatch, "gzip")
+    create_and_login(client, "zip2")
+    upload(client, "photo.jpg", CSV)
+    assert only_file("zip2")["codec"] is None
+
+    create_and_login(client, "zip3")
+    noise = os.urandom(20000)
+    upload(client, "noise.txt", noise)
+    row = only_file("zip3")
+    assert row["codec"] is None
+    assert stored_bytes(row) == noise
+
+
+def test_download_sends_encoded_bytes_when_accepted(client, monkeypatch):
+    use_codec(monkeypatch, "gzip")
+    create_and_login(client, "zip4")
+    upload(client, "app.log", CSV)
+    row = only_file("zip4")
+
+    res = client.get(f"/dashboard/download/{row['id']}", headers={"Accept-Encoding": "gzip, deflate"})
+    assert res.status_code == 200
+    assert res.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in res.headers["Vary"]
+    assert res.headers["ETag"] == f'"{row["sha256"]}-gzip"'
+    assert gzip.decompress(res.data) == CSV
+    res.close()
+
+    res = client.get(f"/dashboard/download/{row['id']}", headers={"If-None-Match": f'"{row["sha256"]}-gzip"', "Accept-Encoding": "gzip"})
+    assert res.status_code == 304
+
+
+def test_download_decompresses_for_clients_without_the_codec(client, monkeypatch):
+    use_codec(monkeypatch, "gzip")
+    create_and_login(client, "zip5")
+    upload(client, "data.json", CSV)
+    row = only_file("zip5")
+
+    res = client.get(f"/dashboard/download/{row['id']}", headers={"Accept-Encoding": "identity"})
+    assert res.status_code == 200
+    assert "Content-Encoding" not in res.headers
+    assert res.headers["ETag"] == f'"{row["sha256"]}"'
+    assert res.headers["Content-Length"] == str(len(CSV))
+    assert "attachment" in res.headers["Content-Disposition"]
+    assert res.data == CSV
+    res.close()
+
+    res = client.get(f"/dashboard/download/{row['id']}", headers={"Range": "bytes=1000-1099"})
+    assert res.status_code == 206
+    assert res.data == CSV[1000:1100]
+    assert res.headers["Content-Range"] == f"bytes 1000-1099/{len(CSV)}"
+    res.close()
+
+
+def test_duplicate_keeps_the_blobs_codec(client, monkeypatch):
+    use_codec(monkeypatch, "gzip")
+    create_and_login(client, "zip6")
+    upload(client, "first.csv", CSV)
+
+    use_codec(monkeypatch, "none")
+    create_and_login(client, "zip7")
+    upload(client, "second.csv", CSV)
+    row = only_file("zip7")
+    assert row["codec"] == "gzip"
+    assert client.get(f"/dashboard/download/{row['id']}").data == CSV
+
+
+def test_batch_upload_and_zip_export_handle_compressed_files(client, monkeypatch):
+    use_codec(monkeypatch, "deflate")
+    create_and_login(client, "zip8")
+    other = b"plain text line\n" * 3000
+    res = client.post(
+        "/dashboard/submit_batch",
+        data={"files": [(io.BytesIO(CSV), "a.csv"), (io.BytesIO(other), "b.txt")]},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+    assert res.status_code == 201
+
+    res = client.get("/dashboard/download_zip")
+    with zipfile.ZipFile(io.BytesIO(res.data)) as zf:
+        assert zf.read("a.csv") == CSV
+        assert zf.read("b.txt") == other
+    res.close()
+
+
+@pytest.mark.parametrize("name", ["gzip", "deflate", "zstd"])
+def test_codec_round_trip(tmp_path, name):
+    from codec import CODECS, compress_file, get_codec, iter_decompressed
+
+    if name not in CODECS:
+        pytest.skip(f"{name} is not available on this Python")
+    src, dst = tmp_path / "in", tmp_path / "out"
+    src.write_bytes(CSV * 3)
+    compress_file(str(src), str(dst), get_codec(name), chunk_size=4096)
+    with open(dst, "rb") as fh:
+        assert b"".join(iter_decompressed(fh, name, chunk_size=1000)) == CSV * 3
+
+
+def test_unknown_codec_is_rejected():
+    from codec import get_codec
+
+    assert get_codec("none") is None
+    with pytest.raises(ValueError):
+        get_codec("lzma")
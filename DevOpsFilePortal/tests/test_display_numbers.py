@@ -0,0 +1,91 @@
+import io
+from conftest import create_and_login, upload
+
+
+def numbers(username):
+    from file_repo import list_files_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return {r["original_filename"]: r["display_no"] for r in list_files_for_user(uid)}
+
+
+def file_id(username, name):
+    from file_repo import list_files_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return next(r["id"] for r in list_files_for_user(uid) if r["original_filename"] == name)
+
+
+def test_display_numbers_are_per_user(client):
+    create_and_login(client, "num1")
+    upload(client, "a.txt")
+    upload(client, "b.txt")
+    client.get("/logout")
+
+    create_and_login(client, "num2")
+    upload(client, "c.txt")
+
+    assert numbers("num1") == {"a.txt": 1, "b.txt": 2}
+    assert numbers("num2") == {"c.txt": 1}
+
+
+def test_display_numbers_restart_once_user_has_no_files(client):
+    create_and_login(client, "num3")
+    upload(client, "a.txt")
+    upload(client, "b.txt")
+
+    client.post(f"/dashboard/delete/{file_id('num3', 'a.txt')}")
+    upload(client, "c.txt")
+    assert numbers("num3") == {"b.txt": 2, "c.txt": 3}
+
+    for name in ("b.txt", "c.txt"):
+        client.post(f"/dashboard/delete/{file_id('num3', name)}")
+    upload(client, "d.txt")
+    assert numbers("num3") == {"d.txt": 1}
+
+
+def test_batch_upload_numbers_in_request_order(client):
+    create_and_login(client, "num4")
+    upload(client, "first.txt")
+    client.post(
+        "/dashboard/submit_batch",
+        data={"file": [(io.BytesIO(b"%d" % i), f"f{i}.txt") for i in range(3)]},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+    assert numbers("num4") == {"first.txt": 1, "f0.txt": 2, "f1.txt": 3, "f2.txt": 4}
+
+
+def test_dashboard_shows_display_number(client):
+    create_and_login(client, "num5")
+    upload(client, "only.txt")
+    fid = file_id("num5", "only.txt")
+
+    page = client.get("/dashboard").data
+    assert b"<tr><td>1</td><td>only.txt</td>" in page
+    assert f'href="/dashboard/download/{fid}"'.encode() in page
+
+
+def test_writes_do_not_count_files_or_touch_sqlite_sequence(client, monkeypatch):
+    import file_repo
+
+    statements = []
+    real_get_conn = file_repo.get_conn
+
+    def traced_get_conn():
+        conn = real_get_conn()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(file_repo, "get_conn", traced_get_conn)
+
+    create_and_login(client, "num6")
+    upload(client, "a.txt")
+    client.post(f"/dashboard/delete/{file_id('num6', 'a.txt')}")
+
+    assert statements
+    sql = "\n".join(statements).upper()
+    assert "COUNT(" not in sql
+    assert "SQLITE_SEQUENCE" not in sql
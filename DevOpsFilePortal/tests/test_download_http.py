@@ -0,0 +1,72 @@
+import hashlib
+from conftest import create_and_login, upload
+
+CONTENT = b"0123456789abcdefghij" * 50
+
+
+def upload_one(client, username):
+    from file_repo import list_files_for_user
+    from user_repo import get_user_by_username
+
+    create_and_login(client, username)
+    upload(client, "range.bin", CONTENT)
+    uid = get_user_by_username(username)["id"]
+    return list_files_for_user(uid)[0]["id"]
+
+
+def test_download_has_strong_etag_from_content_hash(client):
+    fid = upload_one(client, "dl1")
+    res = client.get(f"/dashboard/download/{fid}")
+    assert res.status_code == 200
+    assert res.data == CONTENT
+    assert res.headers["ETag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    assert res.headers["Accept-Ranges"] == "bytes"
+    assert "Last-Modified" in res.headers
+    assert "private" in res.headers["Cache-Control"]
+
+
+def test_if_none_match_returns_304_without_reading_file(client, monkeypatch):
+    import flask
+    import app as app_module
+
+    fid = upload_one(client, "dl2")
+    etag = client.get(f"/dashboard/download/{fid}").headers["ETag"]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("revalidation must not open the stored file")
+
+    monkeypatch.setattr(app_module, "send_from_directory", fail)
+    monkeypatch.setattr(flask, "send_from_directory", fail)
+
+    res = client.get(f"/dashboard/download/{fid}", headers={"If-None-Match": etag})
+    assert res.status_code == 304
+    assert res.headers["ETag"] == etag
+    assert res.data == b""
+
+
+def test_if_modified_since_returns_304(client):
+    fid = upload_one(client, "dl3")
+    last_modified = client.get(f"/dashboard/download/{fid}").headers["Last-Modified"]
+
+    res = client.get(f"/dashboard/download/{fid}", headers={"If-Modified-Since": last_modified})
+    assert res.status_code == 304
+
+
+def test_range_request_returns_partial_content(client):
+    fid = upload_one(client, "dl4")
+
+    res = client.get(f"/dashboard/download/{fid}", headers={"Range": "bytes=10-19"})
+    assert res.status_code == 206
+    assert res.data == CONTENT[10:20]
+    assert res.headers["Content-Range"] == f"bytes 10-19/{len(CONTENT)}"
+
+
+def test_if_range_with_stale_etag_sends_full_file(client):
+    fid = upload_one(client, "dl5")
+
+    res = client.get(
+        f"/dashboard/download/{fid}",
+        headers={"Range": "bytes=0-9", "If-Range": '"not-the-current-etag"'},
+    )
+    assert res.status_code == 200
+    assert res.data == CONTENT
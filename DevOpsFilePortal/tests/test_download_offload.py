@@ -0,0 +1,111 @@
+import os
+import hashlib
+import pytest
+from werkzeug.wsgi import FileWrapper
+from conftest import login, create_and_login, upload
+
+CONTENT = b"offload me " * 400
+
+
+def upload_one(client, username, name="report.bin"):
+    from file_repo import get_file_for_user, list_files_for_user
+    from user_repo import get_user_by_username
+
+    create_and_login(client, username)
+    upload(client, name, CONTENT)
+    uid = get_user_by_username(username)["id"]
+    return get_file_for_user(uid, list_files_for_user(uid)[0]["id"])
+
+
+def set_mode(monkeypatch, mode):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "DOWNLOAD_OFFLOAD", mode)
+
+
+def test_x_accel_redirect_hands_the_file_to_nginx(client, monkeypatch):
+    set_mode(monkeypatch, "x-accel")
+    row = upload_one(client, "off1")
+
+    res = client.get(f"/dashboard/download/{row['id']}")
+    assert res.status_code == 200
+    assert res.data == b""
+    assert res.headers["X-Accel-Redirect"] == f"/_protected_uploads/{row['storage_path']}"
+    assert res.headers["Content-Disposition"] == "attachment; filename=report.bin"
+    assert res.headers["ETag"] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+    assert "private" in res.headers["Cache-Control"]
+
+    # Revalidation is still answered by the app, without the proxy.
+    res = client.get(f"/dashboard/download/{row['id']}", headers={"If-None-Match": res.headers["ETag"]})
+    assert res.status_code == 304
+    assert "X-Accel-Redirect" not in res.headers
+
+
+def test_x_sendfile_sends_the_absolute_path(client, monkeypatch):
+    set_mode(monkeypatch, "x-sendfile")
+    row = upload_one(client, "off2")
+
+    res = client.get(f"/dashboard/download/{row['id']}")
+    path = res.headers["X-Sendfile"]
+    assert os.path.isabs(path)
+    with open(path, "rb") as fh:
+        assert fh.read() == CONTENT
+
+
+def test_offload_checks_ownership_first(client, monkeypatch):
+    set_mode(monkeypatch, "x-accel")
+    row = upload_one(client, "off3")
+    client.get("/logout")
+    upload_one(client, "off4")
+
+    res = client.get(f"/dashboard/download/{row['id']}")
+    assert res.status_code == 404
+    assert "X-Accel-Redirect" not in res.headers
+
+
+def test_compressed_files_are_not_offloaded(client, monkeypatch):
+    import app as app_module
+    from codec import get_codec
+
+    set_mode(monkeypatch, "x-accel")
+    monkeypatch.setattr(app_module, "STORAGE_CODEC", get_codec("gzip"))
+    row = upload_one(client, "off5", name="notes.txt")
+    assert row["codec"] == "gzip"
+
+    res = client.get(f"/dashboard/download/{row['id']}")
+    assert "X-Accel-Redirect" not in res.headers
+    assert res.data == CONTENT
+    res.close()
+
+
+@pytest.mark.wsgi_only
+def test_sendfile_mode_uses_the_servers_file_wrapper(client, monkeypatch):
+    wrapped = []
+
+    def file_wrapper(fh, buffer_size=8192):
+        wrapped.append(fh)
+        return FileWrapper(fh, buffer_size)
+
+    row = upload_one(client, "off6")
+    for mode, expected in (("sendfile", 1), ("none", 0)):
+        set_mode(monkeypatch, mode)
+        wrapped.clear()
+        res = client.get(f"/dashboard/download/{row['id']}", environ_base={"wsgi.file_wrapper": file_wrapper})
+        assert res.data == CONTENT
+        res.close()
+        assert len(wrapped) == expected, mode
+
+    res = client.get(f"/dashboard/download/{row['id']}", headers={"Range": "bytes=0-9"})
+    assert res.status_code == 206
+    assert res.data == CONTENT[:10]
+    res.close()
+
+
+def test_offloaded_downloads_are_counted(client, monkeypatch):
+    set_mode(monkeypatch, "x-sendfile")
+    row = upload_one(client, "off7")
+    client.get(f"/dashboard/download/{row['id']}")
+    client.get("/logout")
+    login(client, "admin", "admin123")
+    text = client.get("/metrics").get_data(as_text=True)
+    assert "downloads_offloaded_total 1" in text.splitlines()
@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from conftest import login
+
+
+@pytest.fixture()
+def stub_github():
+    """Local stand-in for the GitHub dispatches API."""
+    received = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            received.append((self.path, dict(self.headers), json.loads(body)))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", received
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def make_dispatcher(url, **kwargs):
+    from alerts import LoginAlertDispatcher
+
+    return LoginAlertDispatcher(url + "/dispatches", {"Authorization": "token t"}, **kwargs)
+
+
+def test_dispatcher_delivers_with_reused_session(stub_github):
+    url, received = stub_github
+    d = make_dispatcher(url, cooldown=30)
+    try:
+        assert d.submit("alice", "10.0.0.1", "ua")
+        assert d.submit("bob", "10.0.0.2", "ua")
+        assert d.flush()
+    finally:
+        d.stop()
+
+    assert len(received) == 2
+    path, headers, payload = received[0]
+    assert path == "/dispatches"
+    assert headers["Authorization"] == "token t"
+    assert payload["event_type"] == "login_failed"
+    assert d.stats()["sent"] == 2
+
+
+def wait_for(received, n, timeout=3):
+    deadline = time.monotonic() + timeout
+    while len(received) < n and time.monotonic() < deadline:
+        time.sleep(0.02)
+    return len(received) >= n
+
+
+def test_repeated_failures_are_coalesced_within_window(stub_github):
+    url, received = stub_github
+    d = make_dispatcher(url, cooldown=0.3)
+    try:
+        assert d.submit("mallory", "10.0.0.9", "ua")
+        for _ in range(4):
+            assert not d.submit("mallory", "10.0.0.9", "ua")
+        d.flush()
+        assert len(received) == 1
+
+        time.sleep(0.35)
+        assert d.submit("mallory", "10.0.0.9", "ua")
+        d.flush()
+        # The 4 coalesced attempts go out either in a trailing alert or
+        # with this one, whichever comes first.
+        assert wait_for(received, 2)
+        time.sleep(0.1)
+    finally:
+        d.stop()
+
+    attempts = [r[2]["client_payload"]["attempts"] for r in received]
+    assert attempts[0] == 1
+    assert sum(attempts) == 6
+    assert d.stats()["coalesced"] == 4
+
+
+def test_burst_then_silence_sends_a_trailing_alert(stub_github):
+    url, received = stub_github
+    d = make_dispatcher(url, cooldown=0.2)
+    try:
+        assert d.submit("eve", "10.0.0.7", "ua")
+        for _ in range(9):
+            assert not d.submit("eve", "10.0.0.7", "curl/8")
+        d.flush()
+        assert len(received) == 1
+
+        assert wait_for(received, 2)
+        with d._lock:
+            assert ("eve", "10.0.0.7") not in d._last_sent
+    finally:
+        d.stop()
+
+    trailing = received[1][2]["client_payload"]
+    assert trailing["attempts"] == 9
+    assert trailing["user_agent"] == "curl/8"
+    assert len(received) == 2
+
+
+def test_full_queue_drops_instead_of_blocking(stub_github):
+    url, _received = stub_github
+    d = make_dispatcher(url, cooldown=30, queue_size=1)
+    try:
+        start = time.monotonic()
+        for i in range(20):
+            d.submit(f"user{i}", "10.0.0.1", "ua")
+        assert time.monotonic() - start < 0.5
+    finally:
+        d.flush()
+        d.stop()
+
+
+def test_failed_login_alert_is_sent_in_background(client, stub_github, monkeypatch):
+    url, received = stub_github
+    monkeypatch.setenv("ENABLE_GH_LOGIN_ALERTS", "1")
+    monkeypatch.setenv("GITHUB_OWNER", "owner")
+    monkeypatch.setenv("GITHUB_REPO", "repo")
+    monkeypatch.setenv("GITHUB_PAT", "pat")
+    monkeypatch.setenv("GITHUB_API_URL", url)
+
+    res = login(client, "admin", "definitely-wrong")
+    assert res.status_code == 200
+
+    import alerts
+
+    for d in list(alerts._dispatchers.values()):
+        d.flush()
+    alerts.stop_all()
+
+    assert [r[0] for r in received] == ["/repos/owner/repo/dispatches"]
+    assert received[0][2]["client_payload"]["username"] == "admin"
@@ -0,0 +1,115 @@
+import pytest
+import throttle
+from conftest import login
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    return throttle.build_store(request.param, str(tmp_path / "throttle.db"))
+
+
+def test_sliding_window_weights_previous_bucket(store):
+    store.hit("k", 100, now=150)
+    store.hit("k", 100, now=160)
+    assert store.count("k", 100, now=170) == 2
+
+    # Halfway through the next bucket, the old hits count half.
+    store.hit("k", 100, now=250)
+    assert store.count("k", 100, now=250) == pytest.approx(1 + 2 * 0.5)
+
+    # Two buckets later nothing is left.
+    assert store.count("k", 100, now=420) == 0
+
+
+def test_reset_clears_key(store):
+    store.hit("k", 60)
+    store.reset("k")
+    assert store.count("k", 60) == 0
+
+
+def test_memory_store_evicts_expired_keys():
+    store = throttle.MemoryWindowStore(evict_every=3)
+    store.hit("a", 10, now=0)
+    store.hit("b", 10, now=1)
+    store.hit("c", 10, now=100)
+    assert len(store) == 1
+
+
+def test_sqlite_store_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    a = throttle.SQLiteWindowStore(path)
+    b = throttle.SQLiteWindowStore(path)
+    a.hit("ip:1.2.3.4", 60)
+    b.hit("ip:1.2.3.4", 60)
+    assert a.count("ip:1.2.3.4", 60) == 2
+
+
+def test_login_returns_429_before_any_db_or_hash_work(client, monkeypatch):
+    import app as app_module
+
+    limit = app_module.login_throttle.max_per_user
+    for _ in range(limit):
+        assert login(client, "admin", "wrong").status_code == 200
+
+    def fail(*args, **kwargs):
+        raise AssertionError("throttled login must not reach the user lookup")
+
+    monkeypatch.setattr(app_module, "get_user_by_username", fail)
+    monkeypatch.setattr(app_module, "verify_password", fail)
+
+    res = login(client, "admin", "admin123")
+    assert res.status_code == 429
+    assert int(res.headers["Retry-After"]) >= 1
+    assert b"Too many failed login attempts" in res.data
+
+
+def test_successful_login_resets_username_counter(client):
+    import app as app_module
+
+    for _ in range(app_module.login_throttle.max_per_user - 1):
+        login(client, "admin", "wrong")
+
+    assert login(client, "admin", "admin123").status_code in (302, 303)
+    client.get("/logout")
+
+    assert login(client, "admin", "wrong").status_code == 200
+
+
+def test_forwarded_for_cannot_dodge_the_per_ip_limit(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.login_throttle, "max_per_ip", 5)
+    for i in range(5):
+        res = client.post(
+            "/login",
+            data={"username": f"guess{i}", "password": "wrong"},
+            headers={"X-Forwarded-For": f"203.0.113.{i}"},
+        )
+        assert res.status_code == 200
+
+    res = client.post(
+        "/login",
+        data={"username": "guess99", "password": "wrong"},
+        headers={"X-Forwarded-For": "203.0.113.99"},
+    )
+    assert res.status_code == 429
+
+
+def test_forwarded_for_cannot_lock_out_another_address(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module.login_throttle, "max_per_ip", 3)
+    for i in range(3):
+        client.post(
+            "/login",
+            data={"username": f"spray{i}", "password": "wrong"},
+            headers={"X-Forwarded-For": "198.51.100.7"},
+            environ_base={"REMOTE_ADDR": "192.0.2.1"},
+        )
+
+    res = client.post(
+        "/login",
+        data={"username": "admin", "password": "admin123"},
+        environ_base={"REMOTE_ADDR": "198.51.100.7"},
+    )
+    assert res.status_code in (302, 303)
@@ -0,0 +1,86 @@
+import io
+import re
+from conftest import login, create_and_login
+
+
+def scrape(client):
+    client.get("/logout")
+    login(client, "admin", "admin123")
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert res.mimetype == "text/plain"
+    return res.get_data(as_text=True)
+
+
+def sample(text, name, **labels):
+    want = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = rf"^{re.escape(name)}{re.escape('{' + want + '}') if want else ''} (\S+)$"
+    m = re.search(pattern, text, re.M)
+    return float(m.group(1)) if m else None
+
+
+def test_metrics_requires_admin(client):
+    assert client.get("/metrics").status_code in (301, 302, 303)
+    create_and_login(client, "metrics1")
+    assert client.get("/metrics").status_code in (302, 403)
+
+
+def test_request_latency_and_counts(client):
+    create_and_login(client, "metrics2")
+    client.get("/dashboard")
+    client.get("/dashboard")
+    text = scrape(client)
+
+    assert sample(text, "http_requests_total", endpoint="dashboard", method="GET", status="200") == 2
+    assert sample(text, "http_request_duration_seconds_count", endpoint="dashboard") == 2
+    assert sample(text, "http_request_duration_seconds_bucket", endpoint="dashboard", le="+Inf") == 2
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    # The scrape itself is still in flight when the gauge is rendered.
+    assert sample(text, "http_requests_in_flight") == 1
+
+
+def test_db_queries_timed(client):
+    create_and_login(client, "metrics3")
+    client.get("/dashboard")
+    text = scrape(client)
+
+    assert sample(text, "db_query_duration_seconds_count", verb="SELECT") > 0
+    assert sample(text, "db_query_duration_seconds_bucket", verb="SELECT", le="+Inf") > 0
+
+
+def test_upload_and_download_bytes(client):
+    from file_repo import list_files_for_user
+    from user_repo import get_user_by_username
+
+    create_and_login(client, "metrics4")
+    content = b"m" * 5000
+    client.post(
+        "/dashboard/submit",
+        data={"file": (io.BytesIO(content), "m.bin")},
+        content_type="multipart/form-data",
+    )
+    fid = list_files_for_user(get_user_by_username("metrics4")["id"])[0]["id"]
+    res = client.get(f"/dashboard/download/{fid}")
+    res.close()
+    zip_res = client.get("/dashboard/download_zip")
+    zip_len = len(zip_res.data)
+    zip_res.close()
+    text = scrape(client)
+
+    assert sample(text, "upload_bytes_total") > 5000
+    assert sample(text, "download_bytes_total") == 5000 + zip_len
+    assert sample(text, "uploads_in_flight") == 0
+    assert sample(text, "downloads_in_flight") == 0
+
+
+def test_histogram_renders_cumulative_buckets():
+    from metrics import Histogram
+
+    h = Histogram("t_seconds", "test", ("k",), buckets=(0.1, 1.0))
+    for v in (0.05, 0.5, 0.5, 5.0):
+        h.observe(v, ("a",))
+    lines = h.render()
+    assert 't_seconds_bucket{k="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{k="a",le="1"} 3' in lines
+    assert 't_seconds_bucket{k="a",le="+Inf"} 4' in lines
+    assert 't_seconds_count{k="a"} 4' in lines
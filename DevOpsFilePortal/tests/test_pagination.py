@@ -0,0 +1,72 @@
+from conftest import create_and_login, upload
+
+
+def make_user_with_files(client, username, count):
+    """Log in as a new user who has uploaded f0.txt .. f{count-1}.txt, in that order."""
+    from file_repo import list_files_for_user
+    from user_repo import get_user_by_username
+
+    create_and_login(client, username)
+    for i in range(count):
+        assert upload(client, f"f{i}.txt", b"x" * (i + 1)).status_code == 302
+
+    uid = int(get_user_by_username(username)["id"])
+    ids = sorted(int(f["id"]) for f in list_files_for_user(uid))
+    return uid, ids
+
+
+def test_keyset_pages_cover_all_rows_once(client):
+    from file_repo import list_files_page_for_user
+
+    uid, ids = make_user_with_files(client, "pager1", 7)
+
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = list_files_page_for_user(uid, cursor=cursor, limit=3)
+        seen.extend(int(r["id"]) for r in rows)
+        if cursor is None:
+            break
+
+    assert seen == sorted(ids, reverse=True)
+
+
+def test_last_full_page_has_no_next_cursor(client):
+    from file_repo import list_files_page_for_user
+
+    uid, _ids = make_user_with_files(client, "pager2", 4)
+    rows, cursor = list_files_page_for_user(uid, limit=4)
+    assert len(rows) == 4
+    assert cursor is None
+
+
+def test_dashboard_respects_cursor_and_limit(client):
+    _uid, ids = make_user_with_files(client, "pager3", 5)
+
+    res = client.get("/dashboard?limit=2")
+    assert res.status_code == 200
+    assert b"f4.txt" in res.data and b"f3.txt" in res.data
+    assert b"f2.txt" not in res.data
+    assert f"cursor={ids[3]}".encode() in res.data
+
+    res2 = client.get(f"/dashboard?cursor={ids[3]}&limit=2")
+    assert b"f2.txt" in res2.data and b"f1.txt" in res2.data
+    assert b"f4.txt" not in res2.data
+
+
+def test_files_json_endpoint_pages(client):
+    _uid, ids = make_user_with_files(client, "pager4", 3)
+
+    page = client.get("/dashboard/files?limit=2").get_json()
+    assert [f["id"] for f in page["files"]] == [ids[2], ids[1]]
+    assert page["next_cursor"] == ids[1]
+
+    page2 = client.get(f"/dashboard/files?cursor={page['next_cursor']}&limit=2").get_json()
+    assert [f["id"] for f in page2["files"]] == [ids[0]]
+    assert page2["next_cursor"] is None
+
+
+def test_files_json_requires_login(client):
+    res = client.get("/dashboard/files", follow_redirects=False)
+    assert res.status_code in (302, 303)
+    assert "/login" in res.headers.get("Location", "")
@@ -0,0 +1,72 @@
+import pytest
+from conftest import login
+
+
+def test_policy_method_strings():
+    from passwords import HashPolicy
+
+    assert HashPolicy("scrypt").method_string == "scrypt:32768:8:1"
+    assert HashPolicy("pbkdf2", 1000).method_string == "pbkdf2:sha256:1000"
+    assert HashPolicy("pbkdf2:sha512", 2000).method_string == "pbkdf2:sha512:2000"
+    with pytest.raises(ValueError):
+        HashPolicy("md5")
+
+
+def test_invalid_scrypt_cost_fails_when_the_policy_is_built(monkeypatch):
+    from passwords import HashPolicy
+
+    for cost in (20000, 1, -4):
+        with pytest.raises(ValueError, match="power of 2"):
+            HashPolicy("scrypt", cost)
+    assert HashPolicy("scrypt", 16384).method_string == "scrypt:16384:8:1"
+    with pytest.raises(ValueError, match="positive"):
+        HashPolicy("pbkdf2", -1)
+
+    monkeypatch.setenv("PASSWORD_HASH_ITERATIONS", "20000")
+    with pytest.raises(ValueError):
+        HashPolicy.from_env()
+
+
+def test_needs_rehash_detects_other_method_and_cost():
+    from passwords import HashPolicy
+
+    current = HashPolicy("pbkdf2", 1000)
+    assert not current.needs_rehash(current.hash("pw"))
+    assert current.needs_rehash(HashPolicy("pbkdf2", 500).hash("pw"))
+    assert current.needs_rehash(HashPolicy("scrypt", 1024).hash("pw"))
+
+
+def test_login_upgrades_outdated_hash(client, monkeypatch):
+    import passwords
+    from passwords import HashPolicy
+    from user_repo import create_user, get_user_by_username
+
+    monkeypatch.setattr(passwords, "POLICY", HashPolicy("pbkdf2", 1000))
+    create_user("rehash_me", "secret", "user")
+    old_hash = get_user_by_username("rehash_me")["password_hash"]
+    assert old_hash.startswith("pbkdf2:sha256:1000$")
+
+    monkeypatch.setattr(passwords, "POLICY", HashPolicy("pbkdf2", 2000))
+    res = login(client, "rehash_me", "secret")
+    assert res.status_code in (302, 303)
+
+    new_hash = get_user_by_username("rehash_me")["password_hash"]
+    assert new_hash.startswith("pbkdf2:sha256:2000$")
+
+    client.get("/logout")
+    assert login(client, "rehash_me", "secret").status_code in (302, 303)
+    assert get_user_by_username("rehash_me")["password_hash"] == new_hash
+
+
+def test_failed_login_does_not_touch_hash(client, monkeypatch):
+    import passwords
+    from passwords import HashPolicy
+    from user_repo import create_user, get_user_by_username
+
+    monkeypatch.setattr(passwords, "POLICY", HashPolicy("pbkdf2", 1000))
+    create_user("rehash_wrong", "secret", "user")
+    before = get_user_by_username("rehash_wrong")["password_hash"]
+
+    monkeypatch.setattr(passwords, "POLICY", HashPolicy("pbkdf2", 2000))
+    assert login(client, "rehash_wrong", "nope").status_code == 200
+    assert get_user_by_username("rehash_wrong")["password_hash"] == before
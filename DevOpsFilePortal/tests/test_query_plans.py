@@ -0,0 +1,101 @@
+import pytest
+from conftest import login
+
+
+def capture_sql(monkeypatch, module):
+    """Record every statement a repo module sends through get_conn()."""
+    statements = []
+    real_get_conn = module.get_conn
+
+    def traced_get_conn():
+        conn = real_get_conn()
+        conn.set_trace_callback(statements.append)
+        real_close = conn.close
+
+        def close():
+            conn.set_trace_callback(None)
+            real_close()
+
+        conn.close = close
+        return conn
+
+    monkeypatch.setattr(module, "get_conn", traced_get_conn)
+    return statements
+
+
+def query_plan(sql):
+    from db.db import get_conn
+
+    conn = get_conn()
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        return [r["detail"] for r in rows]
+    finally:
+        conn.close()
+
+
+def assert_no_files_scan(statements):
+    selects = [s for s in statements if s.lstrip().upper().startswith("SELECT") and "files" in s]
+    assert selects, "expected the repo call to query the files table"
+    for sql in selects:
+        plan = query_plan(sql)
+        assert not any(step.startswith("SCAN files") for step in plan), (sql, plan)
+        assert not any("USE TEMP B-TREE" in step for step in plan), (sql, plan)
+
+
+def test_migrations_recorded_in_user_version(client):
+    from db.db import MIGRATIONS, get_conn, get_schema_version
+
+    conn = get_conn()
+    try:
+        assert get_schema_version(conn) == MIGRATIONS[-1][0]
+        names = {r["name"] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    finally:
+        conn.close()
+    assert {"idx_files_user_id_id", "idx_files_stored_filename"} <= names
+
+
+def test_migrate_is_idempotent(client):
+    from db.db import MIGRATIONS, get_conn, migrate
+
+    conn = get_conn()
+    try:
+        assert migrate(conn) == MIGRATIONS[-1][0]
+    finally:
+        conn.close()
+
+
+def test_stored_filename_must_be_unique(client):
+    import sqlite3
+    from file_repo import insert_file, delete_file_record_for_user
+    from user_repo import get_user_by_username
+
+    admin = get_user_by_username("admin")
+    fid = insert_file(admin["id"], "a.txt", "dup_a.txt", "text/plain", 1, "dup_a.txt")
+    try:
+        with pytest.raises(sqlite3.IntegrityError):
+            insert_file(admin["id"], "a.txt", "dup_a.txt", "text/plain", 1, "dup_a.txt")
+    finally:
+        delete_file_record_for_user(admin["id"], fid)
+
+
+@pytest.mark.parametrize(
+    "call",
+    [
+        lambda repo, uid: repo.list_files_for_user(uid),
+        lambda repo, uid: repo.list_files_page_for_user(uid, limit=10),
+        lambda repo, uid: repo.list_files_page_for_user(uid, cursor=1000, limit=10),
+        lambda repo, uid: repo.get_file_for_user(uid, 1),
+    ],
+    ids=["list_files_for_user", "first_page", "keyset_page", "get_file_for_user"],
+)
+def test_file_queries_use_index(client, monkeypatch, call):
+    import file_repo
+    from user_repo import get_user_by_username
+
+    login(client, "admin", "admin123")
+    uid = get_user_by_username("admin")["id"]
+
+    statements = capture_sql(monkeypatch, file_repo)
+    call(file_repo, uid)
+    assert_no_files_scan(statements)
@@ -0,0 +1,118 @@
+import io
+import os
+import pytest
+from conftest import login, create_and_login, upload
+
+
+def used_bytes(username):
+    from user_repo import get_user_by_username, get_used_bytes
+
+    return get_used_bytes(get_user_by_username(username)["id"])
+
+
+def set_quota(monkeypatch, n):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "USER_QUOTA_BYTES", n)
+
+
+def test_used_bytes_follows_uploads_and_deletes(client):
+    from file_repo import list_files_for_user
+    from user_repo import get_user_by_username
+
+    create_and_login(client, "quota1")
+    upload(client, "a.bin", b"a" * 1000)
+    upload(client, "b.bin", b"a" * 1000)  # deduplicated on disk, still counted
+    client.post(
+        "/dashboard/submit_batch",
+        data={"file": [(io.BytesIO(b"c" * 300), "c.bin")]},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+    assert used_bytes("quota1") == 2300
+
+    uid = get_user_by_username("quota1")["id"]
+    first = list_files_for_user(uid)[-1]["id"]
+    client.post(f"/dashboard/delete/{first}")
+    assert used_bytes("quota1") == 1300
+
+
+def test_upload_over_quota_rejected_before_reading_body(client, monkeypatch):
+    import storage
+
+    set_quota(monkeypatch, 5000)
+    create_and_login(client, "quota2")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("body should not be read")
+
+    monkeypatch.setattr("app.receive_multipart_files", fail)
+    res = upload(client, "big.bin", os.urandom(6000))
+    assert res.status_code == 302
+    page = client.get("/dashboard")
+    assert b"storage quota exceeded" in page.data
+    assert used_bytes("quota2") == 0
+    assert not os.listdir(storage.incoming_dir(os.environ["UPLOAD_DIR"]))
+
+
+def test_exact_size_enforced_at_insert(client, monkeypatch):
+    import app as app_module
+    from file_repo import QuotaExceeded
+
+    create_and_login(client, "quota3")
+    upload(client, "first.bin", b"x" * 800)
+
+    # Skip the Content-Length pre-check to exercise the authoritative one.
+    set_quota(monkeypatch, 1000)
+    monkeypatch.setattr(app_module, "quota_allows", lambda user_id, incoming: True)
+    upload(client, "second.bin", b"y" * 300)
+    assert used_bytes("quota3") == 800
+    assert b"storage quota exceeded" in client.get("/dashboard").data
+
+    from file_repo import insert_file
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username("quota3")["id"]
+    with pytest.raises(QuotaExceeded):
+        insert_file(uid, "z.bin", "z_stored", None, 201, "z_stored", quota=1000)
+    assert used_bytes("quota3") == 800
+
+
+def test_batch_rejects_files_past_quota(client, monkeypatch):
+    set_quota(monkeypatch, 100_000)
+    create_and_login(client, "quota4")
+    upload(client, "existing.bin", b"e" * 60_000)
+
+    # The body is larger than what is left, but the file that fits is kept.
+    res = client.post(
+        "/dashboard/submit_batch",
+        data={"file": [(io.BytesIO(b"1" * 30_000), "fits.bin"), (io.BytesIO(b"2" * 30_000), "too_much.bin")]},
+        content_type="multipart/form-data",
+        headers={"Accept": "application/json"},
+    )
+    assert res.status_code == 201
+    results = res.get_json()["results"]
+    assert [r["status"] for r in results] == ["uploaded", "rejected"]
+    assert results[1]["error"] == "Storage quota exceeded."
+    assert used_bytes("quota4") == 90_000
+
+
+def test_admin_page_shows_usage(client, monkeypatch):
+    set_quota(monkeypatch, 1024 * 1024)
+    create_and_login(client, "quota5")
+    upload(client, "a.bin", b"a" * 1536)
+    client.get("/logout")
+
+    login(client, "admin", "admin123")
+    page = client.get("/admin").data
+    assert b"<td>quota5</td>" in page
+    assert b"1.5 KB / 1.0 MB" in page
+
+
+def test_fmt_bytes():
+    from fragments import fmt_bytes
+
+    assert fmt_bytes(0) == "0 B"
+    assert fmt_bytes(1023) == "1023 B"
+    assert fmt_bytes(1536) == "1.5 KB"
+    assert fmt_bytes(5 * 1024 ** 3) == "5.0 GB"
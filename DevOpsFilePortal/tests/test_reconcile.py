@@ -0,0 +1,225 @@
+import os
+from conftest import login, create_and_login, upload
+
+
+def upload_as(client, username, files):
+    create_and_login(client, username)
+    for name, content in files:
+        upload(client, name, content)
+
+
+def rows_for(username):
+    from file_repo import list_files_for_user, get_file_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return [get_file_for_user(uid, r["id"]) for r in list_files_for_user(uid)]
+
+
+def backdate_uploads(seconds=7200):
+    from db.db import get_conn
+
+    conn = get_conn()
+    try:
+        conn.execute("UPDATE files SET uploaded_at = datetime('now', ?)", (f"-{seconds} seconds",))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_file(path, content=b"orphan"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fh:
+        fh.write(content)
+
+
+def reconcile(**kwargs):
+    from maintenance import reconcile_uploads
+
+    kwargs.setdefault("grace_seconds", 0)
+    kwargs.setdefault("max_deletes_per_sec", 0)
+    kwargs.setdefault("log", lambda msg: None)
+    return reconcile_uploads(os.environ["UPLOAD_DIR"], **kwargs)
+
+
+def test_orphan_files_removed_referenced_kept(client):
+    from storage import absolute_path
+
+    upload_dir = os.environ["UPLOAD_DIR"]
+    upload_as(client, "gc1", [("keep.txt", b"keep me")])
+    kept = absolute_path(upload_dir, rows_for("gc1")[0]["storage_path"])
+
+    orphan = os.path.join(upload_dir, "blobs", "zz", "yy", "zzyy" + "0" * 60)
+    legacy = os.path.join(upload_dir, "old_upload.txt")
+    write_file(orphan, b"x" * 100)
+    write_file(legacy, b"y" * 10)
+
+    stats = reconcile()
+
+    assert stats["orphans_found"] == 2
+    assert stats["orphans_removed"] == 2
+    assert stats["bytes_freed"] == 110
+    assert not os.path.exists(orphan)
+    assert not os.path.exists(os.path.join(upload_dir, "blobs", "zz"))
+    assert not os.path.exists(legacy)
+    assert os.path.exists(kept)
+    assert client.get(f"/dashboard/download/{rows_for('gc1')[0]['id']}").data == b"keep me"
+
+
+def test_referenced_batches_take_no_write_lock(client, monkeypatch):
+    from db import db as db_module
+
+    upload_as(client, "gc8", [(f"f{i}.txt", f"file {i}".encode()) for i in range(4)])
+    statements = []
+    monkeypatch.setattr(db_module, "_query_observer", lambda sql, elapsed: statements.append(sql))
+
+    stats = reconcile(batch_size=2)
+    assert stats["files_scanned"] == 4
+    assert stats["orphans_found"] == 0
+    assert not any(sql.startswith("BEGIN") for sql in statements)
+
+
+def test_dry_run_and_grace_period_remove_nothing(client):
+    upload_dir = os.environ["UPLOAD_DIR"]
+    orphan = os.path.join(upload_dir, "stray.bin")
+    write_file(orphan)
+
+    stats = reconcile(dry_run=True)
+    assert stats["orphans_found"] == 1
+    assert stats["orphans_removed"] == 0
+    assert os.path.exists(orphan)
+
+    stats = reconcile(grace_seconds=3600)
+    assert stats["orphans_found"] == 0
+    assert os.path.exists(orphan)
+
+
+def test_dangling_rows_removed_with_their_blob(client):
+    from storage import absolute_path
+    from db.db import get_conn
+
+    upload_dir = os.environ["UPLOAD_DIR"]
+    upload_as(client, "gc2", [("gone.txt", b"will vanish"), ("here.txt", b"stays")])
+    rows = {r["original_filename"]: r for r in rows_for("gc2")}
+    os.remove(absolute_path(upload_dir, rows["gone.txt"]["storage_path"]))
+    backdate_uploads()
+
+    stats = reconcile()
+
+    assert stats["dangling_rows"] == 1
+    assert stats["dangling_removed"] == 1
+    assert [r["original_filename"] for r in rows_for("gc2")] == ["here.txt"]
+    conn = get_conn()
+    try:
+        assert conn.execute(
+            "SELECT 1 FROM blobs WHERE sha256 = ?", (rows["gone.txt"]["sha256"],)
+        ).fetchone() is None
+    finally:
+        conn.close()
+
+
+def test_an_empty_upload_dir_deletes_no_rows(client):
+    import shutil
+
+    upload_dir = os.environ["UPLOAD_DIR"]
+    upload_as(client, "gc9", [("a.txt", b"aaa"), ("b.txt", b"bbb")])
+    backdate_uploads()
+    # The volume is not mounted: UPLOAD_DIR exists but is empty.
+    shutil.rmtree(upload_dir)
+    os.makedirs(upload_dir)
+
+    messages = []
+    stats = reconcile(log=messages.append)
+    assert stats["dangling_rows"] == 2
+    assert stats["dangling_removed"] == 0
+    assert stats["dangling_blocked"] == "no stored files were found on disk"
+    assert len(rows_for("gc9")) == 2
+    assert "keeping 2 dangling rows" in messages[0]
+
+    stats = reconcile(force=True)
+    assert stats["dangling_removed"] == 2
+    assert rows_for("gc9") == []
+
+
+def test_many_missing_files_trip_the_ratio_guard(client):
+    from storage import absolute_path
+
+    upload_dir = os.environ["UPLOAD_DIR"]
+    upload_as(client, "gc10", [(f"f{i}.txt", f"file {i}".encode()) for i in range(12)])
+    backdate_uploads()
+    for row in rows_for("gc10")[1:]:
+        os.remove(absolute_path(upload_dir, row["storage_path"]))
+
+    stats = reconcile(log=lambda msg: None)
+    assert stats["dangling_rows"] == 11
+    assert stats["dangling_removed"] == 0
+    assert "11 of 12 rows" in stats["dangling_blocked"]
+    assert len(rows_for("gc10")) == 12
+
+    stats = reconcile(max_dangling_ratio=1.0)
+    assert stats["dangling_removed"] == 11
+
+
+def test_recent_rows_are_not_dangling(client):
+    from storage import absolute_path
+
+    upload_as(client, "gc3", [("new.txt", b"just uploaded")])
+    row = rows_for("gc3")[0]
+    os.remove(absolute_path(os.environ["UPLOAD_DIR"], row["storage_path"]))
+
+    stats = reconcile(grace_seconds=3600)
+    assert stats["dangling_rows"] == 0
+    assert len(rows_for("gc3")) == 1
+
+
+def test_stale_partial_uploads_removed(client):
+    from storage import incoming_dir
+
+    part = os.path.join(incoming_dir(os.environ["UPLOAD_DIR"]), "abandoned.part")
+    write_file(part)
+
+    assert reconcile()["stale_parts_removed"] == 1
+    assert not os.path.exists(part)
+
+
+def test_rate_limit_spaces_out_deletions(client):
+    import time
+
+    upload_dir = os.environ["UPLOAD_DIR"]
+    for i in range(6):
+        write_file(os.path.join(upload_dir, f"orphan{i}.bin"))
+
+    start = time.monotonic()
+    stats = reconcile(batch_size=2, max_deletes_per_sec=20)
+    assert stats["orphans_removed"] == 6
+    assert time.monotonic() - start >= 0.25
+
+
+def test_path_lookups_use_indexes(client):
+    from db.db import get_conn
+
+    conn = get_conn()
+    try:
+        for table in ("files", "blobs"):
+            plan = [
+                r["detail"]
+                for r in conn.execute(f"EXPLAIN QUERY PLAN SELECT storage_path FROM {table} WHERE storage_path IN (?, ?)", ("a", "b"))
+            ]
+            assert not any(step.startswith(f"SCAN {table}") for step in plan), plan
+    finally:
+        conn.close()
+
+
+def test_cli_and_status_endpoint(client):
+    import app as app_module
+
+    write_file(os.path.join(os.environ["UPLOAD_DIR"], "cli_orphan.bin"))
+    result = app_module.app.test_cli_runner().invoke(args=["reconcile-uploads", "--grace", "0", "--rate", "0"])
+    assert result.exit_code == 0, result.output
+    assert "1 orphan files (1 removed" in result.output
+
+    login(client, "admin", "admin123")
+    status = client.get("/admin/gc_status").get_json()["upload_gc"]
+    assert status["orphans_removed"] == 1
+    assert status["running"] is False
+    assert status["passes"] >= 1
@@ -0,0 +1,87 @@
+import os
+from conftest import create_and_login, upload
+
+
+def upload_as(client, username, files):
+    create_and_login(client, username)
+    for name, content in files:
+        upload(client, name, content)
+
+
+def rows_for(username):
+    from file_repo import list_files_for_user, get_file_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return [get_file_for_user(uid, r["id"]) for r in list_files_for_user(uid)]
+
+
+def test_layouts():
+    from storage import get_layout, blob_path
+
+    assert get_layout("flat").path_for("abcdef") == "abcdef"
+    assert get_layout("sharded").path_for("abcdef") == "ab/cd/abcdef"
+    assert blob_path("abcdef", get_layout("sharded")) == "blobs/ab/cd/abcdef"
+
+
+def test_uploads_use_configured_layout(client, monkeypatch):
+    import storage
+
+    monkeypatch.setattr(storage, "UPLOAD_LAYOUT", "sharded")
+    upload_as(client, "layout1", [("a.txt", b"layout one")])
+    row = rows_for("layout1")[0]
+    sha = row["sha256"]
+    assert row["storage_path"] == f"blobs/{sha[:2]}/{sha[2:4]}/{sha}"
+
+
+def test_reshard_moves_blobs_and_legacy_files(client, monkeypatch):
+    import storage
+    import app as app_module
+    from db.db import get_conn
+    from file_repo import insert_file
+    from user_repo import get_user_by_username
+
+    upload_dir = os.environ["UPLOAD_DIR"]
+    monkeypatch.setattr(storage, "UPLOAD_LAYOUT", "flat")
+    upload_as(client, "reshard1", [("a.txt", b"reshard a"), ("b.txt", b"reshard b")])
+
+    # A row from before the blob store: the file sits in UPLOAD_DIR itself.
+    legacy_name = "0123456789abcdef_legacy.txt"
+    with open(os.path.join(upload_dir, legacy_name), "wb") as fh:
+        fh.write(b"legacy bytes")
+    uid = get_user_by_username("reshard1")["id"]
+    insert_file(uid, "legacy.txt", legacy_name, "text/plain", 12, legacy_name)
+
+    before = {r["id"]: r["storage_path"] for r in rows_for("reshard1")}
+    assert all(p.count("/") <= 1 for p in before.values())
+
+    runner = app_module.app.test_cli_runner()
+    dry = runner.invoke(args=["reshard-uploads", "--layout", "sharded", "--dry-run"])
+    assert "Would move 2 blobs and 1 files" in dry.output
+    assert {r["id"]: r["storage_path"] for r in rows_for("reshard1")} == before
+
+    res = runner.invoke(args=["reshard-uploads", "--layout", "sharded", "--batch-size", "1"])
+    assert res.exit_code == 0, res.output
+    assert "Moved 2 blobs and 1 files" in res.output
+
+    sharded = storage.get_layout("sharded")
+    for row in rows_for("reshard1"):
+        if row["sha256"] and row["stored_filename"] != legacy_name:
+            assert row["storage_path"] == storage.blob_path(row["sha256"], sharded)
+        else:
+            assert row["storage_path"] == sharded.path_for(legacy_name)
+        assert os.path.exists(storage.absolute_path(upload_dir, row["storage_path"]))
+        assert not os.path.exists(storage.absolute_path(upload_dir, before[row["id"]]))
+
+        res = client.get(f"/dashboard/download/{row['id']}")
+        assert res.status_code == 200
+
+    conn = get_conn()
+    try:
+        paths = {r["storage_path"] for r in conn.execute("SELECT storage_path FROM blobs")}
+    finally:
+        conn.close()
+    assert all(p.startswith("blobs/") and p.count("/") == 3 for p in paths)
+
+    again = runner.invoke(args=["reshard-uploads", "--layout", "sharded"])
+    assert "Moved 0 blobs and 0 files" in again.output
@@ -0,0 +1,202 @@
+import os
+from conftest import create_and_login
+
+CHUNK = 65536
+
+
+def start(client, filename, size, chunk_size=CHUNK):
+    return client.post("/dashboard/uploads", json={"filename": filename, "size": size, "chunk_size": chunk_size})
+
+
+def put_chunk(client, session_id, n, data):
+    return client.put(
+        f"/dashboard/uploads/{session_id}/chunks/{n}",
+        data=data,
+        content_type="application/octet-stream",
+    )
+
+
+def chunks_of(content, size=CHUNK):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+def test_chunks_in_any_order_then_finalize(client):
+    from storage import STAGING_DIRNAME
+
+    create_and_login(client, "resume1")
+    content = os.urandom(CHUNK * 3 + 1234)
+    res = start(client, "big.bin", len(content))
+    assert res.status_code == 201
+    sess = res.get_json()
+    assert sess["chunk_size"] == CHUNK
+    assert sess["chunk_count"] == 4
+    assert res.headers["Location"].endswith(f"/dashboard/uploads/{sess['id']}")
+
+    parts = chunks_of(content)
+    for n in (2, 0, 3):
+        assert put_chunk(client, sess["id"], n, parts[n]).status_code == 204
+    # Retrying a chunk is harmless.
+    assert put_chunk(client, sess["id"], 0, parts[0]).status_code == 204
+
+    status = client.get(f"/dashboard/uploads/{sess['id']}")
+    body = status.get_json()
+    assert body["offset"] == CHUNK
+    assert status.headers["Upload-Offset"] == str(CHUNK)
+    assert body["received"] == [0, 2, 3]
+    assert body["missing"] == [1]
+
+    res = client.post(f"/dashboard/uploads/{sess['id']}/finalize")
+    assert res.status_code == 409
+    assert res.get_json()["missing"] == [1]
+
+    assert put_chunk(client, sess["id"], 1, parts[1]).status_code == 204
+    assert client.get(f"/dashboard/uploads/{sess['id']}").get_json()["offset"] == len(content)
+
+    res = client.post(f"/dashboard/uploads/{sess['id']}/finalize")
+    assert res.status_code == 201
+    file_id = res.get_json()["id"]
+    assert res.get_json()["file_size"] == len(content)
+
+    download = client.get(f"/dashboard/download/{file_id}")
+    assert download.data == content
+    download.close()
+
+    # The staged data became the blob; nothing is left behind.
+    staging = os.path.join(os.environ["UPLOAD_DIR"], STAGING_DIRNAME)
+    assert os.listdir(staging) == []
+
+    # A finalize retried after a lost response returns the same file.
+    again = client.post(f"/dashboard/uploads/{sess['id']}/finalize")
+    assert again.status_code == 200
+    assert again.get_json()["id"] == file_id
+    assert put_chunk(client, sess["id"], 0, parts[0]).status_code == 409
+
+
+def test_chunk_validation(client):
+    create_and_login(client, "resume2")
+    sess = start(client, "x.bin", CHUNK + 10).get_json()
+
+    assert put_chunk(client, sess["id"], 0, b"short").status_code == 400
+    assert put_chunk(client, sess["id"], 1, b"a" * 11).status_code == 400
+    assert put_chunk(client, sess["id"], 2, b"a" * 10).status_code == 400
+    assert put_chunk(client, sess["id"], 1, b"a" * 10).status_code == 204
+
+    assert start(client, "", 10).status_code == 400
+    assert start(client, "y.bin", 0).status_code == 400
+    assert client.post("/dashboard/uploads", json={"filename": "z.bin", "size": "lots"}).status_code == 400
+
+
+def test_sessions_are_private(client):
+    create_and_login(client, "resume3")
+    sess = start(client, "mine.bin", 100).get_json()
+
+    create_and_login(client, "resume4")
+    assert client.get(f"/dashboard/uploads/{sess['id']}").status_code == 404
+    assert put_chunk(client, sess["id"], 0, b"a" * 100).status_code == 404
+    assert client.post(f"/dashboard/uploads/{sess['id']}/finalize").status_code == 404
+    assert client.delete(f"/dashboard/uploads/{sess['id']}").status_code == 404
+
+
+def test_open_sessions_count_against_quota(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "USER_QUOTA_BYTES", 1000)
+    create_and_login(client, "resume5")
+    assert start(client, "a.bin", 600).status_code == 201
+    assert start(client, "b.bin", 600).status_code == 413
+    assert start(client, "c.bin", 400).status_code == 201
+
+
+def test_delete_session_removes_staged_data(client):
+    from storage import staging_path
+
+    create_and_login(client, "resume6")
+    sess = start(client, "gone.bin", 100).get_json()
+    path = staging_path(os.environ["UPLOAD_DIR"], sess["id"])
+    assert os.path.exists(path)
+
+    assert client.delete(f"/dashboard/uploads/{sess['id']}").status_code == 204
+    assert not os.path.exists(path)
+    assert client.get(f"/dashboard/uploads/{sess['id']}").status_code == 404
+
+
+def test_stale_sessions_and_stray_files_expire(client):
+    from db.db import get_conn
+    from maintenance import expire_upload_sessions
+    from storage import staging_path
+
+    upload_dir = os.environ["UPLOAD_DIR"]
+    create_and_login(client, "resume7")
+    old = start(client, "old.bin", 100).get_json()["id"]
+    fresh = start(client, "fresh.bin", 100).get_json()["id"]
+    stray = staging_path(upload_dir, "f" * 32)
+    with open(stray, "wb") as fh:
+        fh.write(b"left by a deleted user")
+    os.utime(stray, (0, 0))
+
+    conn = get_conn()
+    try:
+        conn.execute("UPDATE upload_sessions SET updated_at = datetime('now', '-2 days') WHERE id = ?", (old,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert expire_upload_sessions(upload_dir, 86400) == 2
+    assert not os.path.exists(staging_path(upload_dir, old))
+    assert not os.path.exists(stray)
+    assert os.path.exists(staging_path(upload_dir, fresh))
+    assert client.get(f"/dashboard/uploads/{old}").status_code == 404
+
+
+def test_finalize_applies_the_storage_codec(client, monkeypatch):
+    import app as app_module
+    from codec import get_codec
+    from file_repo import get_file_for_user
+    from user_repo import get_user_by_username
+
+    monkeypatch.setattr(app_module, "STORAGE_CODEC", get_codec("gzip"))
+    create_and_login(client, "resume8")
+    content = b"2025-10-01 INFO request served\n" * 5000
+    sess = start(client, "server.log", len(content)).get_json()
+    for n, part in enumerate(chunks_of(content)):
+        assert put_chunk(client, sess["id"], n, part).status_code == 204
+    file_id = client.post(f"/dashboard/uploads/{sess['id']}/finalize").get_json()["id"]
+
+    row = get_file_for_user(get_user_by_username("resume8")["id"], file_id)
+    assert row["codec"] == "gzip"
+    assert client.get(f"/dashboard/download/{file_id}").data == content
+
+
+def test_open_sessions_per_user_are_limited(client, monkeypatch):
+    import app as app_module
+
+    monkeypatch.setattr(app_module, "UPLOAD_SESSION_MAX_OPEN", 2)
+    create_and_login(client, "resume9")
+    first = start(client, "a.bin", 100).get_json()["id"]
+    assert start(client, "b.bin", 100).status_code == 201
+    assert start(client, "c.bin", 100).status_code == 429
+
+    assert client.delete(f"/dashboard/uploads/{first}").status_code == 204
+    assert start(client, "c.bin", 100).status_code == 201
+
+
+def test_admins_are_refused_on_every_session_route(client):
+    from db.db import get_conn
+    from user_repo import clear_user_cache
+
+    create_and_login(client, "resume10")
+    sess = start(client, "x.bin", 100).get_json()["id"]
+    # An admin who somehow holds a session id, e.g. after a role change.
+    conn = get_conn()
+    try:
+        conn.execute("UPDATE users SET role = 'admin' WHERE username = 'resume10'")
+        conn.commit()
+    finally:
+        conn.close()
+    clear_user_cache()
+
+    assert start(client, "y.bin", 100).status_code == 403
+    assert client.get(f"/dashboard/uploads/{sess}").status_code == 403
+    assert put_chunk(client, sess, 0, b"a" * 100).status_code == 403
+    assert client.post(f"/dashboard/uploads/{sess}/finalize").status_code == 403
+    assert client.delete(f"/dashboard/uploads/{sess}").status_code == 403
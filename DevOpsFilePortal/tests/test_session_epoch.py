@@ -0,0 +1,83 @@
+import importlib.util
+from conftest import login, create_and_login, PROJECT_ROOT
+
+
+def test_sessions_are_valid_on_every_worker(client, monkeypatch):
+    import app as app_module
+    from session_epoch import SessionEpoch
+
+    create_and_login(client, "epoch1")
+    assert client.get("/dashboard").status_code == 200
+
+    # Another worker: its own cache, the same database.
+    monkeypatch.setattr(app_module, "session_epoch", SessionEpoch(ttl=0))
+    assert client.get("/dashboard").status_code == 200
+
+
+def test_a_bump_elsewhere_logs_out_after_the_ttl(client, monkeypatch):
+    import app as app_module
+    from session_epoch import bump_epoch
+
+    create_and_login(client, "epoch2")
+    assert client.get("/dashboard").status_code == 200
+
+    bump_epoch()
+    # Cached until the TTL runs out.
+    assert client.get("/dashboard").status_code == 200
+    monkeypatch.setattr(app_module.session_epoch, "_expires_at", 0.0)
+    res = client.get("/dashboard", follow_redirects=False)
+    assert res.status_code == 302
+    assert "/login" in res.headers["Location"]
+
+
+def test_a_newer_epoch_is_accepted_before_the_ttl(client):
+    import app as app_module
+    from session_epoch import SessionEpoch
+
+    create_and_login(client, "epoch5")
+    # This worker has cached the epoch; another one bumps it and logs in.
+    app_module.session_epoch.current()
+    other = SessionEpoch()
+    other.bump()
+    with client.session_transaction() as sess:
+        sess["epoch"] = other.current()
+    assert client.get("/dashboard").status_code == 200
+
+
+def test_admin_can_log_everyone_out(client):
+    create_and_login(client, "epoch3")
+    user_cookie = client.get_cookie("session").value
+    client.get("/logout", follow_redirects=False)
+
+    login(client, "admin", "admin123")
+    res = client.post("/admin/logout_all", follow_redirects=True)
+    assert b"All other sessions have been logged out." in res.data
+    # The admin who asked stays logged in.
+    assert client.get("/admin").status_code == 200
+
+    client.set_cookie("session", user_cookie)
+    res = client.get("/dashboard", follow_redirects=False)
+    assert res.status_code == 302
+    assert "/login" in res.headers["Location"]
+
+
+def test_logout_all_is_admin_only(client):
+    from session_epoch import read_epoch
+
+    create_and_login(client, "epoch4")
+    before = read_epoch()
+    client.post("/admin/logout_all", follow_redirects=False)
+    assert read_epoch() == before
+
+
+def test_gunicorn_start_bumps_the_epoch(client):
+    from session_epoch import read_epoch
+
+    spec = importlib.util.spec_from_file_location("gunicorn_conf", PROJECT_ROOT / "gunicorn.conf.py")
+    conf = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(conf)
+
+    login(client, "admin", "admin123")
+    before = read_epoch()
+    conf.on_starting(None)
+    assert read_epoch() != before
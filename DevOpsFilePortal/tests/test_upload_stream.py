@@ -0,0 +1,94 @@
+import io
+import os
+import hashlib
+import pytest
+from conftest import create_and_login
+
+
+def multipart_body(boundary, parts):
+    out = []
+    for name, filename, content in parts:
+        out.append(f"--{boundary}\r\n".encode())
+        if filename is None:
+            out.append(f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode())
+        else:
+            out.append(
+                f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n".encode()
+            )
+        out.append(content + b"\r\n")
+    out.append(f"--{boundary}--\r\n".encode())
+    return b"".join(out)
+
+
+def test_receive_multipart_hashes_and_counts_in_one_pass(tmp_path):
+    from storage import receive_multipart_files, INCOMING_DIRNAME
+
+    payload = os.urandom(200_000)
+    body = multipart_body("XyZ", [("note", None, b"hi"), ("file", "data.bin", payload), ("empty", "", b"")])
+
+    received = receive_multipart_files(io.BytesIO(body), "XyZ", str(tmp_path), chunk_size=4096)
+    try:
+        assert len(received) == 1
+        f = received[0]
+        assert f.field_name == "file"
+        assert f.original_filename == "data.bin"
+        assert f.file_size == len(payload)
+        assert f.sha256 == hashlib.sha256(payload).hexdigest()
+        with open(f.temp_path, "rb") as fh:
+            assert fh.read() == payload
+        assert os.path.dirname(f.temp_path) == str(tmp_path / INCOMING_DIRNAME)
+    finally:
+        for r in received:
+            r.discard()
+
+
+def test_truncated_body_leaves_no_partial_files(tmp_path):
+    from storage import receive_multipart_files, INCOMING_DIRNAME
+
+    body = multipart_body("XyZ", [("file", "data.bin", b"x" * 10_000)])
+    truncated = body[: len(body) // 2]
+
+    with pytest.raises(ValueError):
+        receive_multipart_files(io.BytesIO(truncated), "XyZ", str(tmp_path), chunk_size=1024)
+
+    assert os.listdir(tmp_path / INCOMING_DIRNAME) == []
+
+
+def test_upload_records_hash_and_size(client):
+    from file_repo import list_files_for_user, get_file_for_user
+    from user_repo import get_user_by_username
+    from storage import INCOMING_DIRNAME, absolute_path
+
+    create_and_login(client, "streamer")
+    content = b"streamed upload body " * 1000
+
+    res = client.post(
+        "/dashboard/submit",
+        data={"file": (io.BytesIO(content), "stream.txt")},
+        content_type="multipart/form-data",
+        follow_redirects=True,
+    )
+    assert b"File uploaded successfully." in res.data
+
+    uid = get_user_by_username("streamer")["id"]
+    row = get_file_for_user(uid, list_files_for_user(uid)[0]["id"])
+    assert row["file_size"] == len(content)
+    assert row["sha256"] == hashlib.sha256(content).hexdigest()
+    upload_dir = os.environ["UPLOAD_DIR"]
+    with open(absolute_path(upload_dir, row["storage_path"]), "rb") as fh:
+        assert fh.read() == content
+
+    assert os.listdir(os.path.join(upload_dir, INCOMING_DIRNAME)) == []
+
+
+def test_upload_without_multipart_body_rejected(client):
+    create_and_login(client, "streamer2")
+    res = client.post("/dashboard/submit", data="not a form", content_type="text/plain", follow_redirects=True)
+    assert b"No file part." in res.data
+
+
+def test_dashboard_form_posts_to_upload_route(client):
+    create_and_login(client, "streamer3")
+    res = client.get("/dashboard")
+    assert b'action="/dashboard/submit"' in res.data
@@ -0,0 +1,81 @@
+from conftest import login, create_and_login
+
+
+def test_deleted_user_session_is_rejected(client):
+    from user_repo import delete_user, get_user_by_username
+
+    create_and_login(client, "ghost")
+    uid = int(get_user_by_username("ghost")["id"])
+    assert client.get("/dashboard").status_code == 200
+
+    delete_user(uid)
+
+    res = client.get("/dashboard", follow_redirects=False)
+    assert res.status_code in (302, 303)
+    assert "/login" in res.headers["Location"]
+    with client.session_transaction() as sess:
+        assert "user_id" not in sess
+
+
+def test_role_comes_from_database_not_session(client):
+    from user_repo import get_user_by_username
+
+    create_and_login(client, "notadmin")
+    uid = int(get_user_by_username("notadmin")["id"])
+
+    with client.session_transaction() as sess:
+        assert sess["user_id"] == uid
+        sess["role"] = "admin"
+
+    res = client.get("/admin", follow_redirects=False)
+    assert res.status_code in (302, 303)
+    assert "/dashboard" in res.headers["Location"]
+
+
+def test_repeat_requests_hit_cache(client):
+    from user_repo import user_cache_stats
+
+    create_and_login(client, "cached")
+    client.get("/dashboard")
+
+    before = user_cache_stats()
+    for _ in range(5):
+        client.get("/dashboard")
+    after = user_cache_stats()
+
+    assert after["hits"] - before["hits"] == 5
+    assert after["misses"] == before["misses"]
+
+
+def test_cache_invalidated_on_create_and_delete(client):
+    from db.db import get_conn
+    from user_repo import create_user, delete_user, get_cached_user, user_cache_stats
+
+    conn = get_conn()
+    try:
+        next_id = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'users'").fetchone()["seq"] + 1
+    finally:
+        conn.close()
+
+    # A miss for an id nobody has yet is cached as None...
+    assert get_cached_user(next_id) is None
+    size = user_cache_stats()["size"]
+
+    # ...and creating that user replaces it straight away, not after the TTL.
+    assert create_user("newcomer", "pw") == next_id
+    assert user_cache_stats()["size"] == size - 1
+    assert get_cached_user(next_id)["username"] == "newcomer"
+
+    assert delete_user(next_id)
+    assert user_cache_stats()["size"] == size - 1
+    assert get_cached_user(next_id) is None
+
+
+def test_cache_stats_endpoint_is_admin_only(client):
+    create_and_login(client, "statsuser")
+    assert client.get("/admin/cache_stats").status_code in (302, 303)
+    client.get("/logout")
+
+    login(client, "admin", "admin123")
+    data = client.get("/admin/cache_stats").get_json()
+    assert set(data["user_cache"]) == {"hits", "misses", "size"}
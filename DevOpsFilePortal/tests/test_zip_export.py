@@ -0,0 +1,75 @@
+import io
+import os
+import zipfile
+from conftest import create_and_login, upload
+
+
+def file_ids(username):
+    from file_repo import list_files_for_user
+    from user_repo import get_user_by_username
+
+    uid = get_user_by_username(username)["id"]
+    return {r["original_filename"]: r["id"] for r in list_files_for_user(uid)}
+
+
+def test_zip_export_contains_all_files(client):
+    create_and_login(client, "zip1")
+    upload(client, "notes.txt", b"hello " * 1000)
+    upload(client, "photo.png", os.urandom(4096))
+
+    res = client.get("/dashboard/download_zip")
+    assert res.status_code == 200
+    assert res.is_streamed
+    assert res.mimetype == "application/zip"
+    assert "attachment" in res.headers["Content-Disposition"]
+
+    zf = zipfile.ZipFile(io.BytesIO(res.data))
+    assert zf.testzip() is None
+    assert sorted(zf.namelist()) == ["notes.txt", "photo.png"]
+    assert zf.read("notes.txt") == b"hello " * 1000
+    assert zf.getinfo("notes.txt").compress_type == zipfile.ZIP_DEFLATED
+    assert zf.getinfo("photo.png").compress_type == zipfile.ZIP_STORED
+
+
+def test_zip_export_selected_ids_only_own_files(client):
+    create_and_login(client, "zip2")
+    upload(client, "a.txt", b"a")
+    upload(client, "b.txt", b"b")
+    ids = file_ids("zip2")
+    client.get("/logout")
+
+    create_and_login(client, "zip3")
+    upload(client, "mine.txt", b"mine")
+    mine = file_ids("zip3")["mine.txt"]
+
+    res = client.get(f"/dashboard/download_zip?id={ids['a.txt']}&id={mine}")
+    zf = zipfile.ZipFile(io.BytesIO(res.data))
+    assert zf.namelist() == ["mine.txt"]
+
+
+def test_zip_export_renames_duplicate_names(client):
+    create_and_login(client, "zip4")
+    upload(client, "report.txt", b"v1")
+    upload(client, "report.txt", b"v2")
+
+    zf = zipfile.ZipFile(io.BytesIO(client.get("/dashboard/download_zip").data))
+    assert sorted(zf.namelist()) == ["report (2).txt", "report.txt"]
+    assert {zf.read(n) for n in zf.namelist()} == {b"v1", b"v2"}
+
+
+def test_zip_export_rejects_bad_ids(client):
+    create_and_login(client, "zip5")
+    assert client.get("/dashboard/download_zip?id=abc").status_code == 400
+
+
+def test_stream_zip_chunks_stay_bounded(tmp_path):
+    from export import stream_zip
+
+    big = tmp_path / "big.bin"
+    big.write_bytes(os.urandom(3 * 1024 * 1024))
+
+    chunks = list(stream_zip([("big.bin", str(big), big.stat().st_size, None, None)], chunk_size=65536))
+    assert max(len(c) for c in chunks) < 2 * 65536
+
+    zf = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert zf.read("big.bin") == big.read_bytes()
@@ -0,0 +1,190 @@
+import os
+import time
+import sqlite3
+import threading
+
+
+def _roll(entry_start, curr, prev, bucket_start, window):
+    """Advance a two-bucket counter to the bucket starting at bucket_start."""
+    if entry_start == bucket_start:
+        return curr, prev
+    if entry_start == bucket_start - window:
+        return 0, curr
+    return 0, 0
+
+
+def _estimate(curr, prev, now, bucket_start, window):
+    # Sliding-window counter: the previous bucket counts in proportion to how
+    # much of it still overlaps the window ending now.
+    overlap = 1.0 - (now - bucket_start) / window
+    return curr + prev * overlap
+
+
+class MemoryWindowStore:
+    """Per-process sliding-window counters. Fine for a single worker."""
+
+    def __init__(self, evict_every: int = 1000):
+        self._entries = {}  # key -> [bucket_start, curr, prev]
+        self._lock = threading.Lock()
+        self._ops = 0
+        self._evict_every = evict_every
+
+    def hit(self, key: str, window: float, now=None):
+        now = time.time() if now is None else now
+        bucket_start = (now // window) * window
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._entries[key] = [bucket_start, 1, 0]
+            else:
+                curr, prev = _roll(entry[0], entry[1], entry[2], bucket_start, window)
+                self._entries[key] = [bucket_start, curr + 1, prev]
+
+            self._ops += 1
+            if self._ops >= self._evict_every:
+                self._ops = 0
+                self._evict(bucket_start, window)
+
+    def count(self, key: str, window: float, now=None) -> float:
+        now = time.time() if now is None else now
+        bucket_start = (now // window) * window
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return 0.0
+            curr, prev = _roll(entry[0], entry[1], entry[2], bucket_start, window)
+        return _estimate(curr, prev, now, bucket_start, window)
+
+    def reset(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def _evict(self, bucket_start, window):
+        # An entry two buckets old no longer contributes to any count.
+        stale = [k for k, e in self._entries.items() if e[0] < bucket_start - window]
+        for k in stale:
+            del self._entries[k]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteWindowStore:
+    """Sliding-window counters in a small SQLite file shared by all workers.
+
+    Kept out of the application database so throttle writes never contend
+    with uploads for the write lock.
+    """
+
+    def __init__(self, path: str, evict_every: int = 1000):
+        self.path = path
+        self._local = threading.local()
+        self._ops = 0
+        self._evict_every = evict_every
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode = WAL;")
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS throttle (
+            key TEXT PRIMARY KEY,
+            bucket_start REAL NOT NULL,
+            curr INTEGER NOT NULL,
+            prev INTEGER NOT NULL
+        ) WITHOUT ROWID
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_throttle_bucket ON throttle (bucket_start)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous = OFF;")
+            self._local.conn = conn
+        return conn
+
+    def hit(self, key: str, window: float, now=None):
+        now = time.time() if now is None else now
+        bucket_start = (now // window) * window
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT bucket_start, curr, prev FROM throttle WHERE key = ?", (key,)
+            ).fetchone()
+            curr, prev = _roll(*row, bucket_start, window) if row else (0, 0)
+            conn.execute(
+                "INSERT OR REPLACE INTO throttle (key, bucket_start, curr, prev) VALUES (?, ?, ?, ?)",
+                (key, bucket_start, curr + 1, prev),
+            )
+
+            self._ops += 1
+            if self._ops >= self._evict_every:
+                self._ops = 0
+                conn.execute("DELETE FROM throttle WHERE bucket_start < ?", (bucket_start - window,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self, key: str, window: float, now=None) -> float:
+        now = time.time() if now is None else now
+        bucket_start = (now // window) * window
+        row = self._conn().execute(
+            "SELECT bucket_start, curr, prev FROM throttle WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return 0.0
+        curr, prev = _roll(*row, bucket_start, window)
+        return _estimate(curr, prev, now, bucket_start, window)
+
+    def reset(self, key: str):
+        self._conn().execute("DELETE FROM throttle WHERE key = ?", (key,))
+
+
+class LoginThrottle:
+    """Limits failed logins per client IP and per username.
+
+    check() only reads counters, so a blocked request costs no user lookup
+    and no password hash.
+    """
+
+    def __init__(self, store, window: float = 300, max_per_ip: int = 50, max_per_user: int = 10):
+        self.store = store
+        self.window = window
+        self.max_per_ip = max_per_ip
+        self.max_per_user = max_per_user
+
+    @staticmethod
+    def _keys(ip: str, username: str):
+        return f"ip:{ip}", f"user:{username.lower()}"
+
+    def check(self, ip: str, username: str) -> int:
+        """Return 0 if the attempt may proceed, else seconds to wait."""
+        ip_key, user_key = self._keys(ip, username)
+        if (
+            self.max_per_ip > 0 and self.store.count(ip_key, self.window) >= self.max_per_ip
+        ) or (
+            self.max_per_user > 0 and username and self.store.count(user_key, self.window) >= self.max_per_user
+        ):
+            now = time.time()
+            return max(1, int((now // self.window + 1) * self.window - now))
+        return 0
+
+    def record_failure(self, ip: str, username: str):
+        ip_key, user_key = self._keys(ip, username)
+        self.store.hit(ip_key, self.window)
+        if username:
+            self.store.hit(user_key, self.window)
+
+    def record_success(self, ip: str, username: str):
+        self.store.reset(self._keys(ip, username)[1])
+
+
+def build_store(kind: str, sqlite_path: str):
+    if kind == "memory":
+        return MemoryWindowStore()
+    if kind == "sqlite":
+        return SQLiteWindowStore(sqlite_path)
+    raise ValueError(f"LOGIN_THROTTLE_STORE must be 'memory' or 'sqlite', got {kind!r}")
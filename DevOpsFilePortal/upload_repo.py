@@ -0,0 +1,188 @@
+from db.db import get_conn
+from file_repo import check_quota
+
+# Sessions that still hold (or are about to hold) staged bytes.
+_ACTIVE_STATES = ("open", "finalizing")
+
+
+class TooManyUploadSessions(Exception):
+    """The user already has the maximum number of unfinished sessions."""
+
+
+def create_upload_session(
+    session_id: str,
+    user_id: int,
+    original_filename: str,
+    content_type,
+    total_size: int,
+    chunk_size: int,
+    quota=None,
+    max_open=None,
+):
+    """Register a resumable upload. Raises QuotaExceeded if the user's
+    stored bytes plus every unfinished session, this one included, would
+    exceed `quota`, so staged data cannot outgrow the quota either, and
+    TooManyUploadSessions if they already have `max_open` unfinished ones."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            f"""
+            SELECT COUNT(*) AS n, COALESCE(SUM(total_size), 0) AS reserved
+            FROM upload_sessions
+            WHERE user_id = ? AND state IN ({','.join('?' * len(_ACTIVE_STATES))})
+            """,
+            (user_id, *_ACTIVE_STATES),
+        )
+        active = cur.fetchone()
+        if max_open and active["n"] >= max_open:
+            raise TooManyUploadSessions()
+        if quota:
+            check_quota(cur, user_id, active["reserved"] + total_size, quota)
+        cur.execute(
+            """
+            INSERT INTO upload_sessions (id, user_id, original_filename, content_type, total_size, chunk_size)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (session_id, user_id, original_filename, content_type, total_size, chunk_size),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_upload_session(user_id: int, session_id: str):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, user_id, original_filename, content_type, total_size, chunk_size, state, file_id, created_at, updated_at
+            FROM upload_sessions
+            WHERE id = ? AND user_id = ?
+            """,
+            (session_id, user_id),
+        )
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def list_received_chunks(session_id: str):
+    """[(chunk_no, size)] of the chunks stored so far, in chunk order."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT chunk_no, size FROM upload_chunks WHERE session_id = ? ORDER BY chunk_no",
+            (session_id,),
+        )
+        return [(row["chunk_no"], row["size"]) for row in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def record_chunk(session_id: str, chunk_no: int, size: int) -> bool:
+    """Mark a chunk as durably written. Re-sending a chunk is harmless.
+
+    Returns False if the session is no longer open (finalized, expired or
+    deleted meanwhile).
+    """
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute(
+            "UPDATE upload_sessions SET updated_at = datetime('now') WHERE id = ? AND state = 'open'",
+            (session_id,),
+        )
+        if not cur.rowcount:
+            conn.rollback()
+            return False
+        cur.execute(
+            """
+            INSERT INTO upload_chunks (session_id, chunk_no, size)
+            VALUES (?, ?, ?)
+            ON CONFLICT (session_id, chunk_no) DO UPDATE SET size = excluded.size
+            """,
+            (session_id, chunk_no, size),
+        )
+        conn.commit()
+        return True
+    finally:
+        conn.close()
+
+
+def _set_state(session_id: str, new_state: str, from_state: str, file_id=None) -> bool:
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE upload_sessions
+            SET state = ?, file_id = COALESCE(?, file_id), updated_at = datetime('now')
+            WHERE id = ? AND state = ?
+            """,
+            (new_state, file_id, session_id, from_state),
+        )
+        conn.commit()
+        return cur.rowcount > 0
+    finally:
+        conn.close()
+
+
+def claim_upload_session(session_id: str) -> bool:
+    """Move an open session to finalizing; only one finalize can win."""
+    return _set_state(session_id, "finalizing", "open")
+
+
+def complete_upload_session(session_id: str, file_id: int):
+    """Record the finalized file; the chunk list is no longer needed."""
+    _set_state(session_id, "complete", "finalizing", file_id)
+    conn = get_conn()
+    try:
+        conn.execute("DELETE FROM upload_chunks WHERE session_id = ?", (session_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def delete_upload_session(user_id: int, session_id: str) -> int:
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM upload_sessions WHERE id = ? AND user_id = ?", (session_id, user_id))
+        conn.commit()
+        return cur.rowcount
+    finally:
+        conn.close()
+
+
+def delete_stale_upload_sessions(max_age_seconds: int):
+    """Delete sessions untouched for `max_age_seconds`, finished or not.
+
+    Returns their ids so the caller can remove the staged files.
+    """
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "DELETE FROM upload_sessions WHERE updated_at < datetime('now', ?) RETURNING id",
+            (f"-{int(max_age_seconds)} seconds",),
+        )
+        ids = [row["id"] for row in cur.fetchall()]
+        conn.commit()
+        return ids
+    finally:
+        conn.close()
+
+
+def list_upload_session_ids():
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM upload_sessions")
+        return {row["id"] for row in cur.fetchall()}
+    finally:
+        conn.close()
@@ -0,0 +1,50 @@
+import time
+import threading
+
+
+class UserCache:
+    """In-process cache of user rows keyed by user_id.
+
+    Misses go to `loader`; unknown ids are cached as None too, so a stale
+    session for a deleted user is also answered from memory. Entries expire
+    after `ttl` seconds, which bounds how long another worker's create or
+    delete can go unnoticed; within this process, invalidate() is immediate.
+    """
+
+    def __init__(self, loader, ttl: float = 10, max_entries: int = 10000):
+        self._loader = loader
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}  # user_id -> (expires_at, row)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        row = self._loader(user_id)
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries.clear()
+            self._entries[user_id] = (now + self.ttl, row)
+        return row
+
+    def invalidate(self, user_id: int):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
@@ -1,5 +1,9 @@
+import os
+
 from db.db import get_conn
-from werkzeug.security import generate_password_hash
+from file_repo import purge_unreferenced_blobs, notify_files_changed
+from passwords import hash_password
+from user_cache import UserCache
 
 
 def get_user_by_username(username: str):
@@ -15,6 +19,46 @@ def get_user_by_username(username: str):
         conn.close()
 
 
+def get_user_by_id(user_id: int):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT id, username, role, created_at FROM users WHERE id = ?",
+            (user_id,),
+        )
+        return cur.fetchone()
+    finally:
+        conn.close()
+
+
+def get_used_bytes(user_id: int) -> int:
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT used_bytes FROM users WHERE id = ?", (user_id,))
+        row = cur.fetchone()
+        return row["used_bytes"] if row else 0
+    finally:
+        conn.close()
+
+
+_user_cache = UserCache(get_user_by_id, ttl=float(os.getenv("USER_CACHE_TTL", "10")))
+
+
+def get_cached_user(user_id: int):
+    """get_user_by_id through the in-process cache; used on every request."""
+    return _user_cache.get(int(user_id))
+
+
+def user_cache_stats():
+    return _user_cache.stats()
+
+
+def clear_user_cache():
+    _user_cache.clear()
+
+
 def list_all_users():
     conn = get_conn()
     try:
@@ -26,7 +70,8 @@ def list_all_users():
               ROW_NUMBER() OVER (ORDER BY id) AS display_id,
               username,
               role,
-              created_at
+              created_at,
+              used_bytes
             FROM users
             ORDER BY id ASC
             """
@@ -40,7 +85,7 @@ def create_user(username: str, password: str, role: str = "user"):
     conn = get_conn()
     try:
         cur = conn.cursor()
-        pwd_hash = generate_password_hash(password)
+        pwd_hash = hash_password(password)
         cur.execute(
             """
             INSERT INTO users (username, password_hash, role)
@@ -49,22 +94,43 @@ def create_user(username: str, password: str, role: str = "user"):
             (username, pwd_hash, role),
         )
         conn.commit()
+        # The id may be cached as "no such user" from an earlier lookup.
+        _user_cache.invalidate(cur.lastrowid)
         return cur.lastrowid
     finally:
         conn.close()
 
 
-def delete_user(user_id: int):
+def update_password_hash(user_id: int, pwd_hash: str):
     conn = get_conn()
     try:
         cur = conn.cursor()
-        cur.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        cur.execute("UPDATE users SET password_hash = ? WHERE id = ?", (pwd_hash, user_id))
         conn.commit()
         return cur.rowcount
     finally:
         conn.close()
 
 
+def delete_user(user_id: int, remove_stored=None):
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        # Cascades to the user's files; the blob triggers drop their refs.
+        cur.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        deleted = cur.rowcount
+        if deleted:
+            purge_unreferenced_blobs(cur, remove_stored)
+        conn.commit()
+        _user_cache.invalidate(user_id)
+        if deleted:
+            notify_files_changed(user_id)
+        return deleted
+    finally:
+        conn.close()
+
+
 def ensure_seed_admin():
     conn = get_conn()
     try:
@@ -74,15 +140,17 @@ def ensure_seed_admin():
         if existing:
             return
 
-        pwd_hash = generate_password_hash("admin123")
+        pwd_hash = hash_password("admin123")
+        # Workers starting together may all get here; one insert wins.
         cur.execute(
             """
-            INSERT INTO users (username, password_hash, role)
+            INSERT OR IGNORE INTO users (username, password_hash, role)
             VALUES (?, ?, ?)
             """,
             ("admin", pwd_hash, "admin"),
         )
         conn.commit()
-        print("Seeded admin user: admin / admin123")
+        if cur.rowcount:
+            print("Seeded admin user: admin / admin123")
     finally:
         conn.close()